@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+快照对比引擎基准测试：set 与 fingerprint
+
+为每个规模生成一份旧快照（保存到临时目录的 JSON 快照存储中）和一份新URL集合
+（删除 0.1% 并新增 0.1%），在独立子进程中分别运行两种对比方式，
+记录耗时和 tracemalloc 统计的峰值内存（不含新URL集合本身，两种方式都需要它）。
+内存在单独的一次运行中统计，不影响计时。
+
+用法:
+    python benchmarks/bench_diff.py
+    python benchmarks/bench_diff.py --sizes 100000 1000000
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+from typing import Dict, Set
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+RESULT_MARKER = "BENCH_RESULT "
+CHURN = 0.001
+
+
+def make_urls(count: int, offset: int = 0) -> Set[str]:
+    """生成与真实 sitemap 长度接近的URL"""
+    return {f"https://www.example-games.com/game/{i:08d}-some-game-title-slug" for i in range(offset, offset + count)}
+
+
+def run_worker(engine: str, size: int, workdir: str):
+    """子进程：加载新URL集合后，测量一次对比的耗时和峰值内存"""
+    sys.path.insert(0, REPO_ROOT)
+    from snapshot_store import JsonSnapshotStore
+    from fingerprint_diff import fingerprint_diff, np
+
+    store = JsonSnapshotStore(workdir)
+    changed = max(1, int(size * CHURN))
+    new_urls = make_urls(size - changed, changed) | make_urls(changed, size)
+
+    def diff():
+        if engine == 'set':
+            old_urls = store.load('site')
+            return new_urls - old_urls, old_urls - new_urls
+        return fingerprint_diff(new_urls, lambda: store.iter_urls('site'))
+
+    # 先单独计时，再在 tracemalloc 下重跑一次统计内存，避免内存跟踪拖慢计时
+    start = time.perf_counter()
+    added, removed = diff()
+    seconds = time.perf_counter() - start
+    del added, removed
+
+    tracemalloc.start()
+    added, removed = diff()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(RESULT_MARKER + json.dumps({
+        'engine': engine + ('' if engine == 'set' or np is not None else ' (array)'),
+        'size': size,
+        'seconds': round(seconds, 3),
+        'peak_mb': round(peak / 1024 / 1024, 1),
+        'added': len(added),
+        'removed': len(removed),
+    }))
+
+
+def run_case(engine: str, size: int, workdir: str) -> Dict:
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker', engine, '--sizes', str(size), '--workdir', workdir],
+        capture_output=True, text=True, check=True
+    ).stdout
+    for line in output.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    raise RuntimeError(f"{engine} {size} 没有输出结果")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="快照对比引擎基准测试")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000], help="URL数量")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.sizes[0], args.workdir)
+        return
+
+    sys.path.insert(0, REPO_ROOT)
+    from snapshot_store import JsonSnapshotStore
+
+    print(f"{'URL数':<10}{'引擎':<22}{'耗时(s)':<10}{'峰值内存(MB)':<14}新增/删除")
+    for size in args.sizes:
+        workdir = tempfile.mkdtemp(prefix="sitemap-bench-diff-")
+        try:
+            JsonSnapshotStore(workdir).save('site', make_urls(size))
+            for engine in ('set', 'fingerprint'):
+                result = run_case(engine, size, workdir)
+                print(f"{result['size']:<10}{result['engine']:<22}{result['seconds']:<10}"
+                      f"{result['peak_mb']:<14}{result['added']}/{result['removed']}", flush=True)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
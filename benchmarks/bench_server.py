@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+基准测试用的本地 HTTP 服务器
+
+按路径生成合成的 sitemap，不访问外网：
+    /sitemap/<n>.xml              包含 n 个URL的 sitemap
+    /sitemap/<n>-<part>.xml       同上，part 用于区分索引中的不同子sitemap
+    /sitemap/<n>.xml.gz           gzip 压缩的 sitemap
+    /index/<children>x<n>.xml     包含 children 个子sitemap（各 n 个URL）的索引
+    /html/<n>.html                包含 n 个链接的普通 HTML 页面
+    /slow/<ms>/<n>.xml            延迟 ms 毫秒后返回 sitemap
+    /error/<code>                 直接返回指定状态码
+    /webhook                      模拟飞书 Webhook（POST）
+    /__stats                      返回并清零流量统计（GET）
+
+所有响应都带 ETag，支持 If-None-Match 返回 304，用于测试缓存命中的情况。
+"""
+
+import re
+import gzip
+import json
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+class BenchState:
+    def __init__(self):
+        """服务器共享状态：生成内容的缓存和流量统计"""
+        self.lock = threading.Lock()
+        self.cache: Dict[str, Tuple[int, bytes, str]] = {}
+        self.stats = {'requests': 0, 'bytes_sent': 0, 'not_modified': 0, 'webhook_posts': 0}
+
+    def count(self, key: str, value: int = 1):
+        with self.lock:
+            self.stats[key] += value
+
+    def pop_stats(self) -> Dict[str, int]:
+        with self.lock:
+            stats = dict(self.stats)
+            for key in self.stats:
+                self.stats[key] = 0
+        return stats
+
+
+def render_urlset(host: str, count: int, part: str = '') -> bytes:
+    """生成包含 count 个URL的 sitemap"""
+    prefix = f"https://{host}/game{part}/"
+    lines = [f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{NS}">\n']
+    for i in range(count):
+        lines.append(f'<url><loc>{prefix}{i}</loc><lastmod>2025-01-01</lastmod></url>\n')
+    lines.append('</urlset>\n')
+    return ''.join(lines).encode('utf-8')
+
+
+def render_index(base_url: str, children: int, count: int) -> bytes:
+    """生成包含 children 个子sitemap的索引"""
+    lines = [f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{NS}">\n']
+    for part in range(children):
+        lines.append(f'<sitemap><loc>{base_url}/sitemap/{count}-{part}.xml</loc><lastmod>2025-01-01</lastmod></sitemap>\n')
+    lines.append('</sitemapindex>\n')
+    return ''.join(lines).encode('utf-8')
+
+
+def render_html(host: str, count: int) -> bytes:
+    """生成包含 count 个链接的 HTML 页面（XML 解析会失败，触发 HTML 回退）"""
+    links = ''.join(f'<a href="/game/{i}">Game {i}</a><br>' for i in range(count))
+    return f'<!DOCTYPE html><html><head><title>bench</title></head><body>{links}</body></html>'.encode('utf-8')
+
+
+class BenchHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state: BenchState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body_for(self, path: str) -> Tuple[int, Optional[bytes], str]:
+        """根据路径生成 (状态码, 内容, Content-Type)"""
+        host = self.headers.get('Host', 'localhost').split(':')[0]
+        base_url = f"http://{self.headers.get('Host', 'localhost')}"
+
+        match = re.fullmatch(r'/sitemap/(\d+)(?:-(\d+))?\.xml(\.gz)?', path)
+        if match:
+            count, part, gz = int(match.group(1)), match.group(2) or '', match.group(3)
+            body = render_urlset(host, count, part)
+            if gz:
+                return 200, gzip.compress(body, compresslevel=6), 'application/x-gzip'
+            return 200, body, 'application/xml'
+
+        match = re.fullmatch(r'/index/(\d+)x(\d+)\.xml', path)
+        if match:
+            return 200, render_index(base_url, int(match.group(1)), int(match.group(2))), 'application/xml'
+
+        match = re.fullmatch(r'/html/(\d+)\.html', path)
+        if match:
+            return 200, render_html(host, int(match.group(1))), 'text/html; charset=utf-8'
+
+        match = re.fullmatch(r'/slow/(\d+)/(\d+)\.xml', path)
+        if match:
+            time.sleep(int(match.group(1)) / 1000)
+            return 200, render_urlset(host, int(match.group(2)), 'slow'), 'application/xml'
+
+        match = re.fullmatch(r'/error/(\d{3})', path)
+        if match:
+            return int(match.group(1)), b'error', 'text/plain'
+
+        return 404, b'not found', 'text/plain'
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+        self.state.count('requests')
+        self.state.count('bytes_sent', len(body))
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path == '/__stats':
+            body = json.dumps(self.state.pop_stats()).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        host = self.headers.get('Host', '')
+        cache_key = f"{host}{path}"
+        # 慢速和错误路径每次都重新处理，其余内容生成一次后缓存
+        if path.startswith(('/slow/', '/error/')):
+            status, body, content_type = self._body_for(path)
+        else:
+            with self.state.lock:
+                cached = self.state.cache.get(cache_key)
+            if cached is None:
+                status, body, content_type = self._body_for(path)
+                if status == 200:
+                    with self.state.lock:
+                        self.state.cache[cache_key] = (status, body, content_type)
+            else:
+                status, body, content_type = cached
+
+        if status != 200:
+            self._send(status, body, content_type)
+            return
+
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            self.state.count('requests')
+            self.state.count('not_modified')
+            return
+        self._send(status, body, content_type, {'ETag': etag})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        if self.path.split('?')[0] == '/webhook':
+            self.state.count('webhook_posts')
+            self._send(200, json.dumps({'code': 0, 'msg': 'success'}).encode('utf-8'), 'application/json')
+        else:
+            self._send(404, b'not found', 'text/plain')
+
+
+def start_server(port: int = 0, state: Optional[BenchState] = None) -> Tuple[ThreadingHTTPServer, BenchState]:
+    """在后台线程启动服务器，返回 (server, state)；port 为 0 时自动分配端口
+
+    传入 state 时与其他服务器共用内容缓存和流量统计（多个端口模拟多个域名）。
+    """
+    state = state or BenchState()
+    handler = type('BoundBenchHandler', (BenchHandler,), {'state': state})
+    server = ThreadingHTTPServer(('0.0.0.0', port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='bench-server', daemon=True)
+    thread.start()
+    return server, state
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="基准测试用的本地 HTTP 服务器")
+    parser.add_argument('--port', type=int, default=8800, help="监听端口")
+    args = parser.parse_args()
+
+    server, _ = start_server(args.port)
+    print(f"基准测试服务器已启动: http://127.0.0.1:{server.server_address[1]}/")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
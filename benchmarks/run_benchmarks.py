@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+SitemapAnalyser 端到端基准测试
+
+启动本地 HTTP 服务器 (bench_server.py) 提供合成的 sitemap，
+对每个场景在同一工作目录中完整执行两次 run_analysis，每次在独立的子进程中运行：
+    cold: 空的工作目录，所有内容都需要下载、解析和保存
+    warm: 第二次运行，可以命中条件请求缓存
+
+记录总耗时、各阶段累计耗时（取自 RunMetrics，各网站之和）、该轮的峰值内存 (RSS) 和传输字节数，
+结果按 git 提交追加写入 benchmarks/results.jsonl，便于比较不同提交之间的性能变化。
+
+用法:
+    python benchmarks/run_benchmarks.py                    # 运行 small 场景
+    python benchmarks/run_benchmarks.py --scenario medium
+    python benchmarks/run_benchmarks.py --scenario all --compare
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+from datetime import datetime
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+DEFAULT_RESULTS = os.path.join(BENCH_DIR, "results.jsonl")
+RESULT_MARKER = "BENCH_RESULT "
+
+# 每个场景的站点：(名称, 路径, 主机编号)；每个主机编号对应 127.0.0.1 上的一个端口，模拟不同域名
+# （域名熔断、单域名并发限制和耗时历史都按 主机:端口 区分）
+SCENARIOS = {
+    'small': [
+        ('xml-1k', '/sitemap/1000.xml', 1),
+        ('xml-10k', '/sitemap/10000.xml', 2),
+        ('gzip-10k', '/sitemap/10000.xml.gz', 3),
+        ('index-5x2k', '/index/5x2000.xml', 4),
+        ('html-1k', '/html/1000.html', 5),
+        ('slow-500ms', '/slow/500/1000.xml', 6),
+        ('error-500', '/error/500', 7),
+        ('error-404', '/error/404', 7),
+    ],
+    'medium': [
+        ('xml-100k', '/sitemap/100000.xml', 1),
+        ('gzip-100k', '/sitemap/100000.xml.gz', 2),
+        ('index-20x10k', '/index/20x10000.xml', 3),
+        ('html-5k', '/html/5000.html', 4),
+        ('slow-2s', '/slow/2000/10000.xml', 5),
+        ('error-503', '/error/503', 6),
+    ],
+    'large': [
+        ('xml-1m', '/sitemap/1000000.xml', 1),
+        ('gzip-1m', '/sitemap/1000000.xml.gz', 2),
+    ],
+}
+
+RUNS = ('cold', 'warm')
+
+
+def git_commit() -> str:
+    """当前 git 提交，非 git 环境返回 unknown"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def build_config(scenario: str, ports: Dict[int, int]) -> Dict:
+    """生成场景对应的 config.json 内容，ports 为 主机编号 -> 端口"""
+    return {
+        # 本地模拟的 Webhook 没有频率限制，放宽限速，避免等待令牌的时间掩盖分析本身的耗时
+        'webhook': {'url': f"http://127.0.0.1:{ports[0]}/webhook", 'rate_per_second': 1000, 'burst': 1000},
+        'sitemaps': [
+            {'name': name, 'url': f"http://127.0.0.1:{ports[host]}{path}"}
+            for name, path, host in SCENARIOS[scenario]
+        ]
+    }
+
+
+def server_stats(port: int) -> Dict[str, int]:
+    """读取并清零服务器的流量统计（所有端口共用）"""
+    from http_session import get_session
+    return get_session().get(f"http://127.0.0.1:{port}/__stats", timeout=10).json()
+
+
+def peak_rss_mb() -> float:
+    """当前进程的峰值内存（ru_maxrss 在 Linux 上以 KB 为单位，在 macOS 上以字节为单位）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_worker(scenario: str, run: str, ports: Dict[int, int], workdir: str):
+    """子进程：在工作目录中执行一轮分析并输出结果
+
+    ru_maxrss 是进程生命周期内的峰值，每轮使用独立的子进程，warm 轮的峰值内存不受 cold 轮影响；
+    warm 轮只复用磁盘上的快照和缓存，与定时任务的实际情况一致。
+    """
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(workdir)
+    with open('config.json', 'w', encoding='utf-8') as f:
+        json.dump(build_config(scenario, ports), f, indent=2)
+
+    import logging
+    import sitemap_analyser
+    from run_metrics import TOP_LEVEL_STAGES, HTTP_STAGES
+    logging.getLogger().setLevel(logging.WARNING)
+
+    analyser = sitemap_analyser.SitemapAnalyser('config.json')
+    server_stats(ports[0])
+
+    start = time.perf_counter()
+    analyser.run_analysis()
+    wall = time.perf_counter() - start
+
+    stats = server_stats(ports[0])
+    # 各阶段耗时取自本轮的运行指标；子sitemap的抓取计入 parse，connect/ttfb/download 是所有请求的细分
+    stage_seconds = {}
+    for record in analyser.metrics.records():
+        for stage, seconds in record['stages'].items():
+            stage_seconds[stage] = stage_seconds.get(stage, 0.0) + seconds
+    record = {
+        'scenario': scenario,
+        'run': run,
+        'wall_seconds': round(wall, 3),
+        'stage_seconds': {stage: round(stage_seconds[stage], 3)
+                          for stage in TOP_LEVEL_STAGES + HTTP_STAGES if stage in stage_seconds},
+        'peak_rss_mb': peak_rss_mb(),
+        'bytes_transferred': stats['bytes_sent'],
+        'requests': stats['requests'],
+        'not_modified': stats['not_modified'],
+        'webhook_posts': stats['webhook_posts'],
+    }
+    print(RESULT_MARKER + json.dumps(record))
+
+
+def run_round(scenario: str, run: str, ports: Dict[int, int], workdir: str) -> Dict:
+    """在独立子进程中运行一轮分析"""
+    port_list = ','.join(str(ports[host]) for host in sorted(ports))
+    try:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker', scenario, '--run', run,
+             '--ports', port_list, '--workdir', workdir],
+            capture_output=True, text=True, check=True
+        ).stdout
+    except subprocess.CalledProcessError as e:
+        sys.stderr.write(e.stderr)
+        raise
+
+    for line in output.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    raise RuntimeError(f"场景 {scenario} 的 {run} 轮没有输出结果")
+
+
+def run_scenario(scenario: str, ports: Dict[int, int]) -> List[Dict]:
+    """在同一临时工作目录中依次运行 cold / warm 两轮，每轮一个子进程"""
+    workdir = tempfile.mkdtemp(prefix=f"sitemap-bench-{scenario}-")
+    try:
+        return [run_round(scenario, run, ports, workdir) for run in RUNS]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def load_results(path: str) -> List[Dict]:
+    """读取历史结果"""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def print_report(records: List[Dict], baseline: Dict[tuple, Dict]):
+    """输出结果表格，有基准时附带变化百分比"""
+    def delta(current: float, previous: float) -> str:
+        if not previous:
+            return ''
+        return f" ({(current - previous) / previous * 100:+.1f}%)"
+
+    print(f"{'场景':<8}{'轮次':<6}{'总耗时(s)':<18}{'峰值RSS(MB)':<20}{'传输字节':<22}阶段耗时(s)")
+    for record in records:
+        base = baseline.get((record['scenario'], record['run']), {})
+        stages = ', '.join(f"{k}={v}" for k, v in record['stage_seconds'].items())
+        print(f"{record['scenario']:<8}{record['run']:<6}"
+              f"{str(record['wall_seconds']) + delta(record['wall_seconds'], base.get('wall_seconds')):<18}"
+              f"{str(record['peak_rss_mb']) + delta(record['peak_rss_mb'], base.get('peak_rss_mb')):<20}"
+              f"{str(record['bytes_transferred']) + delta(record['bytes_transferred'], base.get('bytes_transferred')):<22}"
+              f"{stages}")
+    if baseline:
+        commits = sorted({b['commit'] for b in baseline.values()})
+        print(f"对比基准提交: {', '.join(commits)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SitemapAnalyser 端到端基准测试")
+    parser.add_argument('--scenario', default='small', choices=sorted(SCENARIOS) + ['all'], help="测试场景")
+    parser.add_argument('--results', default=DEFAULT_RESULTS, help="结果文件 (JSON lines)")
+    parser.add_argument('--compare', action='store_true', help="与其他提交最近一次的结果对比")
+    parser.add_argument('--no-save', action='store_true', help="不写入结果文件")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--run', choices=RUNS, help=argparse.SUPPRESS)
+    parser.add_argument('--ports', help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.run, dict(enumerate(int(port) for port in args.ports.split(','))), args.workdir)
+        return
+
+    sys.path.insert(0, BENCH_DIR)
+    from bench_server import start_server
+
+    # 主机编号 0 用于 Webhook 和流量统计，其余编号各占一个端口；所有服务器共用同一份状态
+    hosts = range(max(host for sites in SCENARIOS.values() for _, _, host in sites) + 1)
+    servers = []
+    state = None
+    for _ in hosts:
+        server, state = start_server(0, state)
+        servers.append(server)
+    ports = {host: server.server_address[1] for host, server in zip(hosts, servers)}
+    commit = git_commit()
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    scenarios = sorted(SCENARIOS) if args.scenario == 'all' else [args.scenario]
+
+    records = []
+    try:
+        for scenario in scenarios:
+            print(f"运行场景 {scenario} ...", flush=True)
+            for record in run_scenario(scenario, ports):
+                record.update({'commit': commit, 'timestamp': timestamp})
+                records.append(record)
+    finally:
+        for server in servers:
+            server.shutdown()
+
+    baseline = {}
+    if args.compare:
+        for previous in load_results(args.results):
+            if previous.get('commit') != commit:
+                baseline[(previous['scenario'], previous['run'])] = previous
+
+    print_report(records, baseline)
+
+    if not args.no_save:
+        with open(args.results, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        print(f"结果已追加到 {args.results}")
+
+
+if __name__ == "__main__":
+    main()
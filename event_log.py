@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+URL 变化事件日志
+
+所有网站的 URL 增删事件按时间顺序追加写入 history/events.jsonl，每行一个事件：
+    {"ts": "2025-05-14 02:00:00", "site": "crazygames.com", "event": "added", "url": "..."}
+event 为 added、removed 或 updated（开启 diff.track_updates 时 lastmod 前进的URL）。
+
+history/events.idx.json 记录每一天第一条事件在日志中的字节偏移，
+按时间范围查询时直接定位到起始位置，无需扫描整个日志。
+
+用法:
+    python event_log.py query --site crazygames.com --days 7
+    python event_log.py import-diff --diff-dir diff
+"""
+
+import os
+import json
+import bisect
+import argparse
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+EVENT_TYPES = ('added', 'removed', 'updated')
+
+
+class UrlEventLog:
+    def __init__(self, directory: str = "history"):
+        """初始化事件日志
+
+        Args:
+            directory: 日志目录
+        """
+        self.directory = directory
+        self.log_path = os.path.join(directory, "events.jsonl")
+        self.index_path = os.path.join(directory, "events.idx.json")
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._index = self._load_index()
+
+    def _load_index(self) -> Dict:
+        """加载索引，索引与日志大小不一致时增量补齐"""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            index = {'days': [], 'size': 0, 'last_ts': ''}
+
+        log_size = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+        if index['size'] > log_size:
+            # 日志被截断或替换，重新建立索引
+            index = {'days': [], 'size': 0, 'last_ts': ''}
+        if index['size'] < log_size:
+            self._scan_into_index(index)
+            self._save_index(index)
+        return index
+
+    def _scan_into_index(self, index: Dict):
+        """从索引记录的位置开始扫描日志，补齐每天的起始偏移"""
+        with open(self.log_path, 'rb') as f:
+            f.seek(index['size'])
+            offset = index['size']
+            for line in f:
+                if line.strip():
+                    ts = json.loads(line)['ts']
+                    day = ts[:10]
+                    if not index['days'] or index['days'][-1][0] < day:
+                        index['days'].append([day, offset])
+                    index['last_ts'] = max(index['last_ts'], ts)
+                offset += len(line)
+            index['size'] = offset
+
+    def _save_index(self, index: Dict):
+        """原子写入索引文件"""
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def append(self, site: str, added: Iterable[str] = (), removed: Iterable[str] = (),
+               timestamp: Optional[datetime] = None, updated: Iterable[str] = ()) -> int:
+        """追加一个网站的增删和更新事件，返回写入的事件数"""
+        with self._lock:
+            ts = (timestamp or datetime.now()).strftime(TIME_FORMAT)
+            # 保证日志按时间有序，系统时钟回拨时沿用上一条事件的时间
+            ts = max(ts, self._index['last_ts'])
+            lines = []
+            for event, urls in (('added', added), ('removed', removed), ('updated', updated)):
+                for url in sorted(urls):
+                    lines.append(json.dumps({'ts': ts, 'site': site, 'event': event, 'url': url},
+                                            ensure_ascii=False) + '\n')
+            if not lines:
+                return 0
+
+            data = ''.join(lines).encode('utf-8')
+            with open(self.log_path, 'ab') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+            day = ts[:10]
+            if not self._index['days'] or self._index['days'][-1][0] < day:
+                self._index['days'].append([day, self._index['size']])
+            self._index['size'] += len(data)
+            self._index['last_ts'] = ts
+            self._save_index(self._index)
+            return len(lines)
+
+    def query(self, site: Optional[str] = None, since: Optional[datetime] = None,
+              until: Optional[datetime] = None, event: Optional[str] = None) -> Iterator[Dict]:
+        """按时间顺序返回满足条件的事件
+
+        Args:
+            site: 网站名称，None 表示所有网站
+            since: 起始时间（包含）
+            until: 结束时间（不包含）
+            event: 'added'、'removed' 或 'updated'，None 表示全部
+        """
+        if not os.path.exists(self.log_path):
+            return
+        since_ts = since.strftime(TIME_FORMAT) if since else ''
+        until_ts = until.strftime(TIME_FORMAT) if until else None
+
+        with self._lock:
+            days = [day for day, _ in self._index['days']]
+            position = bisect.bisect_left(days, since_ts[:10]) if since_ts else 0
+            if position >= len(days):
+                return
+            offset = self._index['days'][position][1]
+            end = self._index['size']
+
+        with open(self.log_path, 'rb') as f:
+            f.seek(offset)
+            while f.tell() < end:
+                line = f.readline()
+                if not line:
+                    break
+                # 先做廉价的字符串判断，再解析JSON
+                if site is not None and f'"site": {json.dumps(site, ensure_ascii=False)}'.encode('utf-8') not in line:
+                    continue
+                record = json.loads(line)
+                if record['ts'] < since_ts:
+                    continue
+                if until_ts is not None and record['ts'] >= until_ts:
+                    break
+                if site is not None and record['site'] != site:
+                    continue
+                if event is not None and record['event'] != event:
+                    continue
+                yield record
+
+    def import_diff_history(self, diff_dir: str = "diff") -> int:
+        """把 diff/YYYYMMDD/<name>.urls.json 中的历史新增记录导入事件日志
+
+        历史事件早于现有日志，因此会与现有事件合并后按时间重新排序写入。
+        返回导入的事件数。
+        """
+        with self._lock:
+            existing = []
+            if os.path.exists(self.log_path):
+                with open(self.log_path, 'r', encoding='utf-8') as f:
+                    existing = [json.loads(line) for line in f if line.strip()]
+            seen = {(r['ts'][:10], r['site'], r['event'], r['url']) for r in existing}
+
+            imported = []
+            for day in sorted(os.listdir(diff_dir)):
+                day_dir = os.path.join(diff_dir, day)
+                if not (os.path.isdir(day_dir) and day.isdigit() and len(day) == 8):
+                    continue
+                ts = datetime.strptime(day, "%Y%m%d").strftime(TIME_FORMAT)
+                for filename in sorted(os.listdir(day_dir)):
+                    if not filename.endswith('.urls.json'):
+                        continue
+                    site = filename[:-len('.urls.json')]
+                    try:
+                        with open(os.path.join(day_dir, filename), 'r', encoding='utf-8') as f:
+                            urls = json.load(f)
+                    except (json.JSONDecodeError, OSError) as e:
+                        logger.warning(f"跳过无法读取的差异文件 {day}/{filename}: {str(e)}")
+                        continue
+                    for url in sorted(set(urls)):
+                        key = (ts[:10], site, 'added', url)
+                        if key not in seen:
+                            seen.add(key)
+                            imported.append({'ts': ts, 'site': site, 'event': 'added', 'url': url})
+
+            records = sorted(existing + imported, key=lambda r: r['ts'])
+            tmp_path = f"{self.log_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            os.replace(tmp_path, self.log_path)
+
+            self._index = {'days': [], 'size': 0, 'last_ts': ''}
+            self._scan_into_index(self._index)
+            self._save_index(self._index)
+            return len(imported)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    parser = argparse.ArgumentParser(description="URL 变化事件日志")
+    parser.add_argument('--history-dir', default='history', help="事件日志目录")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    query_parser = subparsers.add_parser('query', help="查询事件")
+    query_parser.add_argument('--site', help="网站名称")
+    query_parser.add_argument('--days', type=float, default=7, help="最近多少天")
+    query_parser.add_argument('--event', choices=EVENT_TYPES, help="只看新增、删除或更新")
+
+    import_parser = subparsers.add_parser('import-diff', help="从 diff/ 目录导入历史新增记录")
+    import_parser.add_argument('--diff-dir', default='diff', help="差异文件目录")
+
+    args = parser.parse_args()
+    event_log = UrlEventLog(args.history_dir)
+
+    if args.command == 'query':
+        since = datetime.now() - timedelta(days=args.days)
+        count = 0
+        for record in event_log.query(site=args.site, since=since, event=args.event):
+            print(f"{record['ts']}  {record['event']:<7}  {record['site']}  {record['url']}")
+            count += 1
+        logger.info(f"共 {count} 条事件")
+    elif args.command == 'import-diff':
+        count = event_log.import_diff_history(args.diff_dir)
+        logger.info(f"导入完成，共 {count} 条事件")
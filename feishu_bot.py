@@ -3,9 +3,9 @@
 
 import json
 import time
-import requests
 from typing import List, Dict, Any
 import logging
+from http_session import get_session
 
 logger = logging.getLogger(__name__)
 
@@ -31,7 +31,7 @@ class FeishuBot:
         }
         
         try:
-            response = requests.post(url, json=payload)
+            response = get_session().post(url, json=payload)
             response.raise_for_status()
             data = response.json()
             
@@ -130,7 +130,7 @@ class FeishuBot:
                 })
             }
 
-            response = requests.post(url, headers=headers, json=message)
+            response = get_session().post(url, headers=headers, json=message)
             response.raise_for_status()
             data = response.json()
             
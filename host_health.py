@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+按域名记录抓取失败，实现熔断和指数退避
+
+失败状态保存在 state/host_health.json，按失败的层级分别记录：
+    - 超时、连接错误和 5xx 说明整个域名不可用，记在域名（如 example.com）下
+    - 403、404、解析结果为空只与该sitemap有关，记在sitemap URL下，不影响同域名的其他网站
+    - 连续失败次数达到 failure_threshold 后熔断，在 open_hours 内直接跳过，不再发送请求
+    - 熔断到期后只发送一次探测请求（不重试）：成功则恢复，失败则熔断时间翻倍，最长 max_open_hours
+    - 熔断时间带有随机抖动，避免大量失效域名在同一次运行中同时探测
+    - 解析结果为空（快照为空的网站）也计为一次失败；内容未变化(304/哈希相同)时不改变空结果的失败计数
+单次抓取内的重试间隔同样使用带抖动的指数退避（backoff_delay）。
+"""
+
+import os
+import json
+import random
+import threading
+import requests
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEALTH_CONFIG = {
+    'failure_threshold': 3,     # 连续失败多少次后熔断
+    'open_hours': 24,           # 首次熔断的时长
+    'max_open_hours': 168,      # 熔断时长上限（之后每周探测一次）
+    'jitter': 0.2,              # 熔断时长的随机抖动比例
+    'retry_base_seconds': 2,    # 单次抓取内重试的初始间隔
+    'retry_max_seconds': 30     # 单次抓取内重试间隔上限
+}
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# 解析结果为空时记录的失败原因
+EMPTY_RESULT = '解析结果为空'
+
+
+def host_of(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+def is_host_failure(error: Exception) -> bool:
+    """超时、连接错误和 5xx 属于域名级别的失败"""
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True
+    response = getattr(error, 'response', None)
+    return isinstance(error, requests.exceptions.HTTPError) and response is not None and response.status_code >= 500
+
+
+class HostHealth:
+    def __init__(self, path: str = os.path.join("state", "host_health.json"), config: Optional[Dict] = None):
+        """初始化域名健康状态（hosts 的键为域名或sitemap URL）
+
+        Args:
+            path: 状态文件路径
+            config: host_health 配置，读取 failure_threshold / open_hours / max_open_hours / jitter /
+                    retry_base_seconds / retry_max_seconds
+        """
+        settings = dict(DEFAULT_HEALTH_CONFIG)
+        for key in DEFAULT_HEALTH_CONFIG:
+            if config and key in config:
+                settings[key] = config[key]
+
+        self.path = path
+        self.failure_threshold = max(1, int(settings['failure_threshold']))
+        self.open_hours = max(0.01, float(settings['open_hours']))
+        self.max_open_hours = max(self.open_hours, float(settings['max_open_hours']))
+        self.jitter = min(0.9, max(0.0, float(settings['jitter'])))
+        self.retry_base = max(0.0, float(settings['retry_base_seconds']))
+        self.retry_max = max(self.retry_base, float(settings['retry_max_seconds']))
+        self.hosts: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.hosts = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                logger.warning(f"域名健康状态文件损坏，重新开始: {str(e)}")
+
+    def backoff_delay(self, attempt: int) -> float:
+        """第 attempt 次（从 0 开始）重试前的等待时间：指数增长，在 [一半, 全部] 之间随机抖动"""
+        delay = min(self.retry_max, self.retry_base * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    def check(self, url: str, now: Optional[datetime] = None) -> Dict:
+        """判断是否可以请求该URL（域名和URL本身都没有熔断）
+
+        Returns:
+            {'allowed': 是否发送请求, 'probe': 是否为熔断到期后的探测请求（不重试）,
+             'reason': 跳过时的说明}
+        """
+        now = now or datetime.now()
+        probe = False
+        with self._lock:
+            for key in (host_of(url), url):
+                state = self.hosts.get(key)
+                if not state or not state.get('open_until'):
+                    continue
+                if now >= datetime.strptime(state['open_until'], TIME_FORMAT):
+                    probe = True
+                    continue
+                return {
+                    'allowed': False,
+                    'probe': False,
+                    'reason': f"熔断中，跳过 (连续失败 {state['failures']} 次，最近错误: {state.get('last_error')}，"
+                              f"下次探测: {state['open_until']})"
+                }
+        return {'allowed': True, 'probe': probe, 'reason': None}
+
+    def record_success(self, url: str, unchanged: bool = False):
+        """记录一次成功的抓取，清除域名和该URL的失败状态
+
+        unchanged 为 True（304 或内容哈希相同）且上次失败原因是解析结果为空时，内容仍然为空，保留URL的失败状态。
+        """
+        with self._lock:
+            for key in (host_of(url), url):
+                state = self.hosts.get(key)
+                if state is None:
+                    continue
+                if unchanged and state.get('last_error') == EMPTY_RESULT:
+                    continue
+                if state.get('open_until'):
+                    logger.info(f"{key} 已恢复 (此前连续失败 {state['failures']} 次)")
+                del self.hosts[key]
+
+    def record_failure(self, url: str, error: str, host_level: bool = False, now: Optional[datetime] = None):
+        """记录一次失败，连续失败达到阈值时熔断（探测失败时熔断时长翻倍）
+
+        Args:
+            url: 请求的sitemap URL
+            error: 错误描述
+            host_level: 是否为域名级别的失败（见 is_host_failure），否则只记在该URL下
+        """
+        now = now or datetime.now()
+        key = host_of(url) if host_level else url
+        with self._lock:
+            state = self.hosts.setdefault(key, {'failures': 0})
+            state['failures'] += 1
+            state['last_error'] = error
+            state['last_failure'] = now.strftime(TIME_FORMAT)
+            excess = state['failures'] - self.failure_threshold
+            if excess < 0:
+                return
+            hours = min(self.max_open_hours, self.open_hours * (2 ** excess))
+            hours *= random.uniform(1 - self.jitter, 1 + self.jitter)
+            state['open_until'] = (now + timedelta(hours=hours)).strftime(TIME_FORMAT)
+            logger.warning(f"{key} 连续失败 {state['failures']} 次，熔断至 {state['open_until']}")
+
+    def save(self):
+        """保存域名健康状态（原子替换）"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            hosts = dict(sorted(self.hosts.items()))
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(hosts, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
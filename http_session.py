@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+共享 HTTP 会话
+
+sitemap 抓取、重试、Scratch 两步请求、Webhook 和飞书机器人共用一个 requests.Session，
+按域名维护连接池并保持长连接，避免每个请求重新进行 TCP/TLS 握手。
+同时统计请求数与新建连接数，用于观察连接复用情况，并按线程记录建立连接的耗时。
+
+请求头中的 Accept-Encoding 只声明 urllib3 能够解压的压缩方式：gzip/deflate 总是支持，
+安装 brotli（或 brotlicffi）后加入 br，Python 3.14 或安装 backports.zstd 后加入 zstd。响应在读取时由 urllib3
+逐块解压，声明了无法解压的方式会导致内容乱码。
+"""
+
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.request import ACCEPT_ENCODING
+from typing import Callable, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HTTP_CONFIG = {
+    'pool_connections': 32,  # 最多缓存多少个域名的连接池
+    'pool_maxsize': 4        # 每个域名连接池保留的长连接数
+}
+
+_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+_http_config: Dict[str, int] = dict(DEFAULT_HTTP_CONFIG)
+_stats = {'requests': 0, 'new_connections': 0}
+# 包装传输适配器的函数（响应存档的录制 / 回放），为 None 时直接使用 PooledHTTPAdapter
+_adapter_wrapper: Optional[Callable] = None
+# 当前线程建立连接（DNS解析 + TCP + TLS）累计花费的时间
+_thread_timings = threading.local()
+
+
+def _increment(key: str):
+    with _lock:
+        _stats[key] += 1
+
+
+def _record_connect(seconds: float):
+    _thread_timings.connect_seconds = thread_connect_seconds() + seconds
+
+
+def thread_connect_seconds() -> float:
+    """当前线程累计的建立连接耗时，取两次调用的差值即可得到某个请求的连接耗时"""
+    return getattr(_thread_timings, 'connect_seconds', 0.0)
+
+
+class _CountingHTTPConnection(HTTPConnection):
+    def connect(self):
+        _increment('new_connections')
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _record_connect(time.perf_counter() - start)
+
+
+class _CountingHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        _increment('new_connections')
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _record_connect(time.perf_counter() - start)
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """统计请求数和新建连接数的 HTTPAdapter"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool
+        }
+
+    def send(self, request, **kwargs):
+        _increment('requests')
+        return super().send(request, **kwargs)
+
+
+def configure_http(config: Optional[Dict] = None):
+    """根据配置调整连接池大小，已创建的会话会被关闭并按新配置重建"""
+    global _session
+    new_config = dict(DEFAULT_HTTP_CONFIG)
+    for key in DEFAULT_HTTP_CONFIG:
+        if config and key in config:
+            new_config[key] = max(1, int(config[key]))
+    with _lock:
+        if new_config == _http_config:
+            return
+        _http_config.update(new_config)
+        old_session, _session = _session, None
+    if old_session is not None:
+        old_session.close()
+
+
+def wrap_adapter(wrapper: Optional[Callable]):
+    """设置包装传输适配器的函数，已创建的会话会被关闭并重建"""
+    global _session, _adapter_wrapper
+    with _lock:
+        _adapter_wrapper = wrapper
+        old_session, _session = _session, None
+    if old_session is not None:
+        old_session.close()
+
+
+def get_session() -> requests.Session:
+    """获取共享会话，首次调用时创建"""
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = PooledHTTPAdapter(
+                pool_connections=_http_config['pool_connections'],
+                pool_maxsize=_http_config['pool_maxsize']
+            )
+            if _adapter_wrapper is not None:
+                adapter = _adapter_wrapper(adapter)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+            _session = session
+            logger.info(f"HTTP会话已创建，支持的压缩方式: {ACCEPT_ENCODING}")
+        return _session
+
+
+def connection_stats() -> Dict[str, int]:
+    """返回累计的请求数、新建连接数和复用连接的请求数"""
+    with _lock:
+        stats = dict(_stats)
+    stats['reused'] = max(0, stats['requests'] - stats['new_connections'])
+    return stats
+
+
+def accept_encoding() -> str:
+    """当前环境中 urllib3 能够解压的 Accept-Encoding 取值"""
+    return ACCEPT_ENCODING
+
+
+def wire_bytes(response: requests.Response) -> Optional[int]:
+    """响应体在网络上传输的字节数（解压前），需在读取完响应体后调用"""
+    try:
+        return int(response.raw.tell())
+    except (AttributeError, TypeError, ValueError):
+        return None
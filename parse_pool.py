@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+sitemap 解析阶段
+
+extract_document 接收原始字节（或文件对象），用 iterparse 提取 <url>/<sitemap> 条目，
+XML 解析失败时按 HTML 页面提取链接。HTML 使用 lxml 的 target 解析器，只收集 <a href>，
+不构建完整的 DOM 树；页面按响应头或 <meta> 声明的字符编码解码，都没有声明时按 UTF-8 解码。函数不依赖 SitemapAnalyser 的状态，可以在子进程中运行。
+
+ParsePool 把大文档交给进程池解析，避开 GIL，使多个网站的解析可以真正并行；
+小于 min_bytes 的文档直接在当前进程解析，避免进程间传输的开销超过解析本身。
+流式下载到磁盘临时文件的文档只把文件路径传给子进程，由子进程逐块读取，不经进程间传输整个文档。
+sitemap 索引中的子sitemap由调用方抓取，这里只返回 (loc, lastmod) 列表。
+"""
+
+import io
+import os
+import re
+import gzip
+import codecs
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Union
+from lxml import etree
+import logging
+from url_metadata import pack as pack_url_meta
+
+logger = logging.getLogger(__name__)
+
+NS = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+URL_TAG = NS + 'url'
+SITEMAP_TAG = NS + 'sitemap'
+# <url>/<sitemap> 子元素的完整标签名 -> 字段名
+FIELD_TAGS = {NS + 'loc': 'loc', NS + 'lastmod': 'lastmod', NS + 'changefreq': 'changefreq', NS + 'priority': 'priority'}
+# Content-Type 中的 charset，以及 HTML 开头 <meta charset=...> / <meta http-equiv=... content="...; charset=...">
+HEADER_CHARSET = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.I)
+META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.I)
+# 查找 <meta> 声明的范围（HTML 规范要求声明出现在前 1024 字节内）
+META_SCAN_BYTES = 4096
+
+DEFAULT_PARSE_CONFIG = {
+    'workers': 0,               # 0 表示不使用进程池，全部在当前进程解析
+    'min_bytes': 1024 * 1024    # 小于该大小的文档在当前进程解析
+}
+
+
+def _open_source(source: Union[bytes, io.IOBase]):
+    """把字节或文件对象包装成从头读取的二进制流，gzip 内容自动逐块解压"""
+    stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    stream.seek(0)
+    magic = stream.read(2)
+    stream.seek(0)
+    if magic == b'\x1f\x8b':
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    return stream
+
+
+def charset_from_content_type(content_type: Optional[str]) -> Optional[str]:
+    """Content-Type 响应头中声明的 charset，没有声明时返回 None"""
+    match = HEADER_CHARSET.search(content_type or '')
+    return match.group(1) if match else None
+
+
+def html_charset(head: bytes, declared: Optional[str] = None) -> str:
+    """HTML 页面的字符编码：优先使用响应头声明的 charset，其次是页面开头 <meta> 中的 charset，都没有时为 utf-8"""
+    candidates = [declared]
+    match = META_CHARSET.search(head[:META_SCAN_BYTES])
+    if match:
+        candidates.append(match.group(1).decode('ascii'))
+    for name in candidates:
+        if not name:
+            continue
+        try:
+            return codecs.lookup(name).name
+        except LookupError:
+            logger.warning(f"未知的字符编码 {name}，忽略")
+    return 'utf-8'
+
+
+class _LinkCollector:
+    """lxml target 解析器：只收集 <a> 标签的 href"""
+
+    def __init__(self):
+        self.hrefs: List[str] = []
+
+    def start(self, tag, attrib):
+        if tag == 'a':
+            href = attrib.get('href')
+            if href is not None:
+                self.hrefs.append(href)
+
+    def end(self, tag):
+        pass
+
+    def data(self, data):
+        pass
+
+    def close(self) -> List[str]:
+        return self.hrefs
+
+
+def extract_html_links(content: str, base_url: str) -> List[str]:
+    """从普通HTML页面提取绝对链接和以 / 开头的站内链接"""
+    # 移除 XML 声明，避免 HTML 解析失败
+    if content.strip().startswith('<?xml'):
+        xml_decl_end = content.find('?>')
+        if xml_decl_end != -1:
+            content = content[xml_decl_end + 2:]
+
+    hrefs = etree.fromstring(content, etree.HTMLParser(target=_LinkCollector())) if content.strip() else []
+    base = base_url.split('//')[1].split('/')[0]
+    urls = []
+    for href in hrefs:
+        if href.startswith('http'):
+            urls.append(href)
+        elif href.startswith('/'):
+            # 将相对路径转换为绝对路径
+            urls.append(f"https://{base}{href}")
+    return urls
+
+
+def extract_document(source: Union[bytes, io.IOBase], url: str, track_meta: bool = False,
+                     charset: Optional[str] = None) -> Dict:
+    """解析 sitemap 文档
+
+    Args:
+        source: 原始内容（可以是 gzip 压缩的字节）或可 seek 的二进制文件对象
+        url: 文档地址，HTML 页面用于补全站内链接
+        track_meta: 是否提取每个URL压缩后的 lastmod/changefreq/priority
+        charset: 响应头声明的字符编码，按 HTML 页面解析时使用（XML 按其声明识别编码）
+
+    Returns:
+        {'urls': URL列表, 'children': 子sitemap (loc, lastmod) 列表, 'meta': URL元数据或 None,
+         'newest_lastmod': 最新的 <lastmod>, 'html': 是否按 HTML 页面解析}
+    """
+    urls = []
+    children = []
+    meta: Optional[Dict[str, int]] = {} if track_meta else None
+    newest_lastmod = ''
+    try:
+        for _, elem in etree.iterparse(_open_source(source), events=('end',),
+                                       tag=(URL_TAG, SITEMAP_TAG), huge_tree=True):
+            # 一次遍历子元素取出所有字段，比逐个按命名空间前缀 findtext 快得多
+            fields = {}
+            for child in elem:
+                name = FIELD_TAGS.get(child.tag)
+                if name is not None:
+                    fields[name] = child.text
+            loc = fields.get('loc')
+            lastmod = (fields.get('lastmod') or '').strip()
+            if elem.tag == URL_TAG:
+                if loc:
+                    urls.append(loc)
+                    if meta is not None:
+                        meta[loc] = pack_url_meta(lastmod, fields.get('changefreq'), fields.get('priority'))
+                if lastmod > newest_lastmod:
+                    newest_lastmod = lastmod
+            elif loc and loc.strip():
+                children.append((loc.strip(), lastmod))
+            # 清理已处理的元素及其之前的兄弟节点，避免整棵树留在内存中
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+    except etree.XMLSyntaxError:
+        data = _open_source(source).read()
+        content = data.decode(html_charset(data, charset), errors='replace')
+        return {'urls': extract_html_links(content, url), 'children': [], 'meta': None,
+                'newest_lastmod': None, 'html': True}
+
+    return {'urls': urls, 'children': children, 'meta': meta,
+            'newest_lastmod': newest_lastmod or None, 'html': False}
+
+
+def extract_file(path: str, url: str, track_meta: bool = False, charset: Optional[str] = None) -> Dict:
+    """按路径读取文档并解析（在子进程中使用，参数与返回值同 extract_document）"""
+    with open(path, 'rb') as f:
+        return extract_document(f, url, track_meta, charset)
+
+
+class ParsePool:
+    def __init__(self, config: Optional[Dict] = None):
+        """初始化解析进程池（首次使用时才启动子进程）
+
+        Args:
+            config: parsing 配置，读取 workers / min_bytes
+        """
+        settings = dict(DEFAULT_PARSE_CONFIG)
+        for key in DEFAULT_PARSE_CONFIG:
+            if config and key in config:
+                settings[key] = config[key]
+        self.workers = max(0, int(settings['workers']))
+        self.min_bytes = max(0, int(settings['min_bytes']))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # 主进程中有多个线程在运行，使用 spawn 启动子进程，避免 fork 继承线程持有的锁
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+                logger.info(f"解析进程池已启动 (进程数: {self.workers})")
+            return self._executor
+
+    def extract(self, source: Union[bytes, io.IOBase], size: int, url: str, track_meta: bool = False,
+                charset: Optional[str] = None) -> Dict:
+        """解析文档；进程池开启且文档不小于 min_bytes 时在子进程中解析"""
+        if not self.enabled or size < self.min_bytes:
+            return extract_document(source, url, track_meta, charset)
+        if not isinstance(source, (bytes, bytearray)):
+            path = getattr(source, 'name', None)
+            if isinstance(path, str) and os.path.isfile(path):
+                # 磁盘上的临时文件只传路径，内容保持压缩状态，由子进程逐块读取并解压
+                source.flush()
+                return self._get_executor().submit(extract_file, path, url, track_meta, charset).result()
+            # 内存中的缓冲区
+            source.seek(0)
+            source = source.read()
+        return self._get_executor().submit(extract_document, source, url, track_meta, charset).result()
+
+    def close(self):
+        """关闭进程池（之后再次使用时重新启动）"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+有界队列流水线
+
+每个阶段由若干工作线程组成，相邻阶段之间用有界队列连接：下游处理不过来时上游阻塞在 put 上，
+因此同时在途的任务数只取决于队列长度和各阶段的线程数，与任务总数无关；
+不同任务的不同阶段（例如一个网站在下载、另一个在解析）同时进行。
+结果按完成顺序产出，阶段函数应自行处理异常并把错误记录在任务中。
+"""
+
+import queue
+import threading
+from typing import Callable, Iterable, Iterator, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class Stage:
+    def __init__(self, name: str, func: Callable, workers: int = 1):
+        """流水线的一个阶段
+
+        Args:
+            name: 阶段名称，用于线程名和日志
+            func: 处理一个任务并返回（传给下一阶段的）任务
+            workers: 该阶段的工作线程数
+        """
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+
+
+def run_pipeline(items: Iterable, stages: List[Stage], queue_size: int = 2) -> Iterator:
+    """让 items 依次经过各阶段，按完成顺序产出最后一个阶段的结果
+
+    Args:
+        items: 输入任务，按需读取（不会一次性全部放入队列）
+        stages: 阶段列表
+        queue_size: 相邻阶段之间队列的最大长度
+    """
+    queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in range(len(stages) + 1)]
+    remaining = [stage.workers for stage in stages]
+    lock = threading.Lock()
+
+    def feed():
+        for item in items:
+            queues[0].put(item)
+        for _ in range(stages[0].workers):
+            queues[0].put(_DONE)
+
+    def work(index: int):
+        stage = stages[index]
+        source, target = queues[index], queues[index + 1]
+        while True:
+            item = source.get()
+            if item is _DONE:
+                break
+            try:
+                item = stage.func(item)
+            except Exception as e:
+                # 阶段函数本应自行处理异常；这里只防止工作线程退出导致整条流水线阻塞
+                logger.error(f"流水线阶段 {stage.name} 处理失败，已丢弃该任务: {str(e)}")
+                continue
+            target.put(item)
+        with lock:
+            remaining[index] -= 1
+            last = remaining[index] == 0
+        if last:
+            # 本阶段的最后一个线程退出时通知下一阶段的所有线程
+            downstream = stages[index + 1].workers if index + 1 < len(stages) else 1
+            for _ in range(downstream):
+                target.put(_DONE)
+
+    threads = [threading.Thread(target=feed, name='pipeline-feed', daemon=True)]
+    for index, stage in enumerate(stages):
+        for n in range(stage.workers):
+            threads.append(threading.Thread(target=work, args=(index,), name=f'{stage.name}-{n}', daemon=True))
+    for thread in threads:
+        thread.start()
+
+    while True:
+        item = queues[-1].get()
+        if item is _DONE:
+            break
+        yield item
+    for thread in threads:
+        thread.join()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+按网站变化频率自适应调整抓取间隔
+
+每个网站维护独立的抓取间隔，保存在 state/poll_schedule.json：
+    - 发现新增或删除的URL：间隔立即恢复为最小值，保证活跃网站的发现延迟不变
+    - sitemap 中最新的 <lastmod> 前进但URL没有变化：间隔减半
+    - 没有变化（包括 304 和内容哈希未变）：间隔乘以 growth，直到最大值
+    - 抓取失败：间隔不变，在最小间隔后重试
+    - 首次建立快照：无法判断是否变化，间隔不变
+首次出现的网站根据 diff/ 目录中的历史估算初始间隔：平均每隔多久出现一次新增URL，
+初始间隔取其 1/24（大约每次变化之间抓取 24 次），再限制在最小和最大间隔之间。
+"""
+
+import os
+import json
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_CONFIG = {
+    'min_interval_hours': 1,
+    'max_interval_hours': 24,
+    'growth': 1.5,
+    'tick_minutes': 10
+}
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# 估算初始间隔时，每两次变化之间期望的抓取次数
+POLLS_PER_CHANGE = 24
+
+
+class PollScheduler:
+    def __init__(self, path: str = os.path.join("state", "poll_schedule.json"),
+                 config: Optional[Dict] = None, diff_dir: str = "diff"):
+        """初始化调度器
+
+        Args:
+            path: 调度状态文件路径
+            config: polling 配置，读取 min_interval_hours / max_interval_hours / growth / tick_minutes
+            diff_dir: 差异文件目录，用于估算新网站的初始间隔
+        """
+        settings = dict(DEFAULT_POLL_CONFIG)
+        for key in DEFAULT_POLL_CONFIG:
+            if config and key in config:
+                settings[key] = config[key]
+
+        self.path = path
+        self.diff_dir = diff_dir
+        self.min_interval = max(0.01, float(settings['min_interval_hours']))
+        self.max_interval = max(self.min_interval, float(settings['max_interval_hours']))
+        self.growth = max(1.0, float(settings['growth']))
+        self.tick_minutes = max(1, int(settings['tick_minutes']))
+        self._history: Optional[Dict[str, List[str]]] = None
+        self.sites: Dict[str, Dict] = {}
+
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.sites = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                logger.warning(f"调度状态文件损坏，重新开始: {str(e)}")
+
+    def _clamp(self, hours: float) -> float:
+        return min(self.max_interval, max(self.min_interval, hours))
+
+    def _change_days(self, site: str) -> List[str]:
+        """diff/ 目录中该网站出现新增URL的日期（YYYYMMDD，升序），目录只扫描一次"""
+        if self._history is None:
+            self._history = {}
+            if os.path.isdir(self.diff_dir):
+                for day in sorted(os.listdir(self.diff_dir)):
+                    day_dir = os.path.join(self.diff_dir, day)
+                    if not (day.isdigit() and len(day) == 8 and os.path.isdir(day_dir)):
+                        continue
+                    for filename in os.listdir(day_dir):
+                        if filename.endswith('.urls.json'):
+                            self._history.setdefault(filename[:-len('.urls.json')], []).append(day)
+        return self._history.get(site, [])
+
+    def initial_interval(self, site: str) -> float:
+        """根据历史变化频率估算初始间隔（小时），没有足够历史时使用最小间隔"""
+        days = self._change_days(site)
+        if len(days) < 2:
+            return self.min_interval
+        first = datetime.strptime(days[0], "%Y%m%d")
+        last = datetime.strptime(days[-1], "%Y%m%d")
+        mean_gap_hours = (last - first).total_seconds() / 3600 / (len(days) - 1)
+        return self._clamp(mean_gap_hours / POLLS_PER_CHANGE)
+
+    def _state(self, site: str) -> Dict:
+        state = self.sites.get(site)
+        if state is None:
+            state = {'interval_hours': self.initial_interval(site), 'next_due': None}
+            self.sites[site] = state
+        return state
+
+    def due_sites(self, sitemaps: List[Dict], now: Optional[datetime] = None) -> List[Dict]:
+        """返回到期需要抓取的网站配置，保持配置中的顺序"""
+        now = now or datetime.now()
+        due = []
+        for sitemap in sitemaps:
+            next_due = self._state(sitemap['name']).get('next_due')
+            if not next_due or datetime.strptime(next_due, TIME_FORMAT) <= now:
+                due.append(sitemap)
+        return due
+
+    def record(self, site: str, status: str, changed: Optional[bool] = False,
+               lastmod: Optional[str] = None, now: Optional[datetime] = None):
+        """记录一次抓取结果并计算下次抓取时间
+
+        Args:
+            site: 网站名称
+            status: success 或 failed
+            changed: 是否有新增或删除的URL；首次抓取无法判断时为 None，保持当前间隔
+            lastmod: 本次sitemap中最新的 <lastmod>，没有解析时为 None
+            now: 当前时间
+        """
+        now = now or datetime.now()
+        state = self._state(site)
+        interval = state['interval_hours']
+
+        if status != 'success':
+            next_interval = self.min_interval
+        elif changed is None:
+            next_interval = interval
+        elif changed:
+            interval = self.min_interval
+            state['last_change'] = now.strftime(TIME_FORMAT)
+            next_interval = interval
+        elif lastmod and state.get('last_lastmod') and lastmod > state['last_lastmod']:
+            interval = self._clamp(interval / 2)
+            next_interval = interval
+        else:
+            interval = self._clamp(interval * self.growth)
+            next_interval = interval
+
+        if lastmod:
+            state['last_lastmod'] = lastmod
+        state['interval_hours'] = round(interval, 3)
+        state['last_checked'] = now.strftime(TIME_FORMAT)
+        state['next_due'] = (now + timedelta(hours=next_interval)).strftime(TIME_FORMAT)
+
+    def save(self):
+        """保存调度状态（原子替换）"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(dict(sorted(self.sites.items())), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
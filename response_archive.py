@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+原始响应存档（录制 / 回放）
+
+录制模式下共享会话的每个 GET 响应都保存到本地存档，回放模式下所有 GET 请求都从存档返回，不访问网络，
+可以在内容不再变化的真实数据上复现解析问题、比较解析器的性能：
+    <dir>/objects/<前两位>/<sha256>.z   响应体（网络上传输的原始字节，未解压），按内容哈希保存并经 zlib 压缩，相同内容只保存一次
+    <dir>/index.jsonl                  每个响应一行：URL、状态码、响应头、响应体哈希、字节数和耗时
+录制时去掉条件请求头（If-None-Match / If-Modified-Since），保证存档中每个URL都有完整的响应体；
+回放时根据存档的 ETag / Last-Modified 模拟条件请求，与服务器行为一致。
+同一URL录制多次时回放最后一次的响应。
+录制时响应体在返回前完整读取，流式下载不再边下载边解析，只用于采集数据。
+"""
+
+import io
+import os
+import json
+import time
+import zlib
+import hashlib
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from urllib3 import HTTPResponse
+from urllib3._collections import HTTPHeaderDict
+import logging
+
+from http_session import thread_connect_seconds, wrap_adapter
+
+logger = logging.getLogger(__name__)
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+CONDITIONAL_HEADERS = ('If-None-Match', 'If-Modified-Since')
+
+
+class ArchiveMissError(requests.RequestException):
+    """回放模式下存档中没有该URL的响应（不重试）"""
+
+
+class ResponseArchive:
+    def __init__(self, directory: str = "archive"):
+        """初始化响应存档
+
+        Args:
+            directory: 存档目录
+        """
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.jsonl")
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, Dict]] = None
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "objects", digest[:2], f"{digest}.z")
+
+    def save(self, url: str, status: int, reason: str, headers: List[List[str]], body: bytes, timings: Dict[str, float]):
+        """保存一个响应（可在多个线程中调用）"""
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(zlib.compress(body, 6))
+            os.replace(tmp_path, path)
+        entry = {
+            'ts': datetime.now().strftime(TIME_FORMAT),
+            'url': url,
+            'status': status,
+            'reason': reason,
+            'headers': headers,
+            'body': digest,
+            'bytes': len(body),
+            'timings': {key: round(value, 4) for key, value in timings.items()}
+        }
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            if self._entries is not None:
+                self._entries[url] = entry
+
+    def lookup(self, url: str) -> Optional[Dict]:
+        """URL 最后一次录制的响应，首次调用时读取索引"""
+        with self._lock:
+            if self._entries is None:
+                self._entries = {}
+                if os.path.exists(self.index_path):
+                    with open(self.index_path, 'r', encoding='utf-8') as f:
+                        for line in f:
+                            if line.strip():
+                                entry = json.loads(line)
+                                self._entries[entry['url']] = entry
+            return self._entries.get(url)
+
+    def body(self, entry: Dict) -> bytes:
+        """读取响应体"""
+        with open(self._object_path(entry['body']), 'rb') as f:
+            return zlib.decompress(f.read())
+
+
+def _build_raw(url: str, status: int, reason: str, headers: List[List[str]], body: bytes) -> HTTPResponse:
+    """用保存的原始字节构造 urllib3 响应，读取时按 Content-Encoding 解压，tell() 返回传输字节数"""
+    return HTTPResponse(body=io.BytesIO(body), headers=HTTPHeaderDict(headers), status=status, reason=reason,
+                        preload_content=False, decode_content=True, request_method='GET', request_url=url)
+
+
+class RecordingAdapter(BaseAdapter):
+    def __init__(self, inner: HTTPAdapter, archive: ResponseArchive):
+        """录制：通过 inner 发送请求，把 GET 响应保存到存档后再返回"""
+        super().__init__()
+        self.inner = inner
+        self.archive = archive
+
+    def send(self, request, **kwargs):
+        if request.method != 'GET':
+            return self.inner.send(request, **kwargs)
+        for header in CONDITIONAL_HEADERS:
+            request.headers.pop(header, None)
+        connect_before = thread_connect_seconds()
+        start = time.perf_counter()
+        response = self.inner.send(request, **kwargs)
+        ttfb = time.perf_counter() - start
+        start = time.perf_counter()
+        body = response.raw.read(decode_content=False)
+        download = time.perf_counter() - start
+        headers = [[key, value] for key, value in response.raw.headers.items()]
+        self.archive.save(request.url, response.status_code, response.reason or '', headers, body,
+                          {'connect': thread_connect_seconds() - connect_before, 'ttfb': ttfb, 'download': download})
+        response.raw.release_conn()
+        response.raw = _build_raw(request.url, response.status_code, response.reason or '', headers, body)
+        return response
+
+    def close(self):
+        self.inner.close()
+
+
+class ReplayAdapter(HTTPAdapter):
+    def __init__(self, inner: HTTPAdapter, archive: ResponseArchive):
+        """回放：GET 请求从存档返回，不访问网络；其他请求（如 Webhook）仍通过 inner 发送"""
+        super().__init__()
+        self.inner = inner
+        self.archive = archive
+
+    def send(self, request, **kwargs):
+        if request.method != 'GET':
+            return self.inner.send(request, **kwargs)
+        entry = self.archive.lookup(request.url)
+        if entry is None:
+            raise ArchiveMissError(f"回放存档中没有 {request.url}", request=request)
+        status, reason, body = entry['status'], entry['reason'], b''
+        headers = {key.lower(): value for key, value in entry['headers']}
+        etag = headers.get('etag')
+        last_modified = headers.get('last-modified')
+        if ((etag and request.headers.get('If-None-Match') == etag) or
+                (last_modified and request.headers.get('If-Modified-Since') == last_modified)):
+            status, reason = 304, 'Not Modified'
+        else:
+            body = self.archive.body(entry)
+        return self.build_response(request, _build_raw(request.url, status, reason, entry['headers'], body))
+
+    def close(self):
+        self.inner.close()
+        super().close()
+
+
+def install_archive(mode: str, directory: str) -> Optional[ResponseArchive]:
+    """让共享会话录制（mode 为 record）或回放（mode 为 replay）响应，其他取值不使用存档"""
+    if mode not in ('record', 'replay'):
+        if mode not in ('off', '', None):
+            logger.warning(f"未知的响应存档模式 {mode}，不使用存档")
+        wrap_adapter(None)
+        return None
+    archive = ResponseArchive(directory)
+    adapter_cls = RecordingAdapter if mode == 'record' else ReplayAdapter
+    wrap_adapter(lambda inner: adapter_cls(inner, archive))
+    logger.info(f"响应存档: {'录制到' if mode == 'record' else '从存档回放'} {directory}")
+    return archive
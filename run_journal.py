@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+分析运行日志（断点续跑）
+
+run_analysis 运行期间把每个事件追加写入 state/run_journal.jsonl，每行一个 JSON：
+    {"event": "start", "run_id": ..., "started_at": ..., "sites": [...]}
+    {"event": "result", "result": {...}}          网站分析完成（快照已保存）
+    {"event": "pending", "key": ..., "site": ..., "urls": [...], "attempts": n}
+                                                  上一次运行留下的未送达通知
+    {"event": "notified", "key": ...}             通知已送达（key 为 "产生该结果的run_id/网站名称"）
+    {"event": "finished"}                         运行正常结束
+运行被中断（超时、崩溃）后，下一次运行如果在 resume_hours 之内开始，则沿用原来的 run_id，
+跳过已完成的网站并补发未送达的通知；超过该时间则重新开始，只把未送达的通知带入新的运行。
+运行正常结束且所有通知都已送达时删除日志文件。
+"""
+
+import os
+import json
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOURNAL_CONFIG = {
+    'resume_hours': 6   # 中断的运行在多长时间内重新开始时续跑，超过后重新开始
+}
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# 未送达的通知最多带入后续运行的次数，避免 Webhook 长期不可用时无限累积
+MAX_PENDING_ATTEMPTS = 3
+
+
+def notification_key(run_id: str, site: str) -> str:
+    return f"{run_id}/{site}"
+
+
+class RunJournal:
+    def __init__(self, path: str = os.path.join("state", "run_journal.jsonl"), config: Optional[Dict] = None):
+        """初始化运行日志
+
+        Args:
+            path: 日志文件路径
+            config: journal 配置，读取 resume_hours
+        """
+        settings = dict(DEFAULT_JOURNAL_CONFIG)
+        for key in DEFAULT_JOURNAL_CONFIG:
+            if config and key in config:
+                settings[key] = config[key]
+        self.path = path
+        self.resume_hours = max(0.0, float(settings['resume_hours']))
+        self._lock = threading.Lock()
+        self._file = None
+
+    def load(self) -> Optional[Dict]:
+        """读取上一次运行的日志，不存在时返回 None
+
+        Returns:
+            {'run_id', 'started_at', 'sites', 'finished', 'results': {网站: 结果},
+             'pending': [未送达的通知], 'notified': 已送达的 key 集合}
+        """
+        if not os.path.exists(self.path):
+            return None
+        state = {'run_id': None, 'started_at': None, 'sites': [], 'finished': False,
+                 'results': {}, 'pending': [], 'notified': set()}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程被终止时最后一行可能只写了一半
+                    logger.warning("运行日志的最后一行不完整，已忽略")
+                    continue
+                event = record.get('event')
+                if event == 'start':
+                    state.update(run_id=record['run_id'], started_at=record['started_at'], sites=record['sites'])
+                elif event == 'result':
+                    state['results'][record['result']['site']] = record['result']
+                elif event == 'pending':
+                    state['pending'].append(record)
+                elif event == 'notified':
+                    state['notified'].add(record['key'])
+                elif event == 'finished':
+                    state['finished'] = True
+        return state if state['run_id'] else None
+
+    def can_resume(self, state: Optional[Dict], now: Optional[datetime] = None) -> bool:
+        """上一次运行被中断且在 resume_hours 之内开始时可以续跑"""
+        if not state or state['finished']:
+            return False
+        now = now or datetime.now()
+        started = datetime.strptime(state['started_at'], TIME_FORMAT)
+        return (now - started).total_seconds() <= self.resume_hours * 3600
+
+    @staticmethod
+    def undelivered(state: Optional[Dict]) -> List[Dict]:
+        """上一次运行中有新增URL但通知未送达的网站，以及此前带入的未送达通知"""
+        if not state:
+            return []
+        pending = [record for record in state['pending'] if record['key'] not in state['notified']]
+        # 结果按完成顺序记录，补发按该次运行的网站顺序
+        order = {site: index for index, site in enumerate(state['sites'])}
+        for site, result in sorted(state['results'].items(), key=lambda item: order.get(item[0], len(order))):
+            key = notification_key(state['run_id'], site)
+            if result['status'] == 'success' and result['new_urls'] and key not in state['notified']:
+                pending.append({'event': 'pending', 'key': key, 'site': site,
+                                'urls': result['new_urls'], 'attempts': 0})
+        return pending
+
+    def start(self, run_id: str, sites: List[str], carried: List[Dict]) -> List[Dict]:
+        """开始新的运行：重写日志，写入开始事件和从上一次运行带入的未送达通知
+
+        Returns:
+            实际带入的未送达通知（已多次补发失败的通知被丢弃）
+        """
+        lines = [{'event': 'start', 'run_id': run_id, 'started_at': datetime.now().strftime(TIME_FORMAT), 'sites': sites}]
+        for record in carried:
+            if record['attempts'] >= MAX_PENDING_ATTEMPTS:
+                logger.warning(f"{record['site']} 的 {len(record['urls'])} 个新URL多次通知失败，不再补发")
+                continue
+            lines.append(dict(record, attempts=record['attempts'] + 1))
+        self.close()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for line in lines:
+                f.write(json.dumps(line, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        return lines[1:]
+
+    def resume(self):
+        """续跑上一次中断的运行，继续追加写入原日志"""
+        self.close()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _append(self, record: Dict) -> Optional[int]:
+        """追加一行并立即写入操作系统，进程被终止时已写入的事件不会丢失（可在多个线程中调用）
+
+        Returns:
+            该行在日志中的位置（供 read_result 读回），日志未打开时返回 None
+        """
+        with self._lock:
+            if self._file is None:
+                return None
+            offset = self._file.tell()
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._file.flush()
+            return offset
+
+    def record_result(self, result: Dict) -> Optional[int]:
+        """记录网站分析完成，返回该记录在日志中的位置"""
+        return self._append({'event': 'result', 'result': result})
+
+    def read_result(self, offset: int) -> Dict:
+        """读回 record_result 在 offset 处写入的结果"""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            f.seek(offset)
+            return json.loads(f.readline())['result']
+
+    def record_notified(self, key: str):
+        """记录通知已送达"""
+        self._append({'event': 'notified', 'key': key})
+
+    def finish(self, all_delivered: bool):
+        """运行正常结束；所有通知都已送达时删除日志，否则保留以便下次补发"""
+        if all_delivered:
+            self.close()
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            return
+        self._append({'event': 'finished'})
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+运行指标收集与导出
+
+记录每个网站各阶段的耗时（连接、首字节、下载、解析、对比、保存、通知）、
+响应字节数和URL数量，运行结束后导出为：
+    reports/metrics.jsonl         每次运行追加一行运行汇总和每个网站一行明细
+    reports/sitemap_analyser.prom Prometheus textfile 格式，每次运行覆盖
+"""
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 顶层阶段，相加即为网站总耗时；connect / ttfb / download 是 fetch 的细分
+TOP_LEVEL_STAGES = ('fetch', 'parse', 'diff', 'persist', 'notify')
+HTTP_STAGES = ('connect', 'ttfb', 'download')
+
+
+class RunMetrics:
+    def __init__(self):
+        """初始化一次运行的指标收集器（线程安全）"""
+        self._lock = threading.Lock()
+        self._sites: Dict[str, Dict] = {}
+        self.started_at = time.time()
+
+    def _site(self, site: str) -> Dict:
+        record = self._sites.get(site)
+        if record is None:
+            record = {'site': site, 'status': 'unknown', 'stages': {}, 'counters': {}}
+            self._sites[site] = record
+        return record
+
+    def add_time(self, site: Optional[str], stage: str, seconds: float):
+        """累加某个网站某个阶段的耗时，site 为空时忽略"""
+        if not site:
+            return
+        with self._lock:
+            stages = self._site(site)['stages']
+            stages[stage] = stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, site: Optional[str], stage: str):
+        """计时上下文：with metrics.stage(site, 'parse'): ..."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(site, stage, time.perf_counter() - start)
+
+    def add_count(self, site: Optional[str], key: str, value: int):
+        """累加某个网站的计数（响应字节数、URL数等）"""
+        if not site:
+            return
+        with self._lock:
+            counters = self._site(site)['counters']
+            counters[key] = counters.get(key, 0) + value
+
+    def total_count(self, key: str) -> int:
+        """所有网站某项计数之和"""
+        with self._lock:
+            return sum(record['counters'].get(key, 0) for record in self._sites.values())
+
+    def set_status(self, site: str, status: str, error: Optional[str] = None):
+        """记录网站的处理结果"""
+        with self._lock:
+            record = self._site(site)
+            record['status'] = status
+            if error:
+                record['error'] = error
+
+    def site_total(self, record: Dict) -> float:
+        """网站的总耗时（顶层阶段之和）"""
+        return sum(record['stages'].get(stage, 0.0) for stage in TOP_LEVEL_STAGES)
+
+    def records(self) -> List[Dict]:
+        """所有网站指标的副本"""
+        with self._lock:
+            return [dict(record, stages=dict(record['stages']), counters=dict(record['counters']))
+                    for record in self._sites.values()]
+
+    def slowest(self, count: int = 5) -> List[Dict]:
+        """按总耗时从高到低返回最慢的网站"""
+        records = self.records()
+        records.sort(key=self.site_total, reverse=True)
+        return records[:count]
+
+    def log_slowest(self, count: int = 5):
+        """在运行汇总中输出最慢的网站及其各阶段耗时"""
+        slowest = self.slowest(count)
+        if not slowest:
+            return
+        logger.info(f"最慢的 {len(slowest)} 个网站:")
+        for record in slowest:
+            stages = ', '.join(f"{stage} {record['stages'][stage]:.2f}s"
+                               for stage in TOP_LEVEL_STAGES + HTTP_STAGES if stage in record['stages'])
+            logger.info(f"  - {record['site']}: {self.site_total(record):.2f}s ({stages})")
+
+    def write_reports(self, report_dir: str, run_info: Dict):
+        """导出 JSON lines 和 Prometheus textfile"""
+        os.makedirs(report_dir, exist_ok=True)
+        with self._lock:
+            records = [dict(record) for record in self._sites.values()]
+        records.sort(key=lambda r: r['site'])
+        run_info = dict(run_info, started_at=self.started_at, duration=round(time.time() - self.started_at, 3))
+
+        with open(os.path.join(report_dir, 'metrics.jsonl'), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(dict(run_info, type='run'), ensure_ascii=False) + '\n')
+            for record in records:
+                line = {
+                    'type': 'site',
+                    'run_id': run_info.get('run_id'),
+                    'site': record['site'],
+                    'status': record['status'],
+                    'total_seconds': round(self.site_total(record), 4),
+                    'stages': {k: round(v, 4) for k, v in sorted(record['stages'].items())},
+                    'counters': dict(sorted(record['counters'].items()))
+                }
+                if record.get('error'):
+                    line['error'] = record['error']
+                f.write(json.dumps(line, ensure_ascii=False) + '\n')
+
+        self._write_prometheus(os.path.join(report_dir, 'sitemap_analyser.prom'), records, run_info)
+
+    def _write_prometheus(self, path: str, records: List[Dict], run_info: Dict):
+        """写入 node_exporter textfile collector 可读取的格式（原子替换）"""
+        def label(value: str) -> str:
+            return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+        lines = [
+            '# HELP sitemap_analyser_run_duration_seconds Wall time of the last analysis run.',
+            '# TYPE sitemap_analyser_run_duration_seconds gauge',
+            f"sitemap_analyser_run_duration_seconds {run_info['duration']}",
+            '# HELP sitemap_analyser_run_timestamp_seconds Start time of the last analysis run.',
+            '# TYPE sitemap_analyser_run_timestamp_seconds gauge',
+            f"sitemap_analyser_run_timestamp_seconds {self.started_at:.0f}",
+            '# HELP sitemap_analyser_run_sites Number of sites in the last run by result.',
+            '# TYPE sitemap_analyser_run_sites gauge',
+        ]
+        for key in ('total_sites', 'successful_sites', 'failed_sites', 'skipped_sites'):
+            lines.append(f'sitemap_analyser_run_sites{{result="{key}"}} {run_info.get(key, 0)}')
+
+        lines += [
+            '# HELP sitemap_analyser_site_stage_seconds Time spent per site and stage in the last run.',
+            '# TYPE sitemap_analyser_site_stage_seconds gauge',
+        ]
+        for record in records:
+            for stage, seconds in sorted(record['stages'].items()):
+                lines.append(f'sitemap_analyser_site_stage_seconds{{site="{label(record["site"])}",stage="{stage}"}} {seconds:.6f}')
+
+        lines += [
+            '# HELP sitemap_analyser_site_count Per-site counters (bytes, urls) in the last run.',
+            '# TYPE sitemap_analyser_site_count gauge',
+        ]
+        for record in records:
+            for key, value in sorted(record['counters'].items()):
+                lines.append(f'sitemap_analyser_site_count{{site="{label(record["site"])}",kind="{key}"}} {value}')
+
+        lines += [
+            '# HELP sitemap_analyser_site_success Whether the site was analysed successfully in the last run.',
+            '# TYPE sitemap_analyser_site_success gauge',
+        ]
+        for record in records:
+            lines.append(f'sitemap_analyser_site_success{{site="{label(record["site"])}"}} {1 if record["status"] == "success" else 0}')
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, path)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+分片运行：把网站列表分给多个进程（或 GitHub Actions 的多个任务）并行分析，最后合并
+
+    - 网站按名称的 SHA-1 分配到分片，与配置顺序和网站数量无关，增删网站只影响该网站所在的分片
+    - 快照（sitemaps/<name>.json）、差异文件（diff/YYYYMMDD/<name>.*）和子sitemap状态按网站保存，
+      不同分片的网站互不重叠，写入的文件也不重叠；SQLite 快照存储所有网站共用一个数据库文件，不能分片运行
+    - 所有网站共用的状态文件（条件请求缓存、抓取计划、域名健康状态、耗时历史）、事件日志和运行日志
+      写入分片目录 state/shards/<index>-of-<count>/；分片开始时从 state/ 复制一份状态文件作为起点
+    - 合并时把每个分片相对起点的变化（新增、修改、删除的条目）写回 state/，事件按时间顺序追加到 history/，
+      分片的运行日志即为该分片的分析结果，由合并步骤统一发送通知，然后删除分片目录
+"""
+
+import os
+import json
+import shutil
+import hashlib
+from typing import Dict, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 所有网站共用、分片运行时写入分片目录的状态文件（顶层为字典，按条目合并）及其保存时的缩进
+SHARED_STATE_FILES = {
+    'validators.json': 2,
+    'poll_schedule.json': 2,
+    'host_health.json': 2,
+    'site_history.json': None
+}
+
+
+def shard_of(name: str, count: int) -> int:
+    """网站所属的分片编号（0 ~ count-1），同一名称在任何进程中结果相同"""
+    digest = hashlib.sha1(name.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % count
+
+
+def select_shard(sitemaps: List[Dict], index: int, count: int) -> List[Dict]:
+    """属于该分片的网站，保持配置顺序"""
+    return [sitemap for sitemap in sitemaps if shard_of(sitemap['name'], count) == index]
+
+
+def shard_dir(state_dir: str, index: int, count: int) -> str:
+    """分片写入共用状态和运行日志的目录"""
+    return os.path.join(state_dir, "shards", f"{index}-of-{count}")
+
+
+def seed_shard(state_dir: str, directory: str):
+    """把共用状态文件复制到分片目录作为起点（分片目录中已有的文件保留，中断后重新运行时继续使用）"""
+    os.makedirs(directory, exist_ok=True)
+    for filename in SHARED_STATE_FILES:
+        source = os.path.join(state_dir, filename)
+        target = os.path.join(directory, filename)
+        if os.path.exists(source) and not os.path.exists(target):
+            shutil.copyfile(source, target)
+
+
+def _load_json(path: str) -> Dict:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def apply_changes(target: Dict, base: Dict, changed: Dict):
+    """把 changed 相对 base 的变化写入 target：新增和修改的条目覆盖，base 中有而 changed 中没有的条目删除
+
+    两边都是字典的条目逐层比较，不同分片修改同一字典中不同的键时互不覆盖。
+    """
+    for key, value in changed.items():
+        old = base.get(key)
+        if old == value:
+            continue
+        if isinstance(old, dict) and isinstance(value, dict) and isinstance(target.get(key), dict):
+            apply_changes(target[key], old, value)
+        else:
+            target[key] = value
+    for key in base:
+        if key not in changed:
+            target.pop(key, None)
+
+
+def merge_state_file(state_dir: str, directories: List[str], filename: str) -> bool:
+    """把各分片对某个状态文件的修改合并回 state/，返回是否有变化"""
+    base_path = os.path.join(state_dir, filename)
+    base = _load_json(base_path)
+    merged = json.loads(json.dumps(base))
+    for directory in directories:
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            apply_changes(merged, base, _load_json(path))
+    if merged == base:
+        return False
+    tmp_path = f"{base_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(sorted(merged.items())), f, ensure_ascii=False, indent=SHARED_STATE_FILES.get(filename, 2))
+    os.replace(tmp_path, base_path)
+    return True
+
+
+def read_shard_events(directories: List[str]) -> List[Dict]:
+    """读取各分片的事件日志，按时间排序（同一时间保持分片内的顺序）"""
+    events = []
+    for directory in directories:
+        path = os.path.join(directory, "history", "events.jsonl")
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            events.extend(json.loads(line) for line in f if line.strip())
+    events.sort(key=lambda event: event['ts'])
+    return events
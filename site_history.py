@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+网站耗时历史：决定分析顺序和每个域名的请求超时
+
+历史保存在 state/site_history.json：
+    sites: 每个网站最近 history_runs 次运行的处理耗时（抓取、解析、对比、保存之和）、响应字节数和URL数
+    hosts: 每个域名最近 latency_samples 个请求的响应时间（从发出请求到收到响应头，含建立连接）
+分析时按预计耗时从长到短开始处理（没有历史的网站最先开始），整次运行的结束时间不会被排在最后的大网站拖长。
+每个域名的超时时间为响应时间的 timeout_percentile 分位数乘以 timeout_multiplier，
+限制在 min_timeout_seconds 和 max_timeout_seconds 之间；样本少于 min_samples 时使用 default_timeout_seconds。
+请求超时时把超时时间记为一个样本，持续变慢的域名的超时时间会随之增大。
+"""
+
+import os
+import json
+import math
+import threading
+import statistics
+from urllib.parse import urlparse
+from typing import Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_CONFIG = {
+    'history_runs': 10,             # 每个网站保留最近多少次运行的耗时
+    'latency_samples': 50,          # 每个域名保留最近多少个请求的响应时间
+    'min_samples': 5,               # 样本少于该数量时使用默认超时
+    'timeout_percentile': 95,
+    'timeout_multiplier': 3,
+    'min_timeout_seconds': 5,
+    'max_timeout_seconds': 60,
+    'default_timeout_seconds': 30
+}
+
+# 参与排序的处理阶段（通知在发送队列中进行，不占用分析线程）
+PIPELINE_STAGES = ('fetch', 'parse', 'diff', 'persist')
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩法分位数，values 不能为空"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class SiteHistory:
+    def __init__(self, path: str = os.path.join("state", "site_history.json"), config: Optional[Dict] = None):
+        """初始化耗时历史
+
+        Args:
+            path: 历史文件路径
+            config: site_history 配置，读取 history_runs / latency_samples / min_samples / timeout_percentile /
+                    timeout_multiplier / min_timeout_seconds / max_timeout_seconds / default_timeout_seconds
+        """
+        settings = dict(DEFAULT_HISTORY_CONFIG)
+        for key in DEFAULT_HISTORY_CONFIG:
+            if config and key in config:
+                settings[key] = config[key]
+
+        self.path = path
+        self.history_runs = max(1, int(settings['history_runs']))
+        self.latency_samples = max(1, int(settings['latency_samples']))
+        self.min_samples = max(1, int(settings['min_samples']))
+        self.timeout_percentile = min(100.0, max(1.0, float(settings['timeout_percentile'])))
+        self.timeout_multiplier = max(1.0, float(settings['timeout_multiplier']))
+        self.min_timeout = max(0.1, float(settings['min_timeout_seconds']))
+        self.max_timeout = max(self.min_timeout, float(settings['max_timeout_seconds']))
+        self.default_timeout = min(self.max_timeout, max(self.min_timeout, float(settings['default_timeout_seconds'])))
+        self.sites: Dict[str, Dict] = {}
+        self.hosts: Dict[str, List[float]] = {}
+        self._timeouts: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.sites = data.get('sites', {})
+                self.hosts = data.get('hosts', {})
+            except (json.JSONDecodeError, OSError, AttributeError) as e:
+                logger.warning(f"耗时历史文件损坏，重新开始: {str(e)}")
+
+    def expected_seconds(self, site: str) -> Optional[float]:
+        """网站最近几次运行耗时的中位数，没有历史时为 None"""
+        durations = self.sites.get(site, {}).get('durations')
+        if not durations:
+            return None
+        return statistics.median(durations)
+
+    def order(self, sitemaps: List[Dict]) -> List[Dict]:
+        """按预计耗时从长到短排序（最长处理时间优先），没有历史的网站排在最前，其余保持配置顺序"""
+        def key(item):
+            index, sitemap = item
+            expected = self.expected_seconds(sitemap['name'])
+            return (expected is not None, -(expected or 0.0), index)
+        return [sitemap for _, sitemap in sorted(enumerate(sitemaps), key=key)]
+
+    def record_run(self, records: List[Dict]):
+        """记录一次运行中各网站的耗时、响应字节数和URL数（熔断跳过、未发送请求的网站不记录耗时）
+
+        Args:
+            records: RunMetrics.records() 返回的网站指标
+        """
+        for record in records:
+            stages = record['stages']
+            if 'fetch' not in stages:
+                continue
+            entry = self.sites.setdefault(record['site'], {'durations': [], 'bytes': [], 'urls': []})
+            counters = record['counters']
+            values = {'durations': round(sum(stages.get(stage, 0.0) for stage in PIPELINE_STAGES), 3)}
+            # 304 或内容哈希未变化时没有解析，大小沿用之前的记录
+            if 'urls' in counters:
+                values.update(bytes=counters.get('response_bytes', 0), urls=counters['urls'])
+            for field, value in values.items():
+                entry[field] = (entry.get(field, []) + [value])[-self.history_runs:]
+
+    def timeout_for(self, url: str) -> float:
+        """该URL所在域名的请求超时时间（秒）"""
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            timeout = self._timeouts.get(host)
+            if timeout is None:
+                samples = self.hosts.get(host, [])
+                if len(samples) < self.min_samples:
+                    timeout = self.default_timeout
+                else:
+                    timeout = percentile(samples, self.timeout_percentile) * self.timeout_multiplier
+                    timeout = min(self.max_timeout, max(self.min_timeout, timeout))
+                self._timeouts[host] = timeout
+            return timeout
+
+    def record_latency(self, url: str, seconds: float):
+        """记录一个请求的响应时间（可在多个线程中调用）"""
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            samples = self.hosts.setdefault(host, [])
+            samples.append(round(seconds, 3))
+            del samples[:-self.latency_samples]
+            self._timeouts.pop(host, None)
+
+    def save(self):
+        """保存耗时历史（原子替换）"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            data = {'sites': dict(sorted(self.sites.items())),
+                    'hosts': {host: list(samples) for host, samples in sorted(self.hosts.items())}}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
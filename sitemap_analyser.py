@@ -2,16 +2,41 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
 import json
+import shutil
+import argparse
+import hashlib
+import tempfile
+import threading
 import requests
 import schedule
 import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
 from datetime import datetime
+from urllib.parse import urlparse
 from lxml import etree
-from typing import List, Dict, Set
+from typing import Any, Iterator, List, Dict, Set, Optional, Tuple
 import logging
 from webhook_sender import create_webhook_sender
-from datetime import datetime
+from webhook_queue import WebhookQueue
+from http_session import configure_http, get_session, connection_stats, thread_connect_seconds, accept_encoding, wire_bytes
+from run_metrics import RunMetrics
+from poll_scheduler import PollScheduler
+from url_metadata import diff_with_updates
+from fingerprint_diff import fingerprint_diff, fingerprint_meta_diff
+from parse_pool import ParsePool, charset_from_content_type, extract_document, extract_html_links, html_charset
+from validator_cache import ValidatorCache
+from host_health import HostHealth, EMPTY_RESULT, is_host_failure
+from run_journal import RunJournal, notification_key
+from site_history import SiteHistory
+from sharding import SHARED_STATE_FILES, merge_state_file, read_shard_events, seed_shard, select_shard, shard_dir
+from pipeline import Stage, run_pipeline
+from snapshot_store import create_snapshot_store, JsonSnapshotStore
+from snapshot_cache import SnapshotCache
+from response_archive import install_archive
+from event_log import UrlEventLog, EVENT_TYPES, TIME_FORMAT as EVENT_TIME_FORMAT
 
 # 配置日志
 logging.basicConfig(
@@ -21,15 +46,156 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+# 流式下载的分块大小，以及临时缓冲区在内存中的上限（超过后写入磁盘临时文件）
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_SPOOL_SIZE = 1024 * 1024
+
+
+def _looks_garbled(source, charset: Optional[str] = None) -> bool:
+    """内容开头大部分是不可打印字符时，说明压缩内容没有被正确解压（按响应头或 <meta> 声明的编码解码）"""
+    if isinstance(source, (bytes, bytearray)):
+        head = bytes(source[:200])
+    else:
+        source.seek(0)
+        head = source.read(200)
+    text = head.decode(html_charset(head, charset), errors='replace')
+    if not text:
+        return False
+    printable = sum(1 for c in text if c.isprintable() or c in '\n\r\t')
+    return printable < len(text) / 2
+
+
 class SitemapAnalyser:
-    def __init__(self, config_path: str = "config.json"):
-        """初始化Sitemap分析器"""
+    def __init__(self, config_path: str = "config.json", shard: Optional[Tuple[int, int]] = None,
+                 archive: Optional[Dict] = None):
+        """初始化Sitemap分析器
+
+        Args:
+            config_path: 配置文件路径
+            shard: 分片运行时为 (分片编号, 分片数)，只分析属于该分片的网站
+            archive: 响应存档配置 {'mode': 'record' / 'replay' / 'off', 'dir': 存档目录}，为 None 时使用配置文件中的 archive
+        """
         self.config_path = config_path
         self.sitemaps_dir = "sitemaps"
         self.diff_dir = "diff"
+        self.state_dir = "state"
+        self.history_dir = "history"
+        self.cache_dir = "cache"
         self.load_config()
+
+        # 响应存档：录制时保存每个原始响应，回放时所有抓取都从存档返回、不访问网络
+        archive_config = archive if archive is not None else self.config.get('archive', {})
+        self.archive_mode = archive_config.get('mode', 'off')
+        archive_dir = archive_config.get('dir', 'archive')
+        if self.archive_mode == 'replay':
+            # 回放在存档目录下的临时目录中写入快照、差异文件、状态和事件日志，每次回放前清空，
+            # 不影响实际运行的数据，多次回放的结果相同
+            replay_dir = os.path.join(archive_dir, "replay")
+            shutil.rmtree(replay_dir, ignore_errors=True)
+            self.sitemaps_dir = os.path.join(replay_dir, "sitemaps")
+            self.diff_dir = os.path.join(replay_dir, "diff")
+            self.state_dir = os.path.join(replay_dir, "state")
+            self.history_dir = os.path.join(replay_dir, "history")
+            self.cache_dir = os.path.join(replay_dir, "cache")
         self.ensure_directories()
 
+        # 分片运行：快照和差异文件按网站保存，不同分片互不重叠；所有网站共用的状态文件、事件日志和运行日志
+        # 写入分片目录，由合并步骤写回 state/ 和 history/
+        self.shard = shard
+        self.run_state_dir = self.state_dir
+        if shard and self.config.get('snapshot_store', {}).get('backend', 'json') == 'sqlite':
+            # 所有网站共用一个数据库文件，各分片各自修改后无法合并
+            logger.error("分片运行只支持 JSON 快照存储，SQLite 快照存储不能分片运行")
+            raise ValueError("分片运行不支持 SQLite 快照存储")
+        if shard:
+            self.run_state_dir = shard_dir(self.state_dir, *shard)
+            seed_shard(self.state_dir, self.run_state_dir)
+            self.history_dir = os.path.join(self.run_state_dir, "history")
+
+        # 共享HTTP会话的连接池配置
+        configure_http(self.config.get('http', {}))
+
+        if install_archive(self.archive_mode, archive_dir) is None:
+            self.archive_mode = 'off'
+
+        # 运行指标：每次运行重新创建，_context.site 记录当前线程正在处理的网站
+        metrics_config = self.config.get('metrics', {})
+        self.report_dir = metrics_config.get('dir', 'reports')
+        self.slowest_count = int(metrics_config.get('slowest', 5))
+        self.metrics = RunMetrics()
+        self._context = threading.local()
+
+        # 解析进程池：大文档在子进程中解析，避开 GIL
+        self.parse_pool = ParsePool(self.config.get('parsing', {}))
+
+        # 是否保存每个URL的 lastmod/changefreq/priority，用于发现内容更新的页面
+        self.track_updates = bool(self.config.get('diff', {}).get('track_updates', False))
+        # 对比引擎：set（默认，新旧快照都加载为集合）或 fingerprint（旧快照只保留 64 位指纹，适合百万级URL）
+        self.diff_engine = self.config.get('diff', {}).get('engine', 'set')
+        if self.diff_engine not in ('set', 'fingerprint'):
+            logger.warning(f"未知的对比引擎 {self.diff_engine}，使用 set")
+            self.diff_engine = 'set'
+
+        # 按网站变化频率自适应的抓取间隔（本地定时运行时使用）
+        self.poll_scheduler = PollScheduler(os.path.join(self.run_state_dir, "poll_schedule.json"),
+                                            self.config.get('polling', {}), self.diff_dir)
+
+        # 快照存储：默认每个网站一个JSON文件，可配置为SQLite（回放时数据库同样放在回放目录中）
+        store_config = dict(self.config.get('snapshot_store', {}))
+        if self.archive_mode == 'replay':
+            store_config.pop('path', None)
+        self.snapshot_store = create_snapshot_store(store_config, self.sitemaps_dir)
+
+        # URL增删事件日志（只追加）
+        self.event_log = UrlEventLog(self.history_dir)
+
+        # 域名健康状态：连续失败的域名熔断一段时间，期间直接跳过，到期后只探测一次
+        self.host_health = HostHealth(os.path.join(self.run_state_dir, "host_health.json"),
+                                      self.config.get('host_health', {}))
+
+        # 运行日志：记录每个网站的完成情况和通知送达情况，中断后重新运行时续跑
+        self.run_journal = RunJournal(os.path.join(self.run_state_dir, "run_journal.jsonl"),
+                                      self.config.get('journal', {}))
+
+        # 耗时历史：耗时长的网站先开始分析，每个域名的请求超时根据历史响应时间确定
+        self.site_history = SiteHistory(os.path.join(self.run_state_dir, "site_history.json"),
+                                        self.config.get('site_history', {}))
+
+        # 条件请求缓存：记录每个sitemap URL的 ETag / Last-Modified / 内容哈希
+        self.validator_cache = ValidatorCache(os.path.join(self.run_state_dir, "validators.json"))
+
+        # sitemap索引配置：递归深度、子sitemap数量上限、子sitemap并发抓取数
+        index_config = self.config.get('sitemap_index', {})
+        self.index_max_depth = max(1, int(index_config.get('max_depth', 2)))
+        self.index_max_children = max(1, int(index_config.get('max_children', 500)))
+        self.index_workers = max(1, int(index_config.get('workers', 4)))
+        # 子sitemap的 <lastmod>（以及每个索引的子sitemap列表）记录在 state/ 中，随仓库提交；
+        # 子sitemap的URL列表只缓存在本地 cache/ 中（不提交，与快照重复），缺失时从快照恢复或重新抓取
+        self.index_state_dir = os.path.join(self.state_dir, "sitemap_children")
+        self.index_cache_dir = os.path.join(self.cache_dir, "sitemap_children")
+
+        # 流式解析配置：超过该大小（或 .gz 文件）时边下载边解析，避免整个文档驻留内存
+        streaming_config = self.config.get('streaming', {})
+        self.stream_threshold = int(float(streaming_config.get('threshold_mb', 5)) * 1024 * 1024)
+
+        # 并发配置：全局最大并发数 + 单个域名最大并发数
+        concurrency = self.config.get('concurrency', {})
+        self.max_workers = max(1, int(concurrency.get('max_workers', 8)))
+        self.per_host_limit = max(1, int(concurrency.get('per_host', 2)))
+        self._host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_lock = threading.Lock()
+
+        # 流水线配置：抓取之后的各阶段线程数，以及阶段之间队列的长度
+        pipeline_config = self.config.get('pipeline', {})
+        self.pipeline_queue_size = max(1, int(pipeline_config.get('queue_size', 2)))
+        self.pipeline_parse_workers = max(1, int(pipeline_config.get('parse_workers', 2)))
+        self.pipeline_diff_workers = max(1, int(pipeline_config.get('diff_workers', 1)))
+        self.pipeline_persist_workers = max(1, int(pipeline_config.get('persist_workers', 1)))
+
+        # 汇总卡片默认在各网站详情之后发送（详情在网站分析完成后立即发送，汇总要等所有网站完成）；
+        # summary_first 为 True 时与早期版本一致先发汇总，各网站详情在所有网站分析完成后再发送
+        self.summary_first = bool(self.config.get('webhook', {}).get('summary_first', False))
+
     def load_config(self):
         """加载配置文件"""
         try:
@@ -42,19 +208,179 @@ class SitemapAnalyser:
             logger.error(f"配置文件 {self.config_path} 格式错误")
             raise
 
+    def enable_snapshot_cache(self):
+        """常驻进程中把快照压缩后缓存在内存中，快照文件未被修改时之后的运行不再读取和解析"""
+        cache_mb = float(self.config.get('snapshot_store', {}).get('cache_mb', 256))
+        if cache_mb <= 0:
+            return
+        if not isinstance(self.snapshot_store, JsonSnapshotStore):
+            logger.info("SQLite 快照存储按需查询，不使用快照内存缓存")
+            return
+        self.snapshot_store.cache = SnapshotCache(int(cache_mb * 1024 * 1024))
+        logger.info(f"快照内存缓存已开启，上限 {cache_mb:g} MB")
+
     def ensure_directories(self):
         """确保必要的目录存在"""
         os.makedirs(self.sitemaps_dir, exist_ok=True)
         os.makedirs(self.diff_dir, exist_ok=True)
+        os.makedirs(self.state_dir, exist_ok=True)
+
+    def _host_semaphore(self, url: str) -> threading.BoundedSemaphore:
+        """获取某个域名的并发信号量，限制同一域名同时进行的请求数"""
+        host = urlparse(url).netloc.lower()
+        with self._host_lock:
+            semaphore = self._host_semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_host_limit)
+                self._host_semaphores[host] = semaphore
+            return semaphore
+
+    def _current_site(self) -> Optional[str]:
+        """当前线程正在处理的网站名称"""
+        return getattr(self._context, 'site', None)
+
+    def _in_site_context(self, site: Optional[str], func, *args):
+        """在指定网站的上下文中执行，使子线程中的请求指标归属到该网站"""
+        previous = self._current_site()
+        self._context.site = site
+        try:
+            return func(*args)
+        finally:
+            self._context.site = previous
+
+    def _note_lastmod(self, lastmod: Optional[str]):
+        """记录当前线程解析到的最新 <lastmod>，用于调整抓取间隔"""
+        lastmod = (lastmod or '').strip()
+        if lastmod and lastmod > (getattr(self._context, 'newest_lastmod', None) or ''):
+            self._context.newest_lastmod = lastmod
+
+    def _url_meta(self) -> Optional[Dict[str, int]]:
+        """当前线程正在收集的URL元数据，未开启 track_updates 时为 None"""
+        return getattr(self._context, 'url_meta', None)
+
+    def _send_get(self, url: str, headers: Dict[str, str], stream: bool = False) -> requests.Response:
+        """发送GET请求（不做并发控制，调用方负责占用域名并发名额）
+
+        记录建立连接（含DNS解析和TLS握手）和等待响应头的耗时。超时时间由该域名的历史响应时间决定，
+        响应时间（超时时记为超时时间）计入该域名的历史。
+        """
+        site = self._current_site()
+        timeout = self.site_history.timeout_for(url)
+        connect_before = thread_connect_seconds()
+        start = time.perf_counter()
+        try:
+            response = get_session().get(url, headers=headers, timeout=timeout, stream=stream)
+            self.site_history.record_latency(url, time.perf_counter() - start)
+            return response
+        except requests.exceptions.Timeout:
+            self.site_history.record_latency(url, timeout)
+            raise
+        finally:
+            connect = thread_connect_seconds() - connect_before
+            self.metrics.add_time(site, 'connect', connect)
+            self.metrics.add_time(site, 'ttfb', time.perf_counter() - start - connect)
+
+    def _http_get(self, url: str, headers: Dict[str, str]) -> requests.Response:
+        """发送GET请求，受单域名并发上限约束"""
+        with self._host_semaphore(url):
+            return self._send_get(url, headers)
 
     def fetch_sitemap(self, url: str) -> str:
         """获取sitemap内容，包含重试机制和更好的错误处理"""
+        return self._fetch_document(url, allow_stream=False)['content']
+
+    def _build_document(self, content: Optional[str], body_hash: str, size: int,
+                        response: Optional[requests.Response] = None, raw: Optional[bytes] = None) -> Dict:
+        """组装抓取结果：内容、原始字节、响应验证器、压缩方式以及原始内容的哈希
+
+        size 为解压后的字节数；同时记录网络传输的字节数，用于确认压缩节省的流量。
+        """
+        site = self._current_site()
+        self.metrics.add_count(site, 'response_bytes', size)
+        transferred = wire_bytes(response) if response is not None else None
+        if transferred is not None:
+            self.metrics.add_count(site, 'wire_bytes', transferred)
+            encoding = response.headers.get('Content-Encoding')
+            if encoding and size:
+                logger.info(f"压缩传输({encoding}): {response.url} 传输 {transferred} 字节，解压后 {size} 字节 "
+                            f"({transferred / size:.0%})")
+        return {
+            'content': content,
+            'raw': raw,
+            'size': size,
+            'stream': None,
+            'not_modified': False,
+            'encoding': response.headers.get('Content-Encoding') if response is not None else None,
+            'content_type': response.headers.get('Content-Type') if response is not None else None,
+            'charset': charset_from_content_type(response.headers.get('Content-Type')) if response is not None else None,
+            'etag': response.headers.get('ETag') if response is not None else None,
+            'last_modified': response.headers.get('Last-Modified') if response is not None else None,
+            'body_hash': body_hash
+        }
+
+    def _should_stream(self, url: str, response: requests.Response) -> bool:
+        """判断响应是否需要走流式下载和解析
+
+        只有已知解压后大小（有 Content-Length 且没有 Content-Encoding）且不超过阈值的响应才整体读入内存；
+        分块传输或压缩传输的响应无法预先知道大小，一律流式处理。
+        """
+        if urlparse(url).path.endswith('.gz'):
+            return True
+        if 'gzip' in response.headers.get('Content-Type', ''):
+            return True
+        length = response.headers.get('Content-Length', '')
+        if not length.isdigit() or response.headers.get('Content-Encoding', 'identity') != 'identity':
+            return True
+        return int(length) > self.stream_threshold
+
+    def _download_stream(self, response: requests.Response) -> Dict:
+        """分块下载响应内容到临时缓冲区，同时计算内容哈希
+
+        开启解析进程池时直接写入磁盘临时文件，大文档只把文件路径交给子进程；否则不超过 STREAM_SPOOL_SIZE 的内容留在内存中。
+        """
+        if self.parse_pool.enabled:
+            spool = tempfile.NamedTemporaryFile(prefix='sitemap-')
+        else:
+            spool = tempfile.SpooledTemporaryFile(max_size=STREAM_SPOOL_SIZE)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with self.metrics.stage(self._current_site(), 'download'):
+                for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                    digest.update(chunk)
+                    spool.write(chunk)
+                    size += len(chunk)
+        except Exception:
+            spool.close()
+            raise
+        spool.seek(0)
+        logger.info(f"流式下载完成: {response.url} ({size} 字节)")
+        document = self._build_document(None, digest.hexdigest(), size, response)
+        document['stream'] = spool
+        return document
+
+    def _close_document(self, document: Optional[Dict]):
+        """释放流式下载使用的临时缓冲区"""
+        if document and document.get('stream') is not None:
+            document['stream'].close()
+            document['stream'] = None
+
+    def _fetch_document(self, url: str, conditional: bool = False, allow_stream: bool = True,
+                        max_retries: int = 3) -> Dict:
+        """获取sitemap内容及其缓存验证信息
+
+        conditional 为 True 时带上缓存中的 ETag / Last-Modified 发送条件请求，
+        服务器返回 304 时结果中 not_modified 为 True，content 为 None。
+        allow_stream 为 True 时大文件和 .gz 文件下载到临时缓冲区（stream 字段），
+        不解码为字符串，需由 _parse_document 解析并由 _close_document 释放。
+        超时、连接错误和 5xx 最多尝试 max_retries 次，重试间隔为带抖动的指数退避。
+        """
         headers = {
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
             'Accept-Language': 'en-US,en;q=0.9,zh-CN,zh;q=0.8',
-            # 移除 Accept-Encoding,让 requests 库自动处理压缩(gzip/deflate)
-            # 避免服务器返回 Brotli 压缩导致解压失败
+            # 只声明能够解压的压缩方式（gzip/deflate，以及已安装解码库的 br/zstd），响应由 urllib3 逐块解压
+            'Accept-Encoding': accept_encoding(),
             'Cache-Control': 'no-cache',
             'Pragma': 'no-cache',
             'Sec-Fetch-Dest': 'document',
@@ -63,24 +389,24 @@ class SitemapAnalyser:
             'Sec-Fetch-User': '?1',
             'Upgrade-Insecure-Requests': '1'
         }
-        
-        # 重试配置
-        max_retries = 3
-        retry_delay = 2
+
+        # Scratch 的内容由API结果拼接而成，不使用条件请求
+        if conditional and 'scratch.mit.edu' not in url:
+            headers.update(self.validator_cache.conditional_headers(url))
         
         for attempt in range(max_retries):
             try:
                 # 如果是Scratch网站，使用特殊的处理
                 if 'scratch.mit.edu' in url:
                     # 首先获取主页面
-                    response = requests.get(url, headers=headers, timeout=30)
+                    response = self._http_get(url, headers)
                     response.raise_for_status()
                     
                     # 提取API端点
                     base_url = "https://api.scratch.mit.edu"
                     if "/explore/projects/all" in url:
                         api_url = f"{base_url}/explore/projects?mode=trending&q=*"
-                        api_response = requests.get(api_url, headers=headers, timeout=30)
+                        api_response = self._http_get(api_url, headers)
                         api_response.raise_for_status()
                         
                         # 将API响应转换为HTML格式
@@ -90,14 +416,25 @@ class SitemapAnalyser:
                             project_url = f"/projects/{project['id']}"
                             html_content += f'<a href="{project_url}">{project.get("title", "Untitled")}</a>'
                         html_content += '</body></html>'
-                        return html_content
+                        body = html_content.encode('utf-8')
+                        return self._build_document(html_content, hashlib.sha256(body).hexdigest(), len(body))
                     
-                    return response.text
+                    return self._build_document(response.text, hashlib.sha256(response.content).hexdigest(), len(response.content))
                 
-                # 其他网站使用普通请求
-                response = requests.get(url, headers=headers, timeout=30)
-                response.raise_for_status()
-                return response.text
+                # 其他网站使用普通请求，下载内容期间一直占用域名并发名额
+                with self._host_semaphore(url):
+                    response = self._send_get(url, headers, stream=True)
+                    try:
+                        response.raise_for_status()
+                        if response.status_code == 304:
+                            return {'content': None, 'stream': None, 'not_modified': True}
+                        if allow_stream and self._should_stream(url, response):
+                            return self._download_stream(response)
+                        with self.metrics.stage(self._current_site(), 'download'):
+                            body = response.content
+                        return self._build_document(response.text, hashlib.sha256(body).hexdigest(), len(body), response, body)
+                    finally:
+                        response.close()
                 
             except requests.exceptions.HTTPError as e:
                 if e.response.status_code == 403:
@@ -108,7 +445,8 @@ class SitemapAnalyser:
                     raise requests.exceptions.HTTPError(f"404 Not Found: {url} sitemap不存在")
                 elif e.response.status_code >= 500:
                     if attempt < max_retries - 1:
-                        logger.warning(f"网站 {url} 服务器错误 {e.response.status_code}，{retry_delay}秒后重试 (第{attempt + 1}次)")
+                        retry_delay = self.host_health.backoff_delay(attempt)
+                        logger.warning(f"网站 {url} 服务器错误 {e.response.status_code}，{retry_delay:.1f}秒后重试 (第{attempt + 1}次)")
                         time.sleep(retry_delay)
                         continue
                     else:
@@ -119,7 +457,8 @@ class SitemapAnalyser:
                     raise
             except requests.exceptions.Timeout:
                 if attempt < max_retries - 1:
-                    logger.warning(f"网站 {url} 请求超时，{retry_delay}秒后重试 (第{attempt + 1}次)")
+                    retry_delay = self.host_health.backoff_delay(attempt)
+                    logger.warning(f"网站 {url} 请求超时，{retry_delay:.1f}秒后重试 (第{attempt + 1}次)")
                     time.sleep(retry_delay)
                     continue
                 else:
@@ -127,7 +466,8 @@ class SitemapAnalyser:
                     raise
             except requests.exceptions.ConnectionError:
                 if attempt < max_retries - 1:
-                    logger.warning(f"网站 {url} 连接错误，{retry_delay}秒后重试 (第{attempt + 1}次)")
+                    retry_delay = self.host_health.backoff_delay(attempt)
+                    logger.warning(f"网站 {url} 连接错误，{retry_delay:.1f}秒后重试 (第{attempt + 1}次)")
                     time.sleep(retry_delay)
                     continue
                 else:
@@ -140,27 +480,188 @@ class SitemapAnalyser:
         # 如果所有重试都失败了
         raise requests.RequestException(f"获取 {url} 失败，已重试 {max_retries} 次")
 
-    def parse_sitemap(self, content: str, url: str) -> Set[str]:
-        """解析sitemap内容或网页内容，提取URL"""
+    def parse_sitemap(self, content: str, url: str, depth: int = 0) -> Set[str]:
+        """解析sitemap内容或网页内容，提取URL
+
+        遇到sitemap索引时递归抓取其中的子sitemap，depth 为当前递归深度。
+        """
+        # 如果URL包含 scratch.mit.edu/explore，使用特殊的解析逻辑
+        if 'scratch.mit.edu/explore' in url:
+            return self.parse_scratch_page(content)
+        data = content.encode()
+        return self._extract(data, len(data), url, depth, 'utf-8')
+
+    def _parse_document(self, document: Dict, url: str, depth: int = 0) -> Set[str]:
+        """解析 _fetch_document 的结果，优先使用原始字节，由 lxml 按 XML 声明识别编码"""
+        if document.get('stream') is not None:
+            return self._extract(document['stream'], document['size'], url, depth, document.get('charset'))
+        if document.get('raw') is not None and 'scratch.mit.edu/explore' not in url:
+            return self._extract(document['raw'], document['size'], url, depth, document.get('charset'))
+        return self.parse_sitemap(document['content'], url, depth)
+
+    def parse_sitemap_stream(self, stream, url: str, depth: int = 0) -> Set[str]:
+        """使用 iterparse 流式解析sitemap，逐个提取 <loc> 并及时清理已处理的元素
+
+        内存占用只与URL集合本身有关，与文档大小无关。
+        """
+        return self._apply_extracted(extract_document(stream, url, self._url_meta() is not None), url, depth)
+
+    def _extract(self, source, size: int, url: str, depth: int, charset: Optional[str] = None) -> Set[str]:
+        """解析文档内容，大文档交给解析进程池；charset 为响应头声明的编码，按 HTML 页面解析时使用"""
         try:
-            # 如果URL包含 scratch.mit.edu/explore，使用特殊的解析逻辑
-            if 'scratch.mit.edu/explore' in url:
-                return self.parse_scratch_page(content)
-            
-            # 常规sitemap解析
-            root = etree.fromstring(content.encode())
-            urls = set()
-            for loc in root.xpath("//ns:url/ns:loc/text()",
-                                namespaces={'ns': 'http://www.sitemaps.org/schemas/sitemap/0.9'}):
-                urls.add(loc)
-            return urls
-        except etree.XMLSyntaxError:
-            # 如果解析XML失败，尝试作为HTML解析
-            logger.warning(f"XML解析失败,尝试作为HTML解析: {url}")
-            return self.parse_html_page(content, url)
+            extracted = self.parse_pool.extract(source, size, url, self._url_meta() is not None, charset)
         except Exception as e:
             logger.error(f"解析内容失败: {str(e)}")
             raise
+        return self._apply_extracted(extracted, url, depth)
+
+    def _apply_extracted(self, extracted: Dict, url: str, depth: int) -> Set[str]:
+        """合并解析结果：记录 lastmod 和URL元数据，sitemap索引则继续抓取子sitemap"""
+        if extracted['html']:
+            logger.warning(f"XML解析失败,尝试作为HTML解析: {url}")
+        if depth == 0:
+            # 记录网站的sitemap是否为索引，保存验证器时使用
+            self._context.index_document = bool(extracted['children'])
+        self._note_lastmod(extracted['newest_lastmod'])
+        meta = self._url_meta()
+        if meta is not None and extracted['meta']:
+            meta.update(extracted['meta'])
+        if extracted['children']:
+            return self._expand_sitemap_index(extracted['children'], url, depth)
+        return set(extracted['urls'])
+
+    def _expand_sitemap_index(self, children: List[tuple], url: str, depth: int) -> Set[str]:
+        """抓取索引中的子sitemap (loc, lastmod) 并合并URL
+
+        子sitemap的 <lastmod> 与上次记录的相同则不再请求：网站的sitemap索引中子sitemap列表不变、
+        所有子sitemap都未变化时直接使用网站快照中的URL，否则使用本地缓存的URL列表，没有缓存时重新抓取。
+        """
+        if depth >= self.index_max_depth:
+            raise ValueError(f"sitemap索引嵌套超过 {self.index_max_depth} 层: {url}")
+
+        if len(children) > self.index_max_children:
+            logger.warning(f"sitemap索引 {url} 包含 {len(children)} 个子sitemap，只处理前 {self.index_max_children} 个")
+            children = children[:self.index_max_children]
+
+        meta = self._url_meta()
+        states = getattr(self._context, 'index_states', None)
+        site = self._current_site()
+        child_list = sorted({child_url for child_url, _ in children})
+        unchanged = []
+        to_fetch = []
+        for child_url, lastmod in children:
+            self._note_lastmod(lastmod)
+            state = self._load_index_state(child_url)
+            if state and lastmod and state.get('lastmod') == lastmod:
+                unchanged.append((child_url, lastmod))
+                if states is not None and state != {'url': child_url, 'lastmod': lastmod}:
+                    # 旧版本的状态文件包含URL列表，重写为只记录 lastmod
+                    states[child_url] = {'url': child_url, 'lastmod': lastmod}
+            else:
+                to_fetch.append((child_url, lastmod))
+        if states is not None:
+            states[url] = {'url': url, 'children': child_list}
+
+        # 子sitemap列表和每个子sitemap都未变化时，网站的URL与快照相同
+        if (depth == 0 and not to_fetch and site and self.snapshot_exists(site)
+                and (self._load_index_state(url) or {}).get('children') == child_list):
+            logger.info(f"sitemap索引 {url}: 子sitemap {len(children)} 个均未变化，使用快照中的URL")
+            if meta is not None:
+                meta.update(self.snapshot_store.iter_meta(site))
+            return self.load_local_sitemap(site)
+
+        urls = set()
+        for child_url, lastmod in unchanged:
+            cached = self._load_index_child(child_url)
+            if cached and cached.get('lastmod') == lastmod:
+                urls.update(cached['urls'])
+                if meta is not None:
+                    meta.update(cached.get('meta', {}))
+            else:
+                to_fetch.append((child_url, lastmod))
+
+        if to_fetch:
+            workers = min(self.index_workers, len(to_fetch))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sitemap-index') as executor:
+                for child_urls, child_meta in executor.map(
+                        lambda child: self._in_site_context(site, self._fetch_index_child, child[0], child[1], depth, states),
+                        to_fetch):
+                    urls.update(child_urls)
+                    if meta is not None:
+                        meta.update(child_meta)
+
+        logger.info(f"sitemap索引 {url}: 子sitemap {len(children)} 个, 抓取 {len(to_fetch)} 个, lastmod未变跳过 {len(children) - len(to_fetch)} 个")
+        return urls
+
+    def _index_child_path(self, directory: str, child_url: str) -> str:
+        """子sitemap状态或缓存文件路径"""
+        digest = hashlib.sha1(child_url.encode('utf-8')).hexdigest()
+        return os.path.join(directory, f"{digest}.json")
+
+    def _load_index_state(self, url: str) -> Optional[Dict]:
+        """加载子sitemap记录的 lastmod（索引则为子sitemap列表）"""
+        try:
+            with open(self._index_child_path(self.index_state_dir, url), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _save_index_states(self, states: Optional[Dict[str, Dict]]):
+        """写入展开索引时记录的子sitemap状态（快照保存之后调用）"""
+        if not states:
+            return
+        os.makedirs(self.index_state_dir, exist_ok=True)
+        for url, state in states.items():
+            if self._load_index_state(url) == state:
+                continue
+            filepath = self._index_child_path(self.index_state_dir, url)
+            tmp_path = f"{filepath}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_path, filepath)
+
+    def _load_index_child(self, child_url: str) -> Optional[Dict]:
+        """加载本地缓存的子sitemap URL列表（lastmod、URL列表和URL元数据）"""
+        try:
+            with open(self._index_child_path(self.index_cache_dir, child_url), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _fetch_index_child(self, child_url: str, lastmod: str, depth: int,
+                           states: Optional[Dict[str, Dict]]) -> Tuple[Set[str], Dict[str, int]]:
+        """抓取并解析单个子sitemap，返回 (URL集合, URL元数据)，成功后更新缓存；失败时退回到上次缓存的URL"""
+        document = None
+        # 在线程池中运行，元数据先收集到本线程，再由调用方合并；嵌套的索引记录到同一份状态中
+        self._context.url_meta = {} if self.track_updates else None
+        self._context.index_states = states
+        try:
+            document = self._fetch_document(child_url)
+            urls = self._parse_document(document, child_url, depth + 1)
+            meta = self._context.url_meta or {}
+        except Exception as e:
+            cached = self._load_index_child(child_url)
+            if cached is None:
+                raise
+            logger.warning(f"子sitemap {child_url} 获取失败，使用上次缓存的 {len(cached['urls'])} 个URL: {str(e)}")
+            return set(cached['urls']), cached.get('meta', {})
+        finally:
+            self._close_document(document)
+            self._context.url_meta = None
+            self._context.index_states = None
+
+        if states is not None and lastmod:
+            states[child_url] = {'url': child_url, 'lastmod': lastmod}
+        os.makedirs(self.index_cache_dir, exist_ok=True)
+        filepath = self._index_child_path(self.index_cache_dir, child_url)
+        tmp_path = f"{filepath}.tmp"
+        entry = {'url': child_url, 'lastmod': lastmod, 'urls': sorted(urls)}
+        if meta:
+            entry['meta'] = dict(sorted(meta.items()))
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, filepath)
+        return urls, meta
 
     def parse_scratch_page(self, content: str) -> Set[str]:
         """解析Scratch项目页面"""
@@ -178,207 +679,797 @@ class SitemapAnalyser:
             raise
 
     def parse_html_page(self, content: str, base_url: str) -> Set[str]:
-        """解析普通HTML页面"""
+        """解析普通HTML页面（只收集 <a href>，不构建完整的 DOM 树）"""
         try:
-            # 修复: 移除 XML 声明,避免 etree.HTML 解析失败
-            # 如果内容以 XML 声明开头,移除它
-            if content.strip().startswith('<?xml'):
-                # 找到 XML 声明的结束位置
-                xml_decl_end = content.find('?>')
-                if xml_decl_end != -1:
-                    content = content[xml_decl_end + 2:]
-                    logger.info("已移除 XML 声明,继续 HTML 解析")
-            
-            html = etree.HTML(content)
-            urls = set()
-            for href in html.xpath('//a/@href'):
-                if href.startswith('http'):
-                    urls.add(href)
-                elif href.startswith('/'):
-                    # 将相对路径转换为绝对路径
-                    base = base_url.split('//')[1].split('/')[0]
-                    urls.add(f"https://{base}{href}")
-            return urls
+            return set(extract_html_links(content, base_url))
         except Exception as e:
             logger.error(f"解析HTML页面失败: {str(e)}")
             raise
 
-    def save_sitemap(self, name: str, urls: Set[str]):
-        """保存sitemap到本地"""
-        filepath = os.path.join(self.sitemaps_dir, f"{name}.json")
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(list(urls), f, indent=2, ensure_ascii=False)
+    def save_sitemap(self, name: str, urls: Set[str], previous: Optional[Set[str]] = None):
+        """保存sitemap到本地，previous 为已加载的旧快照，用于只写入变化部分"""
+        self.snapshot_store.save(name, urls, previous)
+
+    def snapshot_exists(self, name: str) -> bool:
+        """判断本地是否已有该网站的快照"""
+        return self.snapshot_store.exists(name)
 
     def load_local_sitemap(self, name: str) -> Set[str]:
         """加载本地sitemap"""
-        filepath = os.path.join(self.sitemaps_dir, f"{name}.json")
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return set(json.load(f))
-        except FileNotFoundError:
-            return set()
+        return self.snapshot_store.load(name)
 
-    def save_diff(self, name: str, diff_urls: Set[str]):
-        """保存差异URL到指定目录"""
+    def _merge_day_file(self, filename: str, urls: Set[str]) -> str:
+        """把URL合并写入当天的差异目录，返回日期 (YYYYMMDD)
+
+        同一天多次运行时与已有的记录合并，避免覆盖之前的记录。
+        """
         today = datetime.now().strftime("%Y%m%d")
         diff_dir = os.path.join(self.diff_dir, today)
         os.makedirs(diff_dir, exist_ok=True)
 
-        filepath = os.path.join(diff_dir, f"{name}.urls.json")
+        filepath = os.path.join(diff_dir, filename)
+        existing = set()
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                existing = set(json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
         with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(list(diff_urls), f, indent=2, ensure_ascii=False)
+            json.dump(sorted(existing | set(urls)), f, indent=2, ensure_ascii=False)
+        return today
+
+    def save_diff(self, name: str, diff_urls: Set[str]):
+        """保存差异URL到指定目录（URL首次出现索引在查询时从差异文件补充，这里不再维护）"""
+        self._merge_day_file(f"{name}.urls.json", diff_urls)
+
+    def save_updates(self, name: str, updated_urls: Set[str]):
+        """保存 lastmod 前进的URL到 diff/YYYYMMDD/<name>.updated.json"""
+        self._merge_day_file(f"{name}.updated.json", updated_urls)
 
     def analyse_sitemap(self, sitemap_config: Dict):
         """分析单个sitemap或网页"""
-        name = sitemap_config['name']
-        url = sitemap_config['url']
+        self._analyse_site(sitemap_config)
+        self.validator_cache.save()
+
+    def _describe_error(self, site_name: str, error: Exception) -> str:
+        """记录错误日志，并返回用于汇总的错误描述"""
+        if isinstance(error, requests.exceptions.HTTPError):
+            if "403 Forbidden" in str(error):
+                logger.warning(f"网站 {site_name} 禁止访问sitemap，跳过此网站")
+                return '403 禁止访问'
+            if "404 Not Found" in str(error):
+                logger.warning(f"网站 {site_name} 的sitemap不存在，跳过此网站")
+                return '404 sitemap不存在'
+            logger.error(f"处理 {site_name} 时发生HTTP错误: {str(error)}")
+            return f'HTTP错误: {str(error)}'
+        if isinstance(error, requests.exceptions.Timeout):
+            logger.error(f"网站 {site_name} 请求超时，跳过此网站")
+            return '请求超时'
+        if isinstance(error, requests.exceptions.ConnectionError):
+            logger.error(f"无法连接到网站 {site_name}，跳过此网站")
+            return '连接错误'
+        logger.error(f"处理 {site_name} 时发生未知错误: {str(error)}")
+        return f'未知错误: {str(error)}'
+
+    def _analyse_site(self, sitemap_config: Dict) -> Dict:
+        """获取、解析、对比并保存单个网站，返回该网站的分析结果
+
+        返回值中 status 为 'success' 或 'failed'，成功时 new_urls 为新增URL列表、
+        removed_count 为删除的URL数，开启 track_updates 时 updated_count 为 lastmod 前进的URL数，失败时 error 为错误描述
+        （熔断中而跳过时 skipped 为 True）；内容未变化而跳过处理时 cache 记录命中方式。
+        解析成功时 lastmod 为sitemap中最新的 <lastmod>，首次建立快照时 baseline 为 True。
+        该方法可以在线程池中并发调用；run_analysis 使用流水线把同样的各阶段分到不同线程执行。
+        """
+        job = self._new_job(sitemap_config)
+        for _, func in self._site_stages():
+            job = self._run_stage(func, job)
+        return job['result']
+
+    def _site_stages(self) -> List[Tuple[str, object]]:
+        """单个网站的处理阶段，按顺序执行"""
+        return [('fetch', self._fetch_stage), ('parse', self._parse_stage),
+                ('diff', self._diff_stage), ('persist', self._persist_stage)]
 
+    def _new_job(self, sitemap_config: Dict) -> Dict:
+        """创建在各阶段之间传递的任务，保存该网站处理过程中的全部中间状态"""
+        return {
+            'result': {'site': sitemap_config['name'], 'url': sitemap_config['url'], 'status': 'success',
+                       'new_urls': [], 'removed_count': 0},
+            'done': False,
+            'document': None,
+            'newest_lastmod': None,
+            'url_meta': {} if self.track_updates else None
+        }
+
+    def _run_stage(self, func, job: Dict) -> Dict:
+        """在网站上下文中执行一个阶段；任务已结束时直接传给下一阶段
+
+        阶段中的异常记为该网站失败。任务结束（失败、跳过或保存完成）时释放中间数据，
+        只保留分析结果。
+        """
+        if job['done']:
+            return job
+        result = job['result']
+        self._context.site = result['site']
+        self._context.newest_lastmod = job['newest_lastmod']
+        self._context.url_meta = job['url_meta']
+        self._context.index_states = job.get('index_states')
         try:
-            # 获取新的内容
-            content = self.fetch_sitemap(url)
-            new_urls = self.parse_sitemap(content, url)
-            
-            # 获取本地存储的URL
-            old_urls = self.load_local_sitemap(name)
-            
-            # 计算新增的URL
-            diff_urls = new_urls - old_urls
-            
-            if diff_urls:
-                logger.info(f"发现 {len(diff_urls)} 个新URL: {name}")
-                self.save_diff(name, diff_urls)
-            
-            # 更新本地存储
-            self.save_sitemap(name, new_urls)
-            
+            func(job)
         except Exception as e:
-            logger.error(f"处理 {name} 失败: {str(e)}")
+            result['status'] = 'failed'
+            result['error'] = self._describe_error(result['site'], e)
+            self.host_health.record_failure(result['url'], result['error'], host_level=is_host_failure(e))
+            job['done'] = True
+        finally:
+            job['newest_lastmod'] = self._context.newest_lastmod
+            if job['done']:
+                self._close_document(job['document'])
+                self.metrics.set_status(result['site'], result['status'], result.get('error'))
+                for key in ('document', 'url_meta', 'new_urls', 'old_urls', 'old_meta', 'meta_changes', 'changes',
+                            'index_states'):
+                    job.pop(key, None)
+            self._context.site = None
+            self._context.url_meta = None
+            self._context.index_states = None
+        return job
 
-    def run_analysis(self):
-        """运行所有sitemap分析"""
-        logger.info("开始分析sitemaps...")
-        
-        # 创建 Webhook 发送器
-        webhook_sender = create_webhook_sender(self.config_path)
-        
-        # 收集所有分析结果
-        analysis_results = []
-        total_new_urls = 0
-        successful_sites = 0
-        failed_sites = []
-        
-        for sitemap in self.config['sitemaps']:
-            site_name = sitemap['name']
-            site_url = sitemap['url']
-            
-            try:
-                logger.info(f"正在分析: {site_name} ({site_url})")
-                
-                # 获取新的内容
-                content = self.fetch_sitemap(site_url)
-                new_urls = self.parse_sitemap(content, site_url)
-                
+    def _fetch_stage(self, job: Dict):
+        """抓取阶段：检查熔断状态并发送（条件）请求；内容未变化时结束任务"""
+        result = job['result']
+        site_name = result['site']
+        site_url = result['url']
+        logger.info(f"正在分析: {site_name} ({site_url})")
+
+        # 域名或该sitemap熔断中时不发送请求；熔断到期后的探测请求不重试。回放时不访问网络，不检查熔断
+        if self.archive_mode == 'replay':
+            health = {'allowed': True, 'probe': False, 'reason': None}
+        else:
+            health = self.host_health.check(site_url)
+        if not health['allowed']:
+            logger.warning(f"{site_name}: {health['reason']}")
+            result['status'] = 'failed'
+            result['error'] = health['reason']
+            result['skipped'] = True
+            job['done'] = True
+            return
+        if health['probe']:
+            logger.info(f"熔断到期，发送探测请求: {site_name}")
+
+        # 本地已有快照且上次是普通sitemap时发送条件请求，304 时跳过解析、对比和保存。
+        # sitemap索引本身经常不变（没有或不更新 <lastmod>），子sitemap的变化只有展开后才能发现，
+        # 因此索引（以及还没有记录文档类型的旧缓存）每次都完整处理，跳过 <lastmod> 未变化的子sitemap。
+        # 回放用于复现和比较解析过程，每个文档都完整处理
+        job['has_snapshot'] = has_snapshot = self.snapshot_exists(site_name)
+        cached = self.validator_cache.get(site_url)
+        leaf = (self.archive_mode != 'replay' and has_snapshot and cached is not None
+                and cached.get('index') is False)
+        with self.metrics.stage(site_name, 'fetch'):
+            job['document'] = document = self._fetch_document(site_url, conditional=leaf,
+                                                              max_retries=1 if health['probe'] else 3)
+        if document['not_modified']:
+            logger.info(f"内容未变化(304)，跳过处理: {site_name}")
+            self.host_health.record_success(site_url, unchanged=True)
+            result['cache'] = 'not_modified'
+            job['done'] = True
+            return
+
+        # 服务器不支持条件请求时，比较原始内容哈希，与上次快照一致则同样跳过
+        if leaf and cached.get('body_hash') == document['body_hash']:
+            logger.info(f"内容哈希未变化，跳过处理: {site_name}")
+            self.host_health.record_success(site_url, unchanged=True)
+            # 刷新验证器，服务器之后可能开始支持条件请求
+            self.validator_cache.update(site_url, document['etag'], document['last_modified'], document['body_hash'])
+            result['cache'] = 'content_hash'
+            job['done'] = True
+
+    def _parse_stage(self, job: Dict):
+        """解析阶段：提取URL（sitemap索引的子sitemap在此阶段抓取），解析后立即释放下载内容"""
+        result = job['result']
+        site_name = result['site']
+        document = job['document']
+        self._context.index_document = False
+        # 展开索引时记录的子sitemap状态，快照保存后再写入，避免记录了 lastmod 而快照未保存
+        job['index_states'] = self._context.index_states = {}
+        with self.metrics.stage(site_name, 'parse'):
+            job['new_urls'] = new_urls = self._parse_document(document, result['url'])
+        self._close_document(document)
+        # 后续阶段只需要验证器，不再保留内容
+        job['document'] = {key: document.get(key) for key in ('etag', 'last_modified', 'body_hash')}
+        job['document']['index'] = self._context.index_document
+        result['lastmod'] = self._context.newest_lastmod
+        if new_urls:
+            self.host_health.record_success(result['url'])
+        else:
+            # 返回空结果的网站（被拦截、页面改版等）同样计入失败，持续为空时会被熔断
+            logger.warning(f"解析结果为空: {site_name}")
+            self.host_health.record_failure(result['url'], EMPTY_RESULT)
+        if not job['has_snapshot']:
+            result['baseline'] = True
+
+    def _diff_stage(self, job: Dict):
+        """对比阶段：与本地快照对比，得到新增、删除和 lastmod 前进的URL"""
+        site_name = job['result']['site']
+        new_urls = job['new_urls']
+        new_meta = job['url_meta']
+        metrics = self.metrics
+        with metrics.stage(site_name, 'diff'):
+            if self.diff_engine == 'fingerprint':
+                # 不加载旧快照的URL集合和旧元数据，逐条读取后按指纹对比
+                old_urls = old_meta = None
+                diff_urls, removed_urls = fingerprint_diff(
+                    new_urls, lambda: self.snapshot_store.iter_urls(site_name))
+                updated_urls = set()
+                if new_meta is not None:
+                    updated_urls, changed_meta, removed_meta = fingerprint_meta_diff(
+                        new_meta, self.snapshot_store.iter_meta(site_name))
+                    job['meta_changes'] = (changed_meta, removed_meta)
+            else:
                 # 获取本地存储的URL
                 old_urls = self.load_local_sitemap(site_name)
-                
-                # 计算新增的URL
-                diff_urls = new_urls - old_urls
-                
-                if diff_urls:
-                    logger.info(f"发现 {len(diff_urls)} 个新URL: {site_name}")
-                    self.save_diff(site_name, diff_urls)
-                    total_new_urls += len(diff_urls)
-                    
-                    # 添加到分析结果
-                    analysis_results.append({
-                        'site': site_name,
-                        'urls': list(diff_urls)
-                    })
+                old_meta = self.snapshot_store.load_meta(site_name) if new_meta is not None else None
+
+                # 计算新增和删除的URL；记录了元数据时同一次遍历中找出 lastmod 前进的URL
+                if new_meta is not None:
+                    diff_urls, updated_urls = diff_with_updates(new_urls, new_meta, old_urls, old_meta)
                 else:
-                    logger.info(f"没有发现新URL: {site_name}")
-                
-                # 更新本地存储
+                    diff_urls = new_urls - old_urls
+                    updated_urls = set()
+                removed_urls = old_urls - new_urls
+        metrics.add_count(site_name, 'urls', len(new_urls))
+        metrics.add_count(site_name, 'added_urls', len(diff_urls))
+        metrics.add_count(site_name, 'removed_urls', len(removed_urls))
+        metrics.add_count(site_name, 'updated_urls', len(updated_urls))
+        job['old_urls'] = old_urls
+        job['old_meta'] = old_meta
+        job['changes'] = (diff_urls, removed_urls, updated_urls)
+
+    def _persist_stage(self, job: Dict):
+        """保存阶段：写入差异、快照、元数据和事件日志，最后记录验证器"""
+        result = job['result']
+        site_name = result['site']
+        new_urls = job['new_urls']
+        new_meta = job['url_meta']
+        old_urls = job['old_urls']
+        diff_urls, removed_urls, updated_urls = job['changes']
+        document = job['document']
+        with self.metrics.stage(site_name, 'persist'):
+            if diff_urls:
+                logger.info(f"发现 {len(diff_urls)} 个新URL: {site_name}")
+                self.save_diff(site_name, diff_urls)
+                # 排序后输出，保证通知内容在并发模式下也保持稳定
+                result['new_urls'] = sorted(diff_urls)
+            else:
+                logger.info(f"没有发现新URL: {site_name}")
+            if removed_urls:
+                logger.info(f"有 {len(removed_urls)} 个URL被删除: {site_name}")
+                result['removed_count'] = len(removed_urls)
+            if updated_urls:
+                logger.info(f"有 {len(updated_urls)} 个URL的lastmod更新: {site_name}")
+                self.save_updates(site_name, updated_urls)
+                result['updated_count'] = len(updated_urls)
+
+            # 更新本地存储，快照保存成功后再记录验证器，避免304跳过未保存的内容
+            if old_urls is not None:
+                self.save_sitemap(site_name, new_urls, previous=old_urls)
+            elif diff_urls or removed_urls or not job['has_snapshot']:
+                # 指纹对比时没有旧集合，只在有变化时重写快照
                 self.save_sitemap(site_name, new_urls)
-                successful_sites += 1
-                
-            except requests.exceptions.HTTPError as e:
-                if "403 Forbidden" in str(e):
-                    logger.warning(f"网站 {site_name} 禁止访问sitemap，跳过此网站")
-                    failed_sites.append({
-                        'site': site_name,
-                        'error': '403 禁止访问',
-                        'url': site_url
-                    })
-                elif "404 Not Found" in str(e):
-                    logger.warning(f"网站 {site_name} 的sitemap不存在，跳过此网站")
-                    failed_sites.append({
-                        'site': site_name,
-                        'error': '404 sitemap不存在',
-                        'url': site_url
-                    })
+            if new_meta is not None:
+                self.snapshot_store.save_meta(site_name, new_meta, previous=job['old_meta'],
+                                              changes=job.get('meta_changes'))
+            self.event_log.append(site_name, diff_urls, removed_urls, updated=updated_urls)
+            self._save_index_states(job['index_states'])
+            self.validator_cache.update(result['url'], document['etag'], document['last_modified'], document['body_hash'],
+                                        index=document['index'])
+        job['done'] = True
+
+    def _analyse_all(self, sitemaps: List[Dict]) -> Iterator[Dict]:
+        """用有界队列流水线分析所有网站，按完成顺序逐个产出分析结果
+
+        抓取、解析、对比、保存各阶段使用各自的线程，阶段之间的队列长度固定，
+        同时在途的网站数与网站总数无关；网站保存完成后只保留分析结果，中间数据随即释放。
+        网站按历史耗时从长到短进入流水线，避免耗时长的网站最后才开始而拖长整次运行。
+        """
+        if len(sitemaps) <= 1:
+            for sitemap in sitemaps:
+                yield self._analyse_site(sitemap)
+            return
+
+        workers = {'fetch': min(self.max_workers, len(sitemaps)), 'parse': self.pipeline_parse_workers,
+                   'diff': self.pipeline_diff_workers, 'persist': self.pipeline_persist_workers}
+        stages = [Stage(name, lambda job, func=func: self._run_stage(func, job), workers[name])
+                  for name, func in self._site_stages()]
+        logger.info(f"流水线分析 {len(sitemaps)} 个网站 (抓取: {workers['fetch']}, 解析: {workers['parse']}, "
+                    f"对比: {workers['diff']}, 保存: {workers['persist']}, 单域名并发: {self.per_host_limit})")
+        jobs = (self._new_job(sitemap) for sitemap in self.site_history.order(sitemaps))
+        for job in run_pipeline(jobs, stages, self.pipeline_queue_size):
+            yield job['result']
+
+    def _map_sites(self, func, sitemaps: List[Dict], action: str) -> List[Dict]:
+        """在线程池中对每个网站执行 func，结果顺序与配置顺序一致"""
+        if self.max_workers > 1 and len(sitemaps) > 1:
+            workers = min(self.max_workers, len(sitemaps))
+            logger.info(f"并发{action} {len(sitemaps)} 个网站 (并发数: {workers}, 单域名并发: {self.per_host_limit})")
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sitemap') as executor:
+                # executor.map 按提交顺序返回结果，保证汇总顺序稳定
+                return list(executor.map(func, sitemaps))
+        return [func(sitemap) for sitemap in sitemaps]
+
+    def _check_site(self, sitemap_config: Dict) -> Dict:
+        """健康检查单个网站：只发送一次请求，记录压缩方式、文档类型和URL数量，不保存任何状态
+
+        status 为 'ok'、'not_modified'（条件请求返回304）、'warning'（能获取但内容异常）或 'failed'，
+        kind 为 'urlset'、'index'（只统计子sitemap数量，不抓取子sitemap）、'html' 或 'xml'（XML 中没有 <url>/<sitemap>）。
+        """
+        site_name = sitemap_config['name']
+        site_url = sitemap_config['url']
+        entry = {'site': site_name, 'url': site_url, 'status': 'ok', 'kind': None, 'encoding': None,
+                 'content_type': None, 'bytes': 0, 'urls': 0, 'children': 0, 'issue': None}
+        document = None
+        start = time.perf_counter()
+        self._context.site = site_name
+
+        try:
+            # 与分析共用条件请求缓存：本地已有快照且内容未变化时服务器返回304，不需要下载
+            has_snapshot = self.snapshot_exists(site_name)
+            document = self._fetch_document(site_url, conditional=has_snapshot)
+            if document['not_modified']:
+                entry['status'] = 'not_modified'
+                entry['urls'] = len(self.load_local_sitemap(site_name))
+                return entry
+
+            entry['encoding'] = document['encoding'] or 'none'
+            entry['content_type'] = document['content_type']
+            entry['bytes'] = document['size']
+            if 'scratch.mit.edu/explore' in site_url:
+                entry['kind'] = 'html'
+                entry['urls'] = len(self.parse_scratch_page(document['content']))
+            else:
+                source = document['stream'] if document['stream'] is not None else document['raw']
+                extracted = self.parse_pool.extract(source, document['size'], site_url, charset=document['charset'])
+                if extracted['html']:
+                    entry['kind'] = 'html'
                 else:
-                    logger.error(f"处理 {site_name} 时发生HTTP错误: {str(e)}")
-                    failed_sites.append({
-                        'site': site_name,
-                        'error': f'HTTP错误: {str(e)}',
-                        'url': site_url
-                    })
-            except requests.exceptions.Timeout:
-                logger.error(f"网站 {site_name} 请求超时，跳过此网站")
-                failed_sites.append({
-                    'site': site_name,
-                    'error': '请求超时',
-                    'url': site_url
-                })
-            except requests.exceptions.ConnectionError:
-                logger.error(f"无法连接到网站 {site_name}，跳过此网站")
-                failed_sites.append({
-                    'site': site_name,
-                    'error': '连接错误',
-                    'url': site_url
-                })
-            except Exception as e:
-                logger.error(f"处理 {site_name} 时发生未知错误: {str(e)}")
-                failed_sites.append({
-                    'site': site_name,
-                    'error': f'未知错误: {str(e)}',
-                    'url': site_url
-                })
-        
-        # 输出分析统计
-        total_sites = len(self.config['sitemaps'])
-        logger.info(f"分析完成 - 总网站数: {total_sites}, 成功: {successful_sites}, 失败: {len(failed_sites)}, 新增URL总数: {total_new_urls}")
-        
+                    entry['kind'] = 'index' if extracted['children'] else 'urlset' if extracted['urls'] else 'xml'
+                entry['urls'] = len(extracted['urls'])
+                entry['children'] = len(extracted['children'])
+                if extracted['html'] and not extracted['urls'] and _looks_garbled(source, document['charset']):
+                    entry['status'] = 'warning'
+                    entry['issue'] = f"内容无法解码 (压缩方式: {entry['encoding']})"
+
+            if entry['status'] == 'ok' and not entry['urls'] and not entry['children']:
+                entry['status'] = 'warning'
+                entry['issue'] = '解析成功但未找到 URL'
+
+        except Exception as e:
+            entry['status'] = 'failed'
+            entry['issue'] = self._describe_error(site_name, e)
+        finally:
+            self._close_document(document)
+            self._context.site = None
+            entry['seconds'] = round(time.perf_counter() - start, 3)
+
+        return entry
+
+    def check_sites(self, sitemaps: Optional[List[Dict]] = None) -> List[Dict]:
+        """并发检查所有网站的可访问性、压缩方式和解析情况，并写入 reports/health_check.json
+
+        每个网站只请求一次，不保存快照、不发送通知，也不更新条件请求缓存
+        （否则之后的分析会因304跳过尚未保存的内容）。熔断中的域名同样会被检查，检查结果不计入域名健康状态。
+        """
+        if sitemaps is None:
+            sitemaps = self.config['sitemaps']
+        logger.info(f"开始健康检查 {len(sitemaps)} 个网站...")
+        entries = self._map_sites(self._check_site, sitemaps, "检查")
+        self.parse_pool.close()
+
+        for entry in entries:
+            if entry['status'] == 'failed':
+                logger.warning(f"  ✗ {entry['site']}: {entry['issue']}")
+            elif entry['status'] == 'not_modified':
+                logger.info(f"  ✓ {entry['site']}: 内容未变化(304)，本地快照 {entry['urls']} 个 URL")
+            elif entry['kind'] == 'index':
+                logger.info(f"  ✓ {entry['site']}: Sitemap Index, {entry['children']} 个子 sitemap (压缩方式: {entry['encoding']})")
+            else:
+                marker = '✓' if entry['status'] == 'ok' else '⚠️ '
+                issue = f", {entry['issue']}" if entry['issue'] else ''
+                logger.info(f"  {marker} {entry['site']}: {entry['kind']}, {entry['urls']} 个 URL (压缩方式: {entry['encoding']}{issue})")
+
+        counts = {status: 0 for status in ('ok', 'not_modified', 'warning', 'failed')}
+        for entry in entries:
+            counts[entry['status']] += 1
+        logger.info(f"健康检查完成 - 总计: {len(entries)}, 正常: {counts['ok']}, 未变化(304): {counts['not_modified']}, "
+                    f"异常: {counts['warning']}, 失败: {counts['failed']}")
+
+        report_path = os.path.join(self.report_dir, "health_check.json")
+        try:
+            os.makedirs(self.report_dir, exist_ok=True)
+            with open(report_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'checked_at': datetime.now().isoformat(timespec='seconds'),
+                    'summary': dict(counts, total=len(entries)),
+                    'sites': entries
+                }, f, ensure_ascii=False, indent=2)
+            logger.info(f"健康检查报告已保存: {report_path}")
+        except OSError as e:
+            logger.error(f"写入健康检查报告失败: {str(e)}")
+        return entries
+
+    def run_due(self):
+        """只分析已到抓取时间的网站（本地定时运行使用）"""
+        sitemaps = self.config['sitemaps']
+        due = self.poll_scheduler.due_sites(sitemaps)
+        if not due:
+            logger.info("没有到期需要抓取的网站")
+            return
+        logger.info(f"{len(due)}/{len(sitemaps)} 个网站到期需要抓取")
+        self.run_analysis(due)
+
+    def run_analysis(self, sitemaps: Optional[List[Dict]] = None):
+        """运行sitemap分析，默认分析配置中的所有网站（分片运行时只分析属于本分片的网站）"""
+        if sitemaps is None:
+            sitemaps = self.config['sitemaps']
+        if self.shard:
+            index, count = self.shard
+            total = len(sitemaps)
+            sitemaps = select_shard(sitemaps, index, count)
+            logger.info(f"分片 {index + 1}/{count}: 分析 {len(sitemaps)}/{total} 个网站，结果由合并步骤统一通知")
+        logger.info("开始分析sitemaps...")
+        http_stats_before = connection_stats()
+        self.metrics = RunMetrics()
+
+        # 上一次运行被中断且在 resume_hours 之内时续跑：沿用 run_id，跳过已完成的网站；
+        # 否则开始新的运行，只把上一次运行未送达的通知带过来（分片运行不发送通知，由合并步骤补发）
+        previous = self.run_journal.load()
+        resumed: Dict[str, Dict] = {}
+        if self.run_journal.can_resume(previous):
+            run_id = previous['run_id']
+            names = {sitemap['name'] for sitemap in sitemaps}
+            resumed = {site: result for site, result in previous['results'].items() if site in names}
+            undelivered = [] if self.shard else RunJournal.undelivered(previous)
+            self.run_journal.resume()
+            logger.info(f"续跑中断的运行 {run_id}: 跳过 {len(resumed)} 个已完成的网站")
+        else:
+            run_id = datetime.now().strftime("%Y%m%d%H%M%S")
+            undelivered = self.run_journal.start(run_id, [sitemap['name'] for sitemap in sitemaps],
+                                                 [] if self.shard else RunJournal.undelivered(previous))
+
+        # 网站的新增URL在保存完成后立即进入发送队列，与其余网站的分析并行发送；回放存档的结果不发送通知
+        notifier = None if self.shard or self.archive_mode == 'replay' else self._start_notifier()
+
+        # 续跑时沿用的结果只计入汇总，其中未送达的通知由 _resend_undelivered 补发
+        results = self._analyse_all([sitemap for sitemap in sitemaps if sitemap['name'] not in resumed])
+        summary = self._collect_results(run_id, sitemaps, results, notifier, record_schedule=True,
+                                        resumed=list(resumed.values()))
+        self._resend_undelivered(notifier, undelivered)
+
+        # 保存条件请求缓存、抓取计划、域名健康状态和耗时历史
+        self.validator_cache.save()
+        self.site_history.record_run(self.metrics.records())
+        try:
+            self.poll_scheduler.save()
+            self.host_health.save()
+            self.site_history.save()
+        except OSError as e:
+            logger.error(f"保存抓取计划、域名健康状态或耗时历史失败: {str(e)}")
+
+        self._finish_run(summary, notifier)
+
+        # 输出本次运行的连接复用情况
+        http_stats = connection_stats()
+        requests_sent = http_stats['requests'] - http_stats_before['requests']
+        new_connections = http_stats['new_connections'] - http_stats_before['new_connections']
+        logger.info(f"HTTP连接 - 请求数: {requests_sent}, 新建连接: {new_connections}, 复用连接: {max(0, requests_sent - new_connections)}")
+        response_bytes = self.metrics.total_count('response_bytes')
+        transferred_bytes = self.metrics.total_count('wire_bytes')
+        if response_bytes:
+            logger.info(f"传输字节 - 网络传输: {transferred_bytes}, 解压后: {response_bytes} ({transferred_bytes / response_bytes:.0%})")
+        snapshot_cache = getattr(self.snapshot_store, 'cache', None)
+        if snapshot_cache is not None:
+            cache_stats = snapshot_cache.take_stats()
+            logger.info(f"快照缓存 - 命中: {cache_stats['hits']}, 未命中: {cache_stats['misses']}, "
+                        f"缓存条目: {cache_stats['entries']}, 占用: {cache_stats['bytes'] / 1024 / 1024:.1f} MB")
+
+        # 输出最慢的网站，并导出本次运行的指标报告
+        self.metrics.log_slowest(self.slowest_count)
+        try:
+            self.metrics.write_reports(self.report_dir, {
+                'run_id': run_id,
+                'total_sites': summary['total_sites'],
+                'successful_sites': summary['successful_sites'],
+                'failed_sites': len(summary['failed_sites']),
+                'not_modified_sites': summary['not_modified_sites'],
+                'unchanged_hash_sites': summary['unchanged_hash_sites'],
+                'skipped_sites': summary['skipped_sites'],
+                'total_new_urls': summary['total_new_urls'],
+                'total_removed_urls': summary['total_removed_urls'],
+                'total_updated_urls': summary['total_updated_urls'],
+                'http_requests': requests_sent,
+                'http_new_connections': new_connections,
+                'response_bytes': response_bytes,
+                'wire_bytes': transferred_bytes
+            })
+        except OSError as e:
+            logger.error(f"写入指标报告失败: {str(e)}")
+
+        logger.info("sitemap分析完成")
+
+    def _start_notifier(self) -> Optional[Dict]:
+        """创建 Webhook 发送器和发送队列，未配置 Webhook 时返回 None"""
+        webhook_sender = create_webhook_sender(self.config_path)
+        if not webhook_sender:
+            return None
+        webhook_queue = WebhookQueue(webhook_sender, self.config.get('webhook', {}), self.metrics)
+        webhook_queue.start()
+        return {'sender': webhook_sender, 'queue': webhook_queue, 'submitted': set(), 'delivered': set()}
+
+    def _notify(self, notifier: Dict, key: str, site: str, urls: List[str]):
+        """把一个网站的新增URL放入发送队列，送达后记录到运行日志"""
+        def on_done(delivered: bool):
+            if delivered:
+                notifier['delivered'].add(key)
+                self.run_journal.record_notified(key)
+        notifier['submitted'].add(key)
+        notifier['queue'].submit_site(site, urls, on_done)
+
+    def _collect_results(self, run_id: str, sitemaps: List[Dict], results: Iterator[Dict],
+                         notifier: Optional[Dict], record_schedule: bool, resumed: Optional[List[Dict]] = None) -> Dict:
+        """逐个记录网站的分析结果：写入运行日志、按配置顺序放入发送队列并累加汇总计数
+
+        结果按完成顺序到达，通知按配置顺序发送：排在前面的网站尚未完成时，后面网站的结果
+        只保留其在运行日志中的位置，轮到时再从日志读回，内存中不保留等待中的新增URL。
+        record_schedule 为 True 时同时更新抓取计划（合并分片时各分片已经更新过）。
+        resumed 为续跑时沿用的结果，已经写入运行日志、通知也已发送或由调用方补发，只计入汇总和抓取计划。
+        """
+        summary = {
+            'total_sites': len(sitemaps),
+            'successful_sites': 0,
+            'failed_sites': [],
+            'notified_sites': 0,
+            'not_modified_sites': 0,
+            'unchanged_hash_sites': 0,
+            'skipped_sites': 0,
+            'total_new_urls': 0,
+            'total_removed_urls': 0,
+            'total_updated_urls': 0
+        }
+        order = {sitemap['name']: index for index, sitemap in enumerate(sitemaps)}
+        # 配置序号 -> 待发送结果在运行日志中的位置（或结果本身）；None 表示该网站不需要发送通知
+        waiting: Dict[int, Any] = {}
+        next_index = 0
+
+        def notify(entry):
+            result = entry if isinstance(entry, dict) else self.run_journal.read_result(entry)
+            self._notify(notifier, notification_key(run_id, result['site']), result['site'], result['new_urls'])
+
+        # 先发汇总时，所有网站的详情都等到汇总之后再发送
+        defer = bool(notifier) and self.summary_first
+        for result in resumed or []:
+            self._count_result(summary, result, record_schedule)
+            if result['site'] in order:
+                waiting[order[result['site']]] = None
+        for result in results:
+            offset = self.run_journal.record_result(result)
+            self._count_result(summary, result, record_schedule)
+            # 不在配置中的网站排在最后
+            index = order.get(result['site'], len(order) + len(waiting))
+            needs_notify = notifier and result['status'] == 'success' and result['new_urls']
+            if defer or index != next_index:
+                waiting[index] = (result if offset is None else offset) if needs_notify else None
+                continue
+            # 发送队列有长度上限，通知发送不过来时这里阻塞，流水线随之放慢
+            if needs_notify:
+                notify(result)
+            next_index += 1
+            while next_index in waiting:
+                entry = waiting.pop(next_index)
+                if entry is not None:
+                    notify(entry)
+                next_index += 1
+        # 失败列表按配置顺序输出
+        summary['failed_sites'].sort(key=lambda failed: order.get(failed['site'], len(order)))
+        if defer:
+            self._submit_summary(notifier, summary)
+        # 有网站没有产出结果时，排在它后面的结果仍按配置顺序发送
+        for index in sorted(waiting):
+            if waiting[index] is not None:
+                notify(waiting[index])
+        return summary
+
+    def _count_result(self, summary: Dict, result: Dict, record_schedule: bool):
+        """把一个网站的结果计入汇总，record_schedule 为 True 时同时更新抓取计划"""
+        if record_schedule:
+            self.poll_scheduler.record(
+                result['site'], result['status'],
+                # 首次建立快照时所有URL都是新增，不能说明网站的变化频率
+                changed=None if result.get('baseline') else bool(result['new_urls'] or result['removed_count'] or result.get('updated_count')),
+                lastmod=result.get('lastmod')
+            )
+        if result['status'] == 'success':
+            summary['successful_sites'] += 1
+            summary['total_removed_urls'] += result.get('removed_count', 0)
+            summary['total_updated_urls'] += result.get('updated_count', 0)
+            if result.get('cache') == 'not_modified':
+                summary['not_modified_sites'] += 1
+            elif result.get('cache') == 'content_hash':
+                summary['unchanged_hash_sites'] += 1
+            if result['new_urls']:
+                summary['total_new_urls'] += len(result['new_urls'])
+                summary['notified_sites'] += 1
+        else:
+            summary['skipped_sites'] += 1 if result.get('skipped') else 0
+            summary['failed_sites'].append({
+                'site': result['site'],
+                'error': result['error'],
+                'url': result['url']
+            })
+
+    def _resend_undelivered(self, notifier: Optional[Dict], undelivered: List[Dict]):
+        """上一次运行未送达的通知在本次分析完成后补发，不占用分析开始前的时间"""
+        if not undelivered:
+            return
+        if notifier:
+            logger.info(f"补发上一次运行未送达的通知: {len(undelivered)} 个网站")
+            for record in undelivered:
+                self._notify(notifier, record['key'], record['site'], record['urls'])
+        else:
+            logger.warning(f"上一次运行有 {len(undelivered)} 个网站的通知未送达，但未配置Webhook，不再补发")
+
+    def _submit_summary(self, notifier: Dict, summary: Dict):
+        """有新增URL时把汇总卡片放入发送队列"""
+        if not summary['notified_sites']:
+            return
+        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        title = f"Sitemap分析报告 - {current_time}"
+        payload_summary = {
+            'total_sites': summary['total_sites'],
+            'successful_sites': summary['successful_sites'],
+            'failed_sites': len(summary['failed_sites']),
+            'cached_sites': summary['not_modified_sites'] + summary['unchanged_hash_sites'],
+            'total_new_urls': summary['total_new_urls'],
+            'details_hint': (f"以下将分别显示 {summary['notified_sites']} 个网站的详细信息" if self.summary_first
+                             else f"{summary['notified_sites']} 个网站的详细信息已在上方分别发送")
+        }
+        notifier['queue'].submit(notifier['sender'].build_summary_payload(title, payload_summary), label='汇总')
+
+    def _finish_run(self, summary: Dict, notifier: Optional[Dict]):
+        """输出分析统计，发送汇总并等待发送队列完成，最后结束运行日志并关闭解析进程池"""
+        self.parse_pool.close()
+        failed_sites = summary['failed_sites']
+        logger.info(f"分析完成 - 总网站数: {summary['total_sites']}, 成功: {summary['successful_sites']}, 失败: {len(failed_sites)}, "
+                    f"新增URL总数: {summary['total_new_urls']}, 删除URL总数: {summary['total_removed_urls']}, 更新URL总数: {summary['total_updated_urls']}")
+        logger.info(f"缓存命中 - 内容未变化(304)跳过: {summary['not_modified_sites']}, 内容哈希未变化跳过: {summary['unchanged_hash_sites']}")
+
         # 如果有失败的网站，记录详细信息
         if failed_sites:
+            if summary['skipped_sites']:
+                logger.warning(f"其中 {summary['skipped_sites']} 个网站因熔断跳过，未发送请求")
             logger.warning("以下网站分析失败:")
             for failed in failed_sites:
                 logger.warning(f"  - {failed['site']}: {failed['error']} ({failed['url']})")
-        
-        # 如果有新的URL，发送webhook通知
-        if analysis_results and webhook_sender:
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            title = f"Sitemap分析报告 - {current_time}"
-            
-            summary = {
-                'total_sites': total_sites,
-                'successful_sites': successful_sites,
-                'failed_sites': len(failed_sites),
-                'total_new_urls': total_new_urls
-            }
-            
-            # 发送汇总信息
-            webhook_sender.send_summary(title, summary)
-            
-            # 分别发送每个网站的详细信息
-            for item in analysis_results:
-                webhook_sender.send_site_details(item['site'], item['urls'])
-        
-        logger.info("sitemap分析完成")
+
+        # 默认在各网站详情之后发送汇总（summary_first 时已在详情之前发送），然后等待队列发送完毕
+        undelivered_count = 0
+        if notifier:
+            webhook_queue = notifier['queue']
+            if not self.summary_first:
+                self._submit_summary(notifier, summary)
+
+            webhook_stats = webhook_queue.close()
+            if webhook_stats['delivered'] or webhook_stats['failed']:
+                logger.info(f"Webhook通知 - 成功: {webhook_stats['delivered']}, 失败: {webhook_stats['failed']}, 重试: {webhook_stats['retries']}")
+            undelivered_count = len(notifier['submitted'] - notifier['delivered'])
+
+        # 运行正常结束；仍有未送达的通知时保留运行日志，由下一次运行补发。
+        # 分片的运行日志就是该分片的分析结果，保留给合并步骤读取
+        if undelivered_count:
+            logger.warning(f"{undelivered_count} 个网站的通知未送达，将在下一次运行时补发")
+        self.run_journal.finish(all_delivered=not undelivered_count and not self.shard)
+
+    def merge_shards(self, count: int):
+        """合并 count 个分片的运行结果
+
+        把各分片对共用状态文件的修改写回 state/，事件按时间顺序追加到 history/，
+        按分片运行日志中的结果统一发送通知和汇总（与单进程运行相同），最后删除分片目录。
+        分片缺失或被中断时，没有结果的网站记为失败。
+        """
+        sitemaps = self.config['sitemaps']
+        logger.info(f"开始合并 {count} 个分片的结果...")
+        directories = [shard_dir(self.state_dir, index, count) for index in range(count)]
+        results: Dict[str, Dict] = {}
+        for index, directory in enumerate(directories):
+            state = RunJournal(os.path.join(directory, "run_journal.jsonl")).load()
+            if state is None:
+                logger.warning(f"分片 {index + 1}/{count} 没有运行结果 ({directory})")
+                continue
+            if not state['finished']:
+                logger.warning(f"分片 {index + 1}/{count} 未正常结束，只合并已完成的 {len(state['results'])} 个网站")
+            results.update(state['results'])
+
+        for sitemap in sitemaps:
+            if sitemap['name'] not in results:
+                results[sitemap['name']] = {'site': sitemap['name'], 'url': sitemap['url'], 'status': 'failed',
+                                            'new_urls': [], 'removed_count': 0, 'error': '分片未完成'}
+
+        # 共用状态：只写回各分片修改过的条目；本进程没有修改这些状态，之后也不再保存
+        for filename in SHARED_STATE_FILES:
+            if merge_state_file(self.state_dir, directories, filename):
+                logger.info(f"已合并状态文件: {filename}")
+
+        # 事件日志：同一网站同一时间的事件写为一组，保持日志按时间有序
+        events = read_shard_events(directories)
+        for (ts, site), group in groupby(events, key=lambda event: (event['ts'], event['site'])):
+            urls = {event_type: [] for event_type in EVENT_TYPES}
+            for event in group:
+                urls[event['event']].append(event['url'])
+            self.event_log.append(site, urls['added'], urls['removed'],
+                                  timestamp=datetime.strptime(ts, EVENT_TIME_FORMAT), updated=urls['updated'])
+        if events:
+            logger.info(f"已合并 {len(events)} 条URL变化事件")
+
+        # 通知：与单进程运行相同，使用 state/run_journal.jsonl 记录送达情况并补发上一次未送达的通知
+        run_id = datetime.now().strftime("%Y%m%d%H%M%S")
+        undelivered = self.run_journal.start(run_id, [sitemap['name'] for sitemap in sitemaps],
+                                             RunJournal.undelivered(self.run_journal.load()))
+        notifier = self._start_notifier()
+        ordered = [results[sitemap['name']] for sitemap in sitemaps]
+        summary = self._collect_results(run_id, sitemaps, iter(ordered), notifier, record_schedule=False)
+        self._resend_undelivered(notifier, undelivered)
+        self._finish_run(summary, notifier)
+
+        for directory in directories:
+            shutil.rmtree(directory, ignore_errors=True)
+        try:
+            os.rmdir(os.path.join(self.state_dir, "shards"))
+        except OSError:
+            pass
+        logger.info("分片合并完成")
 
 
 if __name__ == "__main__":
-    analyser = SitemapAnalyser()
+    parser = argparse.ArgumentParser(description="Sitemap 分析器")
+    parser.add_argument('--config', default="config.json", help="配置文件路径")
+    parser.add_argument('--check', action='store_true', help="只检查所有网站的可访问性和解析情况，不保存快照")
+    parser.add_argument('--shard-index', type=int, help="分片运行：本进程的分片编号（从 0 开始），需同时指定 --shard-count")
+    parser.add_argument('--shard-count', type=int, help="分片运行：分片总数")
+    parser.add_argument('--merge-shards', type=int, metavar='COUNT', help="合并 COUNT 个分片的结果并发送通知")
+    archive_group = parser.add_mutually_exclusive_group()
+    archive_group.add_argument('--record', metavar='DIR', help="执行一次分析，并把所有原始响应录制到存档目录")
+    archive_group.add_argument('--replay', metavar='DIR', help="执行一次分析，所有抓取都从存档目录返回，不访问网络、不发送通知")
+    args = parser.parse_args()
+
+    shard = None
+    if args.shard_index is not None or args.shard_count is not None:
+        if args.shard_index is None or not args.shard_count or not 0 <= args.shard_index < args.shard_count:
+            parser.error("--shard-index 和 --shard-count 需同时指定，且 0 <= shard-index < shard-count")
+        shard = (args.shard_index, args.shard_count)
+    if args.merge_shards is not None and args.merge_shards < 1:
+        parser.error("--merge-shards 需为正整数")
+
+    archive = None
+    if args.record:
+        archive = {'mode': 'record', 'dir': args.record}
+    elif args.replay:
+        archive = {'mode': 'replay', 'dir': args.replay}
+
+    try:
+        analyser = SitemapAnalyser(args.config, shard=shard, archive=archive)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.check:
+        entries = analyser.check_sites()
+        sys.exit(1 if any(entry['status'] == 'failed' for entry in entries) else 0)
+
+    if args.merge_shards:
+        analyser.merge_shards(args.merge_shards)
+        sys.exit(0)
+
+    if shard or archive:
+        # 分片、录制和回放只执行一次分析；分片的结果由合并步骤统一通知
+        analyser.run_analysis()
+        sys.exit(0)
 
     # 检测是否在 GitHub Actions CI 环境中运行
     # 在 CI 环境中，只运行一次分析后退出，不进入无限循环
@@ -390,13 +1481,16 @@ if __name__ == "__main__":
         analyser.run_analysis()
         logger.info("CI 单次分析完成，程序退出。")
     else:
-        # 本地环境：设置定时任务，每小时运行一次
-        schedule.every().hour.do(analyser.run_analysis)
-        logger.info("定时任务已设置：每小时自动运行")
+        # 本地环境：定时检查到期的网站，每个网站的抓取间隔根据其变化频率自动调整；
+        # 进程常驻，快照缓存在内存中，之后的运行不再重复读取快照文件
+        analyser.enable_snapshot_cache()
+        tick_minutes = analyser.poll_scheduler.tick_minutes
+        schedule.every(tick_minutes).minutes.do(analyser.run_due)
+        logger.info(f"定时任务已设置：每 {tick_minutes} 分钟检查一次到期的网站")
 
         # 首次立即运行
         logger.info("执行首次分析...")
-        analyser.run_analysis()
+        analyser.run_due()
 
         # 持续运行调度器（仅本地使用）
         logger.info("开始定时监控...")
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+快照内存缓存（本地定时运行使用）
+
+常驻进程每次运行都要读取并解析每个网站的 sitemaps/<name>.json，这里把上一次的快照保存在内存中：
+    - 快照以排序后的 URL 按行拼接再经 zlib 压缩保存，URL 的公共前缀多，通常只占原始大小的几分之一
+    - 每个条目记录文件的 (mtime_ns, size)，读取前先 stat 比较，文件被外部修改时重新从磁盘读取
+    - 按 LRU 淘汰，压缩后的总大小不超过 budget_bytes
+保存快照时直接写入缓存，稳定运行时每次运行只对快照文件做 stat，不再读取和解析。
+"""
+
+import os
+import zlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+# 压缩和解压时每次处理的字节数
+CHUNK_SIZE = 64 * 1024
+
+
+def file_version(path: str) -> Optional[Tuple[int, int]]:
+    """文件的 (mtime_ns, size)，文件不存在时为 None"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def iter_lines(blob: bytes) -> Iterator[str]:
+    """逐块解压并按行产出，不在内存中展开整个快照"""
+    decompressor = zlib.decompressobj()
+    tail = b''
+    for start in range(0, len(blob), CHUNK_SIZE):
+        data = tail + decompressor.decompress(blob[start:start + CHUNK_SIZE])
+        lines = data.split(b'\n')
+        tail = lines.pop()
+        for line in lines:
+            yield line.decode('utf-8')
+    tail += decompressor.flush()
+    if tail:
+        yield tail.decode('utf-8')
+
+
+class LineCompressor:
+    """把一行一行的文本增量压缩为 iter_lines 可读取的格式"""
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(1)
+        self._parts = []
+        self._first = True
+        self.valid = True
+
+    def add(self, line: str):
+        if '\n' in line:
+            # 无法按行还原，放弃缓存
+            self.valid = False
+        if not self.valid:
+            return
+        data = line.encode('utf-8') if self._first else b'\n' + line.encode('utf-8')
+        self._first = False
+        self._parts.append(self._compressor.compress(data))
+
+    def finish(self) -> Optional[bytes]:
+        if not self.valid:
+            return None
+        self._parts.append(self._compressor.flush())
+        return b''.join(self._parts)
+
+
+def compress_lines(lines: Iterable[str]) -> Optional[bytes]:
+    """压缩若干行文本，某一行包含换行符时返回 None"""
+    compressor = LineCompressor()
+    for line in lines:
+        compressor.add(line)
+    return compressor.finish()
+
+
+class SnapshotCache:
+    def __init__(self, budget_bytes: int):
+        """初始化缓存
+
+        Args:
+            budget_bytes: 压缩后数据的总大小上限
+        """
+        self.budget_bytes = max(0, int(budget_bytes))
+        self._entries: 'OrderedDict[str, Tuple[Tuple[int, int], bytes]]' = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def get(self, key: str, version: Optional[Tuple[int, int]]) -> Optional[bytes]:
+        """文件版本与缓存一致时返回压缩数据，否则返回 None（并丢弃过期条目）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and version is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry[1]
+            if entry is not None:
+                self._size -= len(entry[1])
+                del self._entries[key]
+            self._stats['misses'] += 1
+            return None
+
+    def put(self, key: str, version: Optional[Tuple[int, int]], blob: Optional[bytes]):
+        """缓存压缩数据；超过总大小上限时淘汰最久未使用的条目"""
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[1])
+            if version is None or blob is None or len(blob) > self.budget_bytes:
+                return
+            self._entries[key] = (version, blob)
+            self._size += len(blob)
+            while self._size > self.budget_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def take_stats(self) -> Dict[str, int]:
+        """返回并清零命中计数，附带当前条目数和占用字节数"""
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries), bytes=self._size)
+            self._stats = {'hits': 0, 'misses': 0}
+            return stats
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Sitemap 快照存储
+
+- JsonSnapshotStore: 每个网站一个 sitemaps/<name>.json，URL 排序后原子写入，内容未变化时不重写；
+  常驻进程可以挂上 SnapshotCache，把快照压缩后保存在内存中，文件未被修改时不再读取
+- SqliteSnapshotStore: 所有网站存放在一个 SQLite 数据库中，只写入增删的 URL，在事务中原子提交
+
+开启 diff.track_updates 时，两种存储还会保存每个 URL 压缩后的 lastmod/changefreq/priority
+（JSON 存储为 sitemaps/meta/<name>.json，SQLite 存储为 url_meta 表），用于发现内容更新的页面。
+
+用法（把现有 JSON 快照一次性迁移到 SQLite）:
+    python snapshot_store.py migrate --sitemaps-dir sitemaps --db sitemaps/snapshots.db
+"""
+
+import os
+import json
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple, List
+import logging
+
+from snapshot_cache import SnapshotCache, LineCompressor, compress_lines, file_version, iter_lines
+
+logger = logging.getLogger(__name__)
+
+# SqliteSnapshotStore.iter_urls 每页读取的 URL 数
+ITER_PAGE_SIZE = 10000
+
+
+class JsonSnapshotStore:
+    def __init__(self, directory: str, cache: Optional[SnapshotCache] = None):
+        """初始化 JSON 快照存储
+
+        Args:
+            directory: 快照目录
+            cache: 快照内存缓存，为 None 时每次都从文件读取
+        """
+        self.directory = directory
+        self.cache = cache
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, name: str) -> str:
+        """快照文件路径"""
+        return os.path.join(self.directory, f"{name}.json")
+
+    def exists(self, name: str) -> bool:
+        """判断是否已有该网站的快照"""
+        return os.path.exists(self.path(name))
+
+    def names(self) -> List[str]:
+        """列出所有已保存快照的网站名称"""
+        return sorted(f[:-len('.json')] for f in os.listdir(self.directory) if f.endswith('.json'))
+
+    def load(self, name: str) -> Set[str]:
+        """加载快照，文件不存在或为空时返回空集合"""
+        version = None
+        if self.cache is not None:
+            # 先取文件版本再读取，读取期间文件被修改时下次会因版本不一致重新读取
+            version = file_version(self.path(name))
+            blob = self.cache.get(f"urls:{name}", version)
+            if blob is not None:
+                return set(iter_lines(blob))
+        try:
+            with open(self.path(name), 'r', encoding='utf-8') as f:
+                content = f.read()
+        except FileNotFoundError:
+            return set()
+        urls = json.loads(content) if content.strip() else []
+        if self.cache is not None:
+            self.cache.put(f"urls:{name}", version, compress_lines(urls))
+        return set(urls)
+
+    def iter_urls(self, name: str) -> Iterator[str]:
+        """逐个读取快照中的 URL，不把整个快照加载为集合
+
+        快照由 save 按每行一个 URL 写入，逐行解析；其他格式的文件退回到整体解析。
+        开启缓存时从缓存中逐块解压读取，读取文件时同时压缩写入缓存。
+        """
+        if self.cache is None:
+            yield from self._iter_file(name)
+            return
+        version = file_version(self.path(name))
+        blob = self.cache.get(f"urls:{name}", version)
+        if blob is not None:
+            yield from iter_lines(blob)
+            return
+        compressor = LineCompressor()
+        for url in self._iter_file(name):
+            compressor.add(url)
+            yield url
+        # 只有完整读取后才写入缓存
+        self.cache.put(f"urls:{name}", version, compressor.finish())
+
+    def _iter_file(self, name: str) -> Iterator[str]:
+        """逐行读取快照文件中的 URL"""
+        try:
+            f = open(self.path(name), 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with f:
+            first = f.readline().strip()
+            if first != '[':
+                content = first + f.read()
+                if content.strip():
+                    yield from json.loads(content)
+                return
+            for line in f:
+                line = line.strip().rstrip(',')
+                if not line or line == ']':
+                    continue
+                # 没有转义字符时直接去掉引号，省去逐行 JSON 解析
+                yield line[1:-1] if '\\' not in line else json.loads(line)
+
+    def contains(self, name: str, url: str) -> bool:
+        """判断 URL 是否在快照中"""
+        return url in self.load(name)
+
+    def diff(self, name: str, new_urls: Set[str]) -> Tuple[Set[str], Set[str]]:
+        """返回 (新增URL, 删除URL)"""
+        old_urls = self.load(name)
+        return new_urls - old_urls, old_urls - new_urls
+
+    def save(self, name: str, urls: Set[str], previous: Optional[Set[str]] = None):
+        """保存快照
+
+        URL 排序后写入，保证 git diff 稳定；previous 为已加载的旧快照，
+        与新快照相同时跳过写入。
+        """
+        if previous is not None and previous == urls and self.exists(name):
+            return
+        filepath = self.path(name)
+        tmp_path = f"{filepath}.tmp"
+        ordered = sorted(urls)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(ordered, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, filepath)
+        if self.cache is not None:
+            self.cache.put(f"urls:{name}", file_version(filepath), compress_lines(ordered))
+
+    def meta_path(self, name: str) -> str:
+        """URL 元数据文件路径，放在子目录中以免被当作快照"""
+        return os.path.join(self.directory, "meta", f"{name}.json")
+
+    def load_meta(self, name: str) -> Dict[str, int]:
+        """加载 URL 元数据 {url: 压缩后的 lastmod/changefreq/priority}，不存在时返回空字典"""
+        version = None
+        if self.cache is not None:
+            version = file_version(self.meta_path(name))
+            blob = self.cache.get(f"meta:{name}", version)
+            if blob is not None:
+                return dict(_iter_meta_lines(blob))
+        try:
+            with open(self.meta_path(name), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return {}
+        if self.cache is not None:
+            self.cache.put(f"meta:{name}", version, _compress_meta(meta.items()))
+        return meta
+
+    def iter_meta(self, name: str) -> Iterator[Tuple[str, int]]:
+        """逐个读取 URL 元数据 (url, 压缩后的值)，不把整个文件加载为字典"""
+        if self.cache is None:
+            yield from self._iter_meta_file(name)
+            return
+        version = file_version(self.meta_path(name))
+        blob = self.cache.get(f"meta:{name}", version)
+        if blob is not None:
+            yield from _iter_meta_lines(blob)
+            return
+        compressor = LineCompressor()
+        for url, value in self._iter_meta_file(name):
+            compressor.add(f"{value} {url}")
+            yield url, value
+        self.cache.put(f"meta:{name}", version, compressor.finish())
+
+    def _iter_meta_file(self, name: str) -> Iterator[Tuple[str, int]]:
+        """逐行读取元数据文件，save_meta 按每行一个条目写入；其他格式的文件退回到整体解析"""
+        try:
+            f = open(self.meta_path(name), 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with f:
+            first = f.readline().strip()
+            if first != '{':
+                content = first + f.read()
+                if content.strip():
+                    yield from json.loads(content).items()
+                return
+            for line in f:
+                line = line.strip().rstrip(',')
+                if not line or line == '}':
+                    continue
+                # 值是整数，最后一个 ": " 之前即为 URL 的 JSON 字符串
+                key, _, value = line.rpartition(': ')
+                yield (key[1:-1] if '\\' not in key else json.loads(key)), int(value)
+
+    def save_meta(self, name: str, meta: Dict[str, int], previous: Optional[Dict[str, int]] = None,
+                  changes: Optional[Tuple[Dict[str, int], Set[str]]] = None):
+        """保存 URL 元数据，按 URL 排序写入；与 previous 相同时跳过写入
+
+        changes 为逐条对比得到的 (新增或变化的条目, 删除的URL)，提供时不需要 previous，两者都为空时跳过写入。
+        没有元数据（HTML 页面等）时不写入文件，已有的文件被删除。
+        """
+        filepath = self.meta_path(name)
+        if not meta:
+            try:
+                os.remove(filepath)
+            except FileNotFoundError:
+                pass
+            if self.cache is not None:
+                self.cache.put(f"meta:{name}", None, None)
+            return
+        if previous is not None and previous == meta and os.path.exists(filepath):
+            return
+        if changes is not None and not changes[0] and not changes[1] and os.path.exists(filepath):
+            return
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        tmp_path = f"{filepath}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(dict(sorted(meta.items())), f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, filepath)
+        if self.cache is not None:
+            self.cache.put(f"meta:{name}", file_version(filepath), _compress_meta(meta.items()))
+
+
+def _compress_meta(entries: Iterable[Tuple[str, int]]) -> Optional[bytes]:
+    """URL 元数据在缓存中的形式：每行 "值 URL"，按行压缩，可以逐条解压读取"""
+    return compress_lines(f"{value} {url}" for url, value in entries)
+
+
+def _iter_meta_lines(blob: bytes) -> Iterator[Tuple[str, int]]:
+    """逐条读取缓存中的 URL 元数据"""
+    for line in iter_lines(blob):
+        value, _, url = line.partition(' ')
+        yield url, int(value)
+
+
+class SqliteSnapshotStore:
+    def __init__(self, db_path: str):
+        """初始化 SQLite 快照存储
+
+        Args:
+            db_path: 数据库文件路径
+        """
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sites (site TEXT PRIMARY KEY, url_count INTEGER NOT NULL, updated_at TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS urls (site TEXT NOT NULL, url TEXT NOT NULL, PRIMARY KEY (site, url)) WITHOUT ROWID"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS url_meta (site TEXT NOT NULL, url TEXT NOT NULL, meta INTEGER NOT NULL, "
+                "PRIMARY KEY (site, url)) WITHOUT ROWID"
+            )
+
+    def exists(self, name: str) -> bool:
+        """判断是否已有该网站的快照"""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM sites WHERE site = ?", (name,)).fetchone()
+        return row is not None
+
+    def names(self) -> List[str]:
+        """列出所有已保存快照的网站名称"""
+        with self._lock:
+            rows = self._conn.execute("SELECT site FROM sites ORDER BY site").fetchall()
+        return [row[0] for row in rows]
+
+    def load(self, name: str) -> Set[str]:
+        """加载快照，不存在时返回空集合"""
+        with self._lock:
+            rows = self._conn.execute("SELECT url FROM urls WHERE site = ?", (name,)).fetchall()
+        return {row[0] for row in rows}
+
+    def iter_urls(self, name: str) -> Iterator[str]:
+        """逐个读取快照中的 URL，不把整个快照加载为集合
+
+        按主键分页读取，每页单独加锁，调用方处理 URL 时不占用数据库连接。
+        """
+        last = ''
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT url FROM urls WHERE site = ? AND url > ? ORDER BY url LIMIT ?", (name, last, ITER_PAGE_SIZE)
+                ).fetchall()
+            for row in rows:
+                yield row[0]
+            if len(rows) < ITER_PAGE_SIZE:
+                return
+            last = rows[-1][0]
+
+    def contains(self, name: str, url: str) -> bool:
+        """判断 URL 是否在快照中（走主键索引，不加载整个快照）"""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM urls WHERE site = ? AND url = ?", (name, url)).fetchone()
+        return row is not None
+
+    def diff(self, name: str, new_urls: Set[str]) -> Tuple[Set[str], Set[str]]:
+        """在数据库中计算 (新增URL, 删除URL)"""
+        with self._lock:
+            self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS incoming (url TEXT PRIMARY KEY) WITHOUT ROWID")
+            try:
+                self._conn.executemany("INSERT OR IGNORE INTO incoming (url) VALUES (?)", ((url,) for url in new_urls))
+                added = {row[0] for row in self._conn.execute(
+                    "SELECT url FROM incoming EXCEPT SELECT url FROM urls WHERE site = ?", (name,))}
+                removed = {row[0] for row in self._conn.execute(
+                    "SELECT url FROM urls WHERE site = ? EXCEPT SELECT url FROM incoming", (name,))}
+            finally:
+                self._conn.execute("DELETE FROM incoming")
+                self._conn.commit()
+        return added, removed
+
+    def save(self, name: str, urls: Set[str], previous: Optional[Set[str]] = None):
+        """保存快照，只写入增删的 URL，整个更新在一个事务中完成
+
+        previous 为已加载的旧快照，提供时不再从数据库读取。
+        """
+        if previous is None:
+            added, removed = self.diff(name, urls)
+        else:
+            added, removed = urls - previous, previous - urls
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM urls WHERE site = ? AND url = ?", ((name, url) for url in removed))
+            self._conn.executemany("INSERT OR IGNORE INTO urls (site, url) VALUES (?, ?)", ((name, url) for url in added))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sites (site, url_count, updated_at) VALUES (?, ?, ?)",
+                (name, len(urls), datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            )
+
+    def load_meta(self, name: str) -> Dict[str, int]:
+        """加载 URL 元数据 {url: 压缩后的 lastmod/changefreq/priority}"""
+        with self._lock:
+            rows = self._conn.execute("SELECT url, meta FROM url_meta WHERE site = ?", (name,)).fetchall()
+        return dict(rows)
+
+    def iter_meta(self, name: str) -> Iterator[Tuple[str, int]]:
+        """逐个读取 URL 元数据 (url, 压缩后的值)，按主键分页读取"""
+        last = ''
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT url, meta FROM url_meta WHERE site = ? AND url > ? ORDER BY url LIMIT ?",
+                    (name, last, ITER_PAGE_SIZE)
+                ).fetchall()
+            yield from rows
+            if len(rows) < ITER_PAGE_SIZE:
+                return
+            last = rows[-1][0]
+
+    def save_meta(self, name: str, meta: Dict[str, int], previous: Optional[Dict[str, int]] = None,
+                  changes: Optional[Tuple[Dict[str, int], Set[str]]] = None):
+        """保存 URL 元数据，只写入变化的条目
+
+        changes 为逐条对比得到的 (新增或变化的条目, 删除的URL)，提供时直接写入；
+        否则与 previous（已加载的旧元数据，未提供时从数据库读取）比较。
+        """
+        if changes is not None:
+            changed = [(name, url, value) for url, value in changes[0].items()]
+            removed = [(name, url) for url in changes[1]]
+        else:
+            if previous is None:
+                previous = self.load_meta(name)
+            changed = [(name, url, value) for url, value in meta.items() if previous.get(url) != value]
+            removed = [(name, url) for url in previous if url not in meta]
+        if not changed and not removed:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM url_meta WHERE site = ? AND url = ?", removed)
+            self._conn.executemany("INSERT OR REPLACE INTO url_meta (site, url, meta) VALUES (?, ?, ?)", changed)
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+
+def create_snapshot_store(config: Dict, sitemaps_dir: str = "sitemaps"):
+    """根据配置创建快照存储，默认使用 JSON 文件"""
+    backend = config.get('backend', 'json')
+    if backend == 'sqlite':
+        return SqliteSnapshotStore(config.get('path', os.path.join(sitemaps_dir, 'snapshots.db')))
+    if backend != 'json':
+        logger.warning(f"未知的快照存储类型 {backend}，使用 JSON 文件存储")
+    return JsonSnapshotStore(sitemaps_dir)
+
+
+def migrate_json_to_sqlite(sitemaps_dir: str, db_path: str) -> int:
+    """把 sitemaps/ 下的 JSON 快照一次性导入 SQLite，返回导入的网站数"""
+    source = JsonSnapshotStore(sitemaps_dir)
+    target = SqliteSnapshotStore(db_path)
+    migrated = 0
+    try:
+        for name in source.names():
+            try:
+                urls = source.load(name)
+            except json.JSONDecodeError as e:
+                logger.warning(f"跳过无法解析的快照 {name}: {str(e)}")
+                continue
+            target.save(name, urls)
+            target.save_meta(name, source.load_meta(name))
+            migrated += 1
+            logger.info(f"已迁移 {name}: {len(urls)} 个URL")
+    finally:
+        target.close()
+    return migrated
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    parser = argparse.ArgumentParser(description="Sitemap 快照存储工具")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate_parser = subparsers.add_parser('migrate', help="把 JSON 快照迁移到 SQLite")
+    migrate_parser.add_argument('--sitemaps-dir', default='sitemaps', help="JSON 快照目录")
+    migrate_parser.add_argument('--db', default=os.path.join('sitemaps', 'snapshots.db'), help="SQLite 数据库路径")
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        count = migrate_json_to_sqlite(args.sitemaps_dir, args.db)
+        logger.info(f"迁移完成，共 {count} 个网站")
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试公共设施
+
+    - sitemap_server: 本地 HTTP 服务器，按路径返回测试中设置的内容，带 ETag 并支持 If-None-Match 返回 304，
+      /webhook 模拟飞书 Webhook 并记录收到的消息
+    - make_analyser: 在临时工作目录中按给定的网站列表创建 SitemapAnalyser
+"""
+
+import os
+import sys
+import json
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def urlset(urls: List[str], lastmod: str = '2025-01-01') -> bytes:
+    """生成 sitemap"""
+    entries = ''.join(f'<url><loc>{url}</loc><lastmod>{lastmod}</lastmod></url>' for url in urls)
+    return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="{NS}">{entries}</urlset>'.encode('utf-8')
+
+
+def sitemap_index(children: List[tuple]) -> bytes:
+    """生成sitemap索引，children 为 (loc, lastmod) 列表，lastmod 为空时不写 <lastmod>"""
+    entries = ''.join(f'<sitemap><loc>{loc}</loc>' + (f'<lastmod>{lastmod}</lastmod>' if lastmod else '') + '</sitemap>'
+                      for loc, lastmod in children)
+    return f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="{NS}">{entries}</sitemapindex>'.encode('utf-8')
+
+
+class SitemapServer:
+    def __init__(self):
+        """测试用 HTTP 服务器的共享状态"""
+        self.lock = threading.Lock()
+        self.pages: Dict[str, bytes] = {}
+        self.hits: Dict[str, int] = {}
+        self.webhooks: List[Dict] = []
+        self.base_url = ''
+
+    def set(self, path: str, body: bytes):
+        with self.lock:
+            self.pages[path] = body
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}{path}"
+
+    def hit_count(self, path: str) -> int:
+        with self.lock:
+            return self.hits.get(path, 0)
+
+    def webhook_sites(self) -> List[str]:
+        """按收到的顺序返回网站详情消息对应的网站名称（汇总消息不计入）"""
+        sites = []
+        for payload in self.webhooks:
+            title = payload.get('card', {}).get('header', {}).get('title', {}).get('content', '')
+            if ' - 新增URL列表' in title:
+                sites.append(title.split(' - 新增URL列表')[0])
+        return sites
+
+
+def _handler(server: SitemapServer):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with server.lock:
+                body = server.pages.get(self.path)
+                server.hits[self.path] = server.hits.get(self.path, 0) + 1
+            if body is None:
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/xml')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            with server.lock:
+                server.webhooks.append(payload)
+            body = b'{"code": 0}'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+@pytest.fixture
+def sitemap_server():
+    server = SitemapServer()
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), _handler(server))
+    server.base_url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def make_analyser(tmp_path, monkeypatch):
+    """返回 make(sitemaps, webhook_url=None, config=None, **kwargs) -> SitemapAnalyser
+
+    工作目录切换到临时目录；config 覆盖默认配置中的同名项，kwargs 传给 SitemapAnalyser（shard、archive）。
+    """
+    monkeypatch.chdir(tmp_path)
+    from sitemap_analyser import SitemapAnalyser
+
+    def make(sitemaps: List[Dict], webhook_url: Optional[str] = None, config: Optional[Dict] = None, **kwargs):
+        settings = {
+            'webhook': {'url': webhook_url or '', 'rate_per_second': 100, 'burst': 100},
+            'concurrency': {'max_workers': 4, 'per_host': 4},
+            'metrics': {'dir': 'reports'},
+            'sitemaps': sitemaps
+        }
+        settings.update(config or {})
+        with open(tmp_path / 'config.json', 'w', encoding='utf-8') as f:
+            json.dump(settings, f)
+        return SitemapAnalyser('config.json', **kwargs)
+
+    return make
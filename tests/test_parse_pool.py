@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""解析进程池"""
+
+import gzip
+import tempfile
+from concurrent.futures import Future
+
+from conftest import urlset
+from parse_pool import ParsePool, charset_from_content_type, extract_document, extract_file
+
+
+class InlineExecutor:
+    """在当前进程执行并记录提交的任务"""
+
+    def __init__(self):
+        self.calls = []
+
+    def submit(self, func, *args):
+        self.calls.append((func, args))
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+    def shutdown(self):
+        pass
+
+
+def test_spooled_file_is_passed_by_path():
+    pool = ParsePool({'workers': 1, 'min_bytes': 0})
+    executor = pool._executor = InlineExecutor()
+    body = gzip.compress(urlset(['https://a.com/1', 'https://a.com/2']))
+    with tempfile.NamedTemporaryFile() as spool:
+        spool.write(body)
+        extracted = pool.extract(spool, len(body), 'https://a.com/sitemap.xml.gz')
+
+    assert extracted['urls'] == ['https://a.com/1', 'https://a.com/2']
+    func, args = executor.calls[0]
+    assert func is extract_file and args[0] == spool.name
+
+
+def test_process_pool_parses_file_and_restarts_after_close():
+    pool = ParsePool({'workers': 1, 'min_bytes': 0})
+    body = urlset(['https://a.com/1'])
+    with tempfile.NamedTemporaryFile() as spool:
+        spool.write(body)
+        assert pool.extract(spool, len(body), 'https://a.com/sitemap.xml')['urls'] == ['https://a.com/1']
+    pool.close()
+    assert pool._executor is None
+    assert pool.extract(body, len(body), 'https://a.com/sitemap.xml') == extract_document(body, 'https://a.com/sitemap.xml')
+    pool.close()
+
+
+def test_run_closes_pool(sitemap_server, make_analyser):
+    sitemap_server.set('/sitemap.xml', urlset([sitemap_server.url('/game/1')]))
+    sites = [{'name': 'site', 'url': sitemap_server.url('/sitemap.xml')}]
+    analyser = make_analyser(sites, config={'parsing': {'workers': 1, 'min_bytes': 0}})
+    executor = analyser.parse_pool._executor = InlineExecutor()
+    analyser._should_stream = lambda url, response: True
+
+    analyser.run_analysis()
+
+    assert executor.calls and executor.calls[0][0] is extract_file
+    assert analyser.parse_pool._executor is None
+    assert analyser.load_local_sitemap('site') == {sitemap_server.url('/game/1')}
+
+
+def _html(href: str, head: str = '') -> str:
+    # <br> 没有闭合，XML 解析失败后按 HTML 页面提取链接
+    return f'<html><head>{head}</head><body><a href="{href}">link</a><br></body></html>'
+
+
+def test_html_fallback_uses_declared_charset():
+    url = 'https://a.com/page'
+    # 响应头声明的编码
+    body = _html('/游戏/1').encode('gbk')
+    assert extract_document(body, url, charset='GBK')['urls'] == ['https://a.com/游戏/1']
+    # <meta> 声明的编码
+    body = _html('/ゲーム/1', '<meta http-equiv="Content-Type" content="text/html; charset=Shift_JIS">').encode('shift_jis')
+    assert extract_document(body, url)['urls'] == ['https://a.com/ゲーム/1']
+    # 都没有声明时按 UTF-8
+    body = _html('/jeu/é').encode('utf-8')
+    assert extract_document(body, url)['urls'] == ['https://a.com/jeu/é']
+
+
+def test_charset_from_content_type():
+    assert charset_from_content_type('text/html; charset="ISO-8859-1"') == 'ISO-8859-1'
+    assert charset_from_content_type('text/html') is None
+    assert charset_from_content_type(None) is None
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""录制与回放：回放在独立目录中完整处理每个文档"""
+
+import os
+
+from conftest import urlset
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_replay_is_isolated_and_repeatable(sitemap_server, make_analyser):
+    sitemap_server.set('/sitemap.xml', urlset([sitemap_server.url('/game/1'), sitemap_server.url('/game/2')]))
+    sites = [{'name': 'site', 'url': sitemap_server.url('/sitemap.xml')}]
+    make_analyser(sites, archive={'mode': 'record', 'dir': 'archive'}).run_analysis()
+    live_snapshot = _read(os.path.join('sitemaps', 'site.json'))
+    live_validators = _read(os.path.join('state', 'validators.json'))
+    hits = sitemap_server.hit_count('/sitemap.xml')
+
+    for _ in range(2):
+        analyser = make_analyser(sites, archive={'mode': 'replay', 'dir': 'archive'})
+        parsed = []
+        parse_stage = analyser._parse_stage
+        analyser._parse_stage = lambda job: parsed.append(job['result']['site']) or parse_stage(job)
+        analyser.run_analysis()
+
+        # 每次回放都从空的回放目录开始，不走304或内容哈希的捷径
+        assert parsed == ['site']
+        assert os.path.exists(os.path.join('archive', 'replay', 'sitemaps', 'site.json'))
+        assert os.listdir(os.path.join('archive', 'replay', 'diff'))
+
+    # 回放不访问网络，也不修改实际运行的快照和状态
+    assert sitemap_server.hit_count('/sitemap.xml') == hits
+    assert _read(os.path.join('sitemaps', 'site.json')) == live_snapshot
+    assert _read(os.path.join('state', 'validators.json')) == live_validators
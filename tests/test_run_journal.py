@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""运行日志：中断后续跑不重复通知，通知和汇总的发送顺序"""
+
+import pytest
+
+from conftest import urlset
+from run_journal import RunJournal, notification_key
+
+
+def _interrupted_run(sitemap_server, make_analyser, delivered: bool):
+    """模拟只完成了第一个网站就被中断的运行，返回 analyser"""
+    sites = []
+    for name in ('first', 'second'):
+        sitemap_server.set(f'/{name}.xml', urlset([sitemap_server.url(f'/{name}/1')]))
+        sites.append({'name': name, 'url': sitemap_server.url(f'/{name}.xml')})
+    analyser = make_analyser(sites, webhook_url=sitemap_server.url('/webhook'))
+
+    run_id = '20250101000000'
+    analyser.run_journal.start(run_id, [site['name'] for site in sites], [])
+    analyser.run_journal.record_result(analyser._analyse_site(sites[0]))
+    if delivered:
+        analyser.run_journal.record_notified(notification_key(run_id, 'first'))
+    analyser.run_journal.close()
+    return analyser
+
+
+@pytest.mark.parametrize('delivered', [True, False])
+def test_resumed_results_are_not_notified_again(sitemap_server, make_analyser, delivered):
+    analyser = _interrupted_run(sitemap_server, make_analyser, delivered)
+
+    analyser.run_analysis()
+
+    # 已送达的通知不再发送，未送达的只由补发发送一次
+    expected = ['second'] if delivered else ['second', 'first']
+    assert sitemap_server.webhook_sites() == expected
+    # 已完成的网站不再抓取
+    assert sitemap_server.hit_count('/first.xml') == 1
+
+
+def test_notifications_follow_config_order(sitemap_server, make_analyser):
+    names = ['a', 'b', 'c', 'd']
+    sites = []
+    for name in names:
+        sitemap_server.set(f'/{name}.xml', urlset([sitemap_server.url(f'/{name}/1')]))
+        sites.append({'name': name, 'url': sitemap_server.url(f'/{name}.xml')})
+    analyser = make_analyser(sites, webhook_url=sitemap_server.url('/webhook'))
+    # 结果按完成顺序产出，这里让配置中靠前的网站最后完成
+    analyse_all = analyser._analyse_all
+    analyser._analyse_all = lambda sitemaps: reversed(list(analyse_all(sitemaps)))
+
+    analyser.run_analysis()
+
+    assert sitemap_server.webhook_sites() == names
+
+
+def test_read_result_returns_recorded_result(tmp_path):
+    journal = RunJournal(str(tmp_path / 'run_journal.jsonl'))
+    journal.start('run', ['a', 'b'], [])
+    offsets = [journal.record_result({'site': site, 'new_urls': [f'https://{site}/新']}) for site in ('a', 'b')]
+
+    assert [journal.read_result(offset)['new_urls'] for offset in offsets] == [['https://a/新'], ['https://b/新']]
+
+
+def _summary_position(server):
+    """汇总卡片在收到的消息中的位置"""
+    titles = [payload['card']['header']['title']['content'] for payload in server.webhooks]
+    return next(i for i, title in enumerate(titles) if title.startswith('Sitemap分析报告')), len(titles)
+
+
+def test_summary_is_sent_after_details_by_default(sitemap_server, make_analyser):
+    sitemap_server.set('/a.xml', urlset([sitemap_server.url('/a/1')]))
+    sites = [{'name': 'a', 'url': sitemap_server.url('/a.xml')}]
+    make_analyser(sites, webhook_url=sitemap_server.url('/webhook')).run_analysis()
+
+    position, total = _summary_position(sitemap_server)
+    assert position == total - 1
+
+
+def test_summary_first_restores_the_original_order(sitemap_server, make_analyser):
+    names = ['a', 'b', 'c']
+    sites = []
+    for name in names:
+        sitemap_server.set(f'/{name}.xml', urlset([sitemap_server.url(f'/{name}/1')]))
+        sites.append({'name': name, 'url': sitemap_server.url(f'/{name}.xml')})
+    webhook = {'url': sitemap_server.url('/webhook'), 'rate_per_second': 100, 'burst': 100, 'summary_first': True}
+    make_analyser(sites, config={'webhook': webhook}).run_analysis()
+
+    assert _summary_position(sitemap_server)[0] == 0
+    assert sitemap_server.webhook_sites() == names
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""分片运行与合并"""
+
+import os
+import json
+
+import pytest
+
+from conftest import urlset
+from sharding import apply_changes, shard_of
+
+
+def test_apply_changes_merges_entries_changed_by_each_shard():
+    base = {'a': {'etag': '1'}, 'b': {'etag': '1'}, 'hosts': {'x': 1, 'y': 1}}
+    merged = json.loads(json.dumps(base))
+
+    apply_changes(merged, base, {'a': {'etag': '2'}, 'b': {'etag': '1'}, 'hosts': {'x': 2, 'y': 1}})
+    apply_changes(merged, base, {'a': {'etag': '1'}, 'hosts': {'x': 1, 'y': 3}, 'c': {'etag': '1'}})
+
+    # 两个分片修改同一字典中不同的键时互不覆盖，未出现在分片中的条目被删除
+    assert merged == {'a': {'etag': '2'}, 'hosts': {'x': 2, 'y': 3}, 'c': {'etag': '1'}}
+
+
+def test_shards_merge_state_and_notify_in_config_order(sitemap_server, make_analyser):
+    names = ['alpha', 'beta', 'gamma', 'delta', 'epsilon']
+    sites = []
+    for name in names:
+        sitemap_server.set(f'/{name}.xml', urlset([sitemap_server.url(f'/{name}/1')]))
+        sites.append({'name': name, 'url': sitemap_server.url(f'/{name}.xml')})
+    # 两个分片都要有网站
+    assert {shard_of(name, 2) for name in names} == {0, 1}
+    webhook_url = sitemap_server.url('/webhook')
+
+    for index in range(2):
+        make_analyser(sites, webhook_url=webhook_url, shard=(index, 2)).run_analysis()
+    # 分片不发送通知
+    assert sitemap_server.webhook_sites() == []
+
+    make_analyser(sites, webhook_url=webhook_url).merge_shards(2)
+
+    assert sitemap_server.webhook_sites() == names
+    with open(os.path.join('state', 'validators.json'), 'r', encoding='utf-8') as f:
+        validators = json.load(f)
+    assert set(validators) == {site['url'] for site in sites}
+    assert not os.path.exists(os.path.join('state', 'shards'))
+
+
+def test_sqlite_snapshot_store_is_rejected_when_sharded(make_analyser):
+    with pytest.raises(ValueError):
+        make_analyser([], config={'snapshot_store': {'backend': 'sqlite'}}, shard=(0, 2))
+    assert not os.path.exists(os.path.join('state', 'shards'))
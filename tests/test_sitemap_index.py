@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""sitemap索引与 304 / 内容哈希短路"""
+
+import os
+import json
+import shutil
+
+from conftest import sitemap_index, urlset
+
+
+def _index_site(server, lastmod=''):
+    server.set('/a.xml', urlset([server.url('/game/a1'), server.url('/game/a2')]))
+    server.set('/b.xml', urlset([server.url('/game/b1')]))
+    server.set('/index.xml', sitemap_index([(server.url('/a.xml'), lastmod), (server.url('/b.xml'), lastmod)]))
+    return {'name': 'indexed', 'url': server.url('/index.xml')}
+
+
+def test_static_index_still_detects_child_changes(sitemap_server, make_analyser):
+    site = _index_site(sitemap_server)
+    analyser = make_analyser([site])
+    first = analyser._analyse_site(site)
+    assert first['status'] == 'success' and first.get('baseline')
+
+    # 索引内容不变（服务器会返回 304），只有子sitemap变化
+    sitemap_server.set('/b.xml', urlset([sitemap_server.url('/game/b1'), sitemap_server.url('/game/b2')]))
+    second = analyser._analyse_site(site)
+
+    assert second['status'] == 'success'
+    assert 'cache' not in second
+    assert second['new_urls'] == [sitemap_server.url('/game/b2')]
+    assert sitemap_server.url('/game/b2') in analyser.load_local_sitemap('indexed')
+
+
+def test_index_children_pruned_by_lastmod(sitemap_server, make_analyser):
+    site = _index_site(sitemap_server, lastmod='2025-01-01')
+    analyser = make_analyser([site])
+    analyser._analyse_site(site)
+    assert sitemap_server.hit_count('/a.xml') == 1
+
+    result = analyser._analyse_site(site)
+
+    # 索引重新抓取并展开，子sitemap的 lastmod 未变化，不再请求
+    assert result['new_urls'] == [] and result['removed_count'] == 0
+    assert sitemap_server.hit_count('/index.xml') == 2
+    assert sitemap_server.hit_count('/a.xml') == 1
+    assert sitemap_server.hit_count('/b.xml') == 1
+
+
+def test_leaf_sitemap_short_circuits(sitemap_server, make_analyser):
+    sitemap_server.set('/sitemap.xml', urlset([sitemap_server.url('/game/1')]))
+    site = {'name': 'leaf', 'url': sitemap_server.url('/sitemap.xml')}
+    analyser = make_analyser([site])
+    analyser._analyse_site(site)
+
+    assert analyser._analyse_site(site)['cache'] == 'not_modified'
+
+
+def test_validator_without_document_type_is_processed_once(sitemap_server, make_analyser):
+    sitemap_server.set('/sitemap.xml', urlset([sitemap_server.url('/game/1')]))
+    site = {'name': 'leaf', 'url': sitemap_server.url('/sitemap.xml')}
+    analyser = make_analyser([site])
+    analyser._analyse_site(site)
+    # 模拟升级前保存的验证器（没有 index 字段）
+    entry = analyser.validator_cache._entries[site['url']]
+    del entry['index']
+
+    assert 'cache' not in analyser._analyse_site(site)
+    assert analyser.validator_cache.get(site['url'])['index'] is False
+    assert analyser._analyse_site(site)['cache'] == 'not_modified'
+
+
+def test_unchanged_index_is_rebuilt_from_snapshot_without_local_cache(sitemap_server, make_analyser):
+    site = _index_site(sitemap_server, lastmod='2025-01-01')
+    analyser = make_analyser([site])
+    analyser._analyse_site(site)
+    # state/ 中只记录 lastmod 和子sitemap列表，不重复保存快照中的URL
+    for filename in os.listdir(os.path.join('state', 'sitemap_children')):
+        with open(os.path.join('state', 'sitemap_children', filename), 'r', encoding='utf-8') as f:
+            assert 'urls' not in json.load(f)
+    # 模拟 CI 中新检出的仓库：没有本地URL缓存
+    shutil.rmtree('cache')
+
+    result = analyser._analyse_site(site)
+
+    assert result['new_urls'] == [] and result['removed_count'] == 0
+    assert sitemap_server.hit_count('/a.xml') == 1
+    assert sitemap_server.hit_count('/b.xml') == 1
+    assert len(analyser.load_local_sitemap('indexed')) == 3
+
+
+def test_changed_child_without_local_cache_refetches_siblings(sitemap_server, make_analyser):
+    site = _index_site(sitemap_server, lastmod='2025-01-01')
+    analyser = make_analyser([site])
+    analyser._analyse_site(site)
+    shutil.rmtree('cache')
+    sitemap_server.set('/b.xml', urlset([sitemap_server.url('/game/b1'), sitemap_server.url('/game/b2')]))
+    sitemap_server.set('/index.xml', sitemap_index([(sitemap_server.url('/a.xml'), '2025-01-01'),
+                                                    (sitemap_server.url('/b.xml'), '2025-01-02')]))
+
+    result = analyser._analyse_site(site)
+
+    # 未变化的子sitemap没有本地缓存时重新抓取，不会被误判为删除
+    assert result['new_urls'] == [sitemap_server.url('/game/b2')]
+    assert result['removed_count'] == 0
+    assert sitemap_server.hit_count('/a.xml') == 2
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""流式下载的判断"""
+
+import requests
+
+from conftest import urlset
+
+
+def _response(headers):
+    response = requests.Response()
+    response.headers.update(headers)
+    return response
+
+
+def test_only_small_known_size_is_buffered(make_analyser):
+    analyser = make_analyser([], config={'streaming': {'threshold_mb': 1}})
+    url = 'https://example.com/sitemap.xml'
+
+    assert not analyser._should_stream(url, _response({'Content-Length': '1000'}))
+    assert analyser._should_stream(url, _response({'Content-Length': str(2 * 1024 * 1024)}))
+    # 分块传输：没有 Content-Length
+    assert analyser._should_stream(url, _response({'Transfer-Encoding': 'chunked'}))
+    # 压缩传输：Content-Length 是压缩后的大小
+    assert analyser._should_stream(url, _response({'Content-Length': '1000', 'Content-Encoding': 'gzip'}))
+    assert analyser._should_stream('https://example.com/sitemap.xml.gz', _response({'Content-Length': '10'}))
+
+
+def test_chunked_response_is_parsed_from_stream(sitemap_server, make_analyser):
+    sitemap_server.set('/sitemap.xml', urlset([sitemap_server.url('/game/1'), sitemap_server.url('/game/2')]))
+    site = {'name': 'site', 'url': sitemap_server.url('/sitemap.xml')}
+    analyser = make_analyser([site])
+    analyser._should_stream = lambda url, response: True
+
+    result = analyser._analyse_site(site)
+
+    assert result['new_urls'] == [sitemap_server.url('/game/1'), sitemap_server.url('/game/2')]
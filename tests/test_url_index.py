@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""URL首次出现索引的增量更新"""
+
+import json
+import os
+
+from conftest import urlset
+from url_index import UrlFirstSeenIndex
+
+
+def _write_diff(diff_dir, day, site, urls):
+    os.makedirs(diff_dir / day, exist_ok=True)
+    with open(diff_dir / day / f"{site}.urls.json", 'w', encoding='utf-8') as f:
+        json.dump(urls, f)
+
+
+def test_update_only_reads_new_days(tmp_path):
+    diff_dir = tmp_path / 'diff'
+    _write_diff(diff_dir, '20250101', 'a', ['https://a.com/1'])
+    _write_diff(diff_dir, '20250102', 'a', ['https://a.com/2'])
+    index = UrlFirstSeenIndex(str(tmp_path / 'url_index.db'))
+    assert index.update(str(diff_dir)) == 2
+
+    # 同一天又写入了新的差异，之后又多了一天
+    _write_diff(diff_dir, '20250102', 'b', ['https://b.com/1', 'https://a.com/1'])
+    _write_diff(diff_dir, '20250103', 'a', ['https://a.com/3'])
+    assert index.update(str(diff_dir)) == 3
+
+    assert index.lookup('https://a.com/1') == {'url': 'https://a.com/1', 'first_seen': '20250101', 'site': 'a'}
+    assert index.lookup('https://b.com/1')['first_seen'] == '20250102'
+    assert [match['url'] for match in index.lookup_prefix('https://a.com/')] == \
+        ['https://a.com/1', 'https://a.com/2', 'https://a.com/3']
+    index.close()
+
+
+def test_analysis_does_not_touch_index(sitemap_server, make_analyser, tmp_path):
+    sitemap_server.set('/sitemap.xml', urlset([sitemap_server.url('/game/1')]))
+    site = {'name': 'site', 'url': sitemap_server.url('/sitemap.xml')}
+    make_analyser([site]).run_analysis()
+
+    assert not os.path.exists(tmp_path / 'state' / 'url_index.db')
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""lastmod 前进的URL与元数据文件"""
+
+import os
+
+import pytest
+
+from conftest import urlset
+
+NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def _sitemap(server, lastmods):
+    entries = ''.join(f'<url><loc>{server.url(path)}</loc><lastmod>{lastmod}</lastmod></url>'
+                      for path, lastmod in lastmods.items())
+    return f'<urlset xmlns="{NS}">{entries}</urlset>'.encode('utf-8')
+
+
+@pytest.mark.parametrize('backend', ['json', 'sqlite'])
+@pytest.mark.parametrize('engine', ['set', 'fingerprint'])
+def test_updated_urls(sitemap_server, make_analyser, engine, backend):
+    sitemap_server.set('/sitemap.xml', _sitemap(sitemap_server, {'/1': '2025-01-01', '/2': '2025-01-01'}))
+    site = {'name': 'site', 'url': sitemap_server.url('/sitemap.xml')}
+    analyser = make_analyser([site], config={'diff': {'track_updates': True, 'engine': engine},
+                                             'snapshot_store': {'backend': backend}})
+    analyser._analyse_site(site)
+
+    sitemap_server.set('/sitemap.xml', _sitemap(sitemap_server, {'/1': '2025-02-01', '/2': '2025-01-01',
+                                                                 '/3': '2025-02-01'}))
+    result = analyser._analyse_site(site)
+
+    assert result['new_urls'] == [sitemap_server.url('/3')]
+    assert result['updated_count'] == 1
+    assert set(analyser.snapshot_store.load_meta('site')) == {sitemap_server.url(path) for path in ('/1', '/2', '/3')}
+
+
+def test_html_page_writes_no_metadata(sitemap_server, make_analyser):
+    sitemap_server.set('/page', b'<html><body><a href="/game/1">1</a></body></html>')
+    site = {'name': 'page', 'url': sitemap_server.url('/page')}
+    analyser = make_analyser([site], config={'diff': {'track_updates': True}})
+
+    assert analyser._analyse_site(site)['status'] == 'success'
+    assert not os.path.exists(analyser.snapshot_store.meta_path('page'))
+
+
+def test_track_updates_off_by_default(sitemap_server, make_analyser):
+    sitemap_server.set('/sitemap.xml', urlset([sitemap_server.url('/1')]))
+    site = {'name': 'site', 'url': sitemap_server.url('/sitemap.xml')}
+    analyser = make_analyser([site])
+    analyser._analyse_site(site)
+
+    assert not os.path.exists(analyser.snapshot_store.meta_path('site'))
+
+
+def test_fingerprint_meta_diff():
+    from fingerprint_diff import fingerprint_meta_diff
+    from url_metadata import pack
+    old = [('https://a.com/1', pack('2025-01-01')), ('https://a.com/2', pack('2025-01-01')),
+           ('https://a.com/3', pack('2025-01-01', 'daily'))]
+    new = {'https://a.com/1': pack('2025-02-01'), 'https://a.com/3': pack('2025-01-01', 'weekly'),
+           'https://a.com/4': pack('2025-01-01')}
+
+    updated, changed, removed = fingerprint_meta_diff(new, iter(old))
+
+    assert updated == {'https://a.com/1'}
+    assert changed == {url: new[url] for url in ('https://a.com/1', 'https://a.com/3', 'https://a.com/4')}
+    assert removed == {'https://a.com/2'}
+
+
+@pytest.mark.parametrize('cached', [False, True])
+def test_json_store_iter_meta(tmp_path, cached):
+    from snapshot_cache import SnapshotCache
+    from snapshot_store import JsonSnapshotStore
+    store = JsonSnapshotStore(str(tmp_path), cache=SnapshotCache(1 << 20) if cached else None)
+    meta = {'https://a.com/"quoted"': 1, 'https://a.com/中文': 2, 'https://a.com/a: b': 3}
+    store.save_meta('site', meta)
+
+    assert dict(store.iter_meta('site')) == meta
+    assert dict(store.iter_meta('site')) == meta
+    assert store.load_meta('site') == meta
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""网站详情卡片按请求体大小分组"""
+
+from webhook_sender import WebhookSender, payload_size
+
+
+def test_payloads_are_filled_up_to_the_limit():
+    sender = WebhookSender('')
+    urls = [f'https://example.com/游戏/{i}' for i in range(500)]
+
+    payloads = sender.build_site_payloads('site', urls, max_bytes=4000)
+
+    assert len(payloads) > 1
+    assert all(payload_size(payload) <= 4000 for payload in payloads)
+    # 各组依次排列，URL 不丢失也不重复
+    lines = [line[2:] for payload in payloads
+             for line in payload['card']['elements'][1]['text']['content'].split('\n')]
+    assert lines == urls
+
+
+def test_oversized_url_is_truncated_to_fit():
+    sender = WebhookSender('')
+    long_url = 'https://example.com/' + '页' * 5000
+
+    payloads = sender.build_site_payloads('site', ['https://example.com/a', long_url], max_bytes=4000)
+
+    assert all(payload_size(payload) <= 4000 for payload in payloads)
+    last_line = payloads[-1]['card']['elements'][1]['text']['content'].split('\n')[-1]
+    assert last_line.startswith('• https://example.com/页') and last_line.endswith('…')
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+URL 首次出现索引
+
+把 diff/YYYYMMDD/<name>.urls.json 中的全部历史整理成 URL -> (首次出现日期, 网站) 的
+SQLite 索引，支持精确查询和前缀查询，查询时不需要把历史加载到内存。
+索引可以随时从 diff/ 目录重建，因此不提交到仓库；分析运行时不维护索引，
+查询前只把上次更新之后新增的差异文件补充进来（update），不需要重新扫描全部历史。
+
+用法:
+    python url_index.py build
+    python url_index.py lookup https://www.crazygames.com/game/slope
+    python url_index.py lookup https://www.crazygames.com/game/ --prefix --limit 50
+"""
+
+import os
+import json
+import sqlite3
+import argparse
+import threading
+from typing import Dict, Iterable, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class UrlFirstSeenIndex:
+    def __init__(self, db_path: str = os.path.join("state", "url_index.db")):
+        """初始化首次出现索引
+
+        Args:
+            db_path: 数据库文件路径
+        """
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS first_seen (url TEXT PRIMARY KEY, first_seen TEXT NOT NULL, site TEXT NOT NULL) WITHOUT ROWID"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def is_built(self) -> bool:
+        """索引是否已从 diff/ 目录完整构建过"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'built_from'").fetchone()
+        return row is not None
+
+    def record(self, site: str, urls: Iterable[str], day: str):
+        """记录一批URL在某天出现，只有早于已有记录时才会更新
+
+        Args:
+            site: 网站名称
+            urls: URL列表
+            day: 日期，格式 YYYYMMDD
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO first_seen (url, first_seen, site) VALUES (?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET first_seen = excluded.first_seen, site = excluded.site "
+                "WHERE excluded.first_seen < first_seen.first_seen",
+                ((url, day, site) for url in urls)
+            )
+
+    def build(self, diff_dir: str = "diff") -> int:
+        """从 diff/ 目录完整构建索引，逐个文件处理，返回处理的文件数"""
+        return self._index_days(diff_dir, since='')
+
+    def update(self, diff_dir: str = "diff") -> int:
+        """把上次构建或更新之后的差异文件补充到索引中，返回处理的文件数
+
+        从已处理的最后一天开始扫描（同一天之后可能又写入了新的差异），更早的日期不再读取。
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'indexed_through'").fetchone()
+        return self._index_days(diff_dir, since=row[0] if row else '')
+
+    def _index_days(self, diff_dir: str, since: str) -> int:
+        """处理日期不早于 since 的差异目录，并记录处理到的最后一天"""
+        processed = 0
+        last_day = since
+        for day in sorted(os.listdir(diff_dir)) if os.path.isdir(diff_dir) else []:
+            day_dir = os.path.join(diff_dir, day)
+            if not (os.path.isdir(day_dir) and day.isdigit() and len(day) == 8) or day < since:
+                continue
+            for filename in sorted(os.listdir(day_dir)):
+                if not filename.endswith('.urls.json'):
+                    continue
+                try:
+                    with open(os.path.join(day_dir, filename), 'r', encoding='utf-8') as f:
+                        urls = json.load(f)
+                except (json.JSONDecodeError, OSError) as e:
+                    logger.warning(f"跳过无法读取的差异文件 {day}/{filename}: {str(e)}")
+                    continue
+                self.record(filename[:-len('.urls.json')], urls, day)
+                processed += 1
+            last_day = day
+
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('built_from', ?)", (diff_dir,))
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('indexed_through', ?)", (last_day,))
+        return processed
+
+    def lookup(self, url: str) -> Optional[Dict[str, str]]:
+        """精确查询某个URL的首次出现日期和网站"""
+        with self._lock:
+            row = self._conn.execute("SELECT url, first_seen, site FROM first_seen WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return {'url': row[0], 'first_seen': row[1], 'site': row[2]}
+
+    def lookup_prefix(self, prefix: str, limit: int = 100) -> List[Dict[str, str]]:
+        """前缀查询，按URL排序返回，利用主键范围扫描而不是 LIKE 全表扫描"""
+        if not prefix:
+            return []
+        # UTF-8 按字节比较与按码点比较顺序一致，最后一个字符加一即为上界
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url, first_seen, site FROM first_seen WHERE url >= ? AND url < ? ORDER BY url LIMIT ?",
+                (prefix, upper, limit)
+            ).fetchall()
+        return [{'url': row[0], 'first_seen': row[1], 'site': row[2]} for row in rows]
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    parser = argparse.ArgumentParser(description="URL 首次出现索引")
+    parser.add_argument('--db', default=os.path.join('state', 'url_index.db'), help="索引数据库路径")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="从 diff/ 目录构建索引")
+    build_parser.add_argument('--diff-dir', default='diff', help="差异文件目录")
+
+    lookup_parser = subparsers.add_parser('lookup', help="查询URL首次出现的日期")
+    lookup_parser.add_argument('url', help="URL 或 URL 前缀")
+    lookup_parser.add_argument('--prefix', action='store_true', help="按前缀查询")
+    lookup_parser.add_argument('--limit', type=int, default=100, help="前缀查询最多返回的条数")
+    lookup_parser.add_argument('--diff-dir', default='diff', help="差异文件目录，查询前补充其中新增的差异文件")
+
+    args = parser.parse_args()
+    index = UrlFirstSeenIndex(args.db)
+
+    if args.command == 'build':
+        count = index.build(args.diff_dir)
+        logger.info(f"索引构建完成，共处理 {count} 个差异文件")
+    elif args.command == 'lookup':
+        count = index.update(args.diff_dir)
+        if count:
+            logger.info(f"索引已更新，处理 {count} 个差异文件")
+        if args.prefix:
+            matches = index.lookup_prefix(args.url, args.limit)
+        else:
+            match = index.lookup(args.url)
+            matches = [match] if match else []
+        for match in matches:
+            print(f"{match['first_seen']}  {match['site']}  {match['url']}")
+        if not matches:
+            logger.info("未找到匹配的URL")
+    index.close()
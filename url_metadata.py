@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+URL 元数据的紧凑表示
+
+把每个URL的 <lastmod>、<changefreq> 和 <priority> 压缩成一个整数，
+快照中以 {url: 整数} 保存，每个URL只多占用一个整数：
+    位 7 及以上  lastmod，UTC 时间距 1970-01-01 的分钟数，0 表示没有 lastmod
+    位 4-6       changefreq 编号（见 CHANGEFREQS），0 表示没有
+    位 0-3       priority * 10 + 1（1~11），0 表示没有
+"""
+
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, Optional, Set, Tuple
+
+CHANGEFREQS = ('', 'always', 'hourly', 'daily', 'weekly', 'monthly', 'yearly', 'never')
+_CHANGEFREQ_CODES = {name: code for code, name in enumerate(CHANGEFREQS) if name}
+
+LASTMOD_SHIFT = 7
+CHANGEFREQ_SHIFT = 4
+
+
+@lru_cache(maxsize=4096)
+def parse_lastmod(value: Optional[str]) -> int:
+    """解析 W3C Datetime 格式的 lastmod，返回 UTC 分钟数，无法解析时返回 0
+
+    同一个sitemap中大量URL的 lastmod 相同，使用缓存避免重复解析。
+    """
+    value = (value or '').strip()
+    if not value:
+        return 0
+    try:
+        if len(value) == 4:
+            moment = datetime(int(value), 1, 1)
+        elif len(value) == 7:
+            moment = datetime(int(value[:4]), int(value[5:7]), 1)
+        else:
+            moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return 0
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0, int(moment.timestamp() // 60))
+
+
+def pack(lastmod: Optional[str], changefreq: Optional[str] = None, priority: Optional[str] = None) -> int:
+    """把三个字段压缩成一个整数"""
+    packed = parse_lastmod(lastmod) << LASTMOD_SHIFT
+    packed |= _CHANGEFREQ_CODES.get((changefreq or '').strip().lower(), 0) << CHANGEFREQ_SHIFT
+    if priority:
+        try:
+            packed |= min(10, max(0, round(float(priority) * 10))) + 1
+        except ValueError:
+            pass
+    return packed
+
+
+def lastmod_minutes(packed: int) -> int:
+    """取出 lastmod（UTC 分钟数）"""
+    return packed >> LASTMOD_SHIFT
+
+
+def unpack(packed: int) -> Dict[str, Optional[object]]:
+    """还原为 {lastmod, changefreq, priority}，用于展示"""
+    minutes = lastmod_minutes(packed)
+    priority = packed & 0xF
+    return {
+        'lastmod': datetime.fromtimestamp(minutes * 60, timezone.utc).strftime("%Y-%m-%dT%H:%MZ") if minutes else None,
+        'changefreq': CHANGEFREQS[(packed >> CHANGEFREQ_SHIFT) & 0x7] or None,
+        'priority': (priority - 1) / 10 if priority else None
+    }
+
+
+def diff_with_updates(new_urls: Set[str], new_meta: Dict[str, int], old_urls: Set[str],
+                      old_meta: Dict[str, int]) -> Tuple[Set[str], Set[str]]:
+    """一次遍历新快照，同时得到 (新增URL, lastmod 前进的URL)
+
+    任一方没有该URL的元数据（HTML 页面、首次开启元数据记录等）时不算作更新。
+    """
+    added = set()
+    updated = set()
+    for url in new_urls:
+        if url not in old_urls:
+            added.add(url)
+            continue
+        current = new_meta.get(url)
+        previous = old_meta.get(url)
+        if current is not None and previous is not None and lastmod_minutes(current) > lastmod_minutes(previous):
+            updated.add(url)
+    return added, updated
+
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ValidatorCache:
+    def __init__(self, path: str):
+        """初始化 HTTP 验证器缓存
+
+        按 sitemap URL 记录 ETag、Last-Modified、响应内容的哈希以及文档是否为sitemap索引，
+        用于发送条件请求 (If-None-Match / If-Modified-Since)。
+
+        Args:
+            path: 缓存文件路径
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, str]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, str]]:
+        """从磁盘加载缓存，文件不存在或损坏时返回空缓存"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"验证器缓存 {self.path} 读取失败，将重新建立: {str(e)}")
+            return {}
+
+    def get(self, url: str) -> Optional[Dict[str, str]]:
+        """获取某个 URL 的缓存记录"""
+        with self._lock:
+            entry = self._entries.get(url)
+            return dict(entry) if entry else None
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """根据缓存记录生成条件请求头"""
+        entry = self.get(url)
+        headers = {}
+        if not entry:
+            return headers
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def update(self, url: str, etag: Optional[str], last_modified: Optional[str], body_hash: Optional[str],
+               index: bool = False):
+        """更新某个 URL 的缓存记录（应在本地快照保存成功后调用）
+
+        index 为 True 表示该文档是sitemap索引，索引不能因为304或内容哈希未变化而跳过。
+        """
+        with self._lock:
+            self._entries[url] = {
+                'etag': etag or '',
+                'last_modified': last_modified or '',
+                'body_hash': body_hash or '',
+                'index': index,
+                'updated_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            }
+
+    def save(self):
+        """原子写入缓存文件"""
+        with self._lock:
+            data = json.dumps(self._entries, indent=2, ensure_ascii=False, sort_keys=True)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
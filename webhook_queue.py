@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Webhook 异步发送队列
+
+分析过程中每个网站完成后即把通知卡片放入队列，由后台线程按顺序发送，
+通知不再阻塞其余网站的分析：
+    - 卡片按请求体大小装满（飞书单条消息上限 20KB），而不是固定每组100个URL
+    - 令牌桶限速，默认每秒 1.5 条、突发 5 条（飞书自定义机器人限制为 100 条/分钟、5 条/秒）
+    - 429、5xx、限流错误码和网络异常时按指数退避重试，优先使用 Retry-After
+    - 单张卡片失败不影响同一网站的其余卡片
+    - 队列长度有上限，发送不过来时 submit 阻塞，使分析流程随之放慢，待发送的卡片不会无限累积
+"""
+
+import time
+import queue
+import random
+import threading
+from typing import Callable, Dict, List, Optional
+import logging
+from webhook_sender import WebhookSender, MAX_PAYLOAD_BYTES, DELIVERED, RETRY
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_CONFIG = {
+    'rate_per_second': 1.5,
+    'burst': 5,
+    'max_retries': 4,
+    'max_payload_bytes': MAX_PAYLOAD_BYTES,
+    'drain_timeout': 300,
+    'queue_size': 20
+}
+
+# 退避等待的初始值和上限（秒）
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+_STOP = object()
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        """令牌桶：每秒补充 rate 个令牌，最多存 capacity 个"""
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌，不足时等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class WebhookQueue:
+    def __init__(self, sender: WebhookSender, config: Optional[Dict] = None, metrics=None):
+        """初始化发送队列
+
+        Args:
+            sender: Webhook 发送器
+            config: webhook 配置，读取 rate_per_second / burst / max_retries / max_payload_bytes / drain_timeout / queue_size
+            metrics: 运行指标收集器，记录每个网站的通知耗时
+        """
+        settings = dict(DEFAULT_QUEUE_CONFIG)
+        for key in DEFAULT_QUEUE_CONFIG:
+            if config and key in config:
+                settings[key] = config[key]
+
+        self.sender = sender
+        self.metrics = metrics
+        self.max_retries = max(0, int(settings['max_retries']))
+        self.max_payload_bytes = int(settings['max_payload_bytes'])
+        self.drain_timeout = float(settings['drain_timeout'])
+        self.bucket = TokenBucket(max(0.01, float(settings['rate_per_second'])), int(settings['burst']))
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, int(settings['queue_size'])))
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self.stats = {'delivered': 0, 'failed': 0, 'retries': 0}
+
+    def start(self):
+        """启动后台发送线程"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._worker, name='webhook-queue', daemon=True)
+            self._thread.start()
+
+    def submit(self, payload: Dict, site: Optional[str] = None, label: str = '',
+               on_done: Optional[Callable[[bool], None]] = None):
+        """放入一条消息，队列已满时等待；site 用于记录通知耗时；on_done 在发送结束后（在发送线程中）以是否送达调用"""
+        self._queue.put((payload, site, label, on_done))
+
+    def submit_site(self, site_name: str, urls: List[str], on_done: Optional[Callable[[bool], None]] = None):
+        """把网站的新增URL装成卡片放入队列（可在分析线程中调用）
+
+        on_done 在该网站的所有卡片发送结束后调用一次，参数为是否全部送达。
+        """
+        payloads = self.sender.build_site_payloads(site_name, urls, self.max_payload_bytes)
+        logger.info(f"{site_name} 的 {len(urls)} 个新URL分为 {len(payloads)} 条消息等待发送")
+        callback = None
+        if on_done is not None:
+            remaining = {'count': len(payloads), 'delivered': True}
+            lock = threading.Lock()
+
+            def _on_payload_done(delivered: bool):
+                with lock:
+                    remaining['count'] -= 1
+                    remaining['delivered'] = remaining['delivered'] and delivered
+                    finished = remaining['count'] == 0
+                if finished:
+                    on_done(remaining['delivered'])
+            callback = _on_payload_done
+        for i, payload in enumerate(payloads, 1):
+            self.submit(payload, site_name, f"{site_name} ({i}/{len(payloads)})", callback)
+
+    def close(self, timeout: Optional[float] = None) -> Dict[str, int]:
+        """等待队列中的消息发送完毕并停止后台线程，返回发送统计"""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(self.drain_timeout if timeout is None else timeout)
+            if self._thread.is_alive():
+                logger.warning(f"等待Webhook发送超时，仍有约 {self._queue.qsize()} 条消息未发送")
+            else:
+                self._thread = None
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            payload, site, label, on_done = item
+            start = time.perf_counter()
+            try:
+                delivered = self._deliver_with_retry(payload, label)
+            except Exception as e:
+                logger.error(f"发送消息异常 {label}: {str(e)}")
+                delivered = False
+            self._count('delivered' if delivered else 'failed')
+            if self.metrics is not None:
+                self.metrics.add_time(site, 'notify', time.perf_counter() - start)
+            if on_done is not None:
+                try:
+                    on_done(delivered)
+                except Exception as e:
+                    logger.error(f"发送完成回调异常 {label}: {str(e)}")
+
+    def _deliver_with_retry(self, payload: Dict, label: str) -> bool:
+        """限速发送一条消息，可重试的错误按指数退避重试"""
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            outcome, retry_after = self.sender.deliver(payload)
+            if outcome == DELIVERED:
+                return True
+            if outcome != RETRY or attempt == self.max_retries:
+                break
+            # 没有 Retry-After 时使用带随机抖动的指数退避，避免与其他发送方同时重试
+            delay = retry_after if retry_after is not None else min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+            logger.warning(f"消息发送失败，{delay:.1f}秒后重试 ({attempt + 1}/{self.max_retries}): {label}")
+            self._count('retries')
+            time.sleep(min(BACKOFF_MAX, delay))
+        logger.error(f"消息发送失败，放弃: {label}")
+        return False
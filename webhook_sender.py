@@ -2,17 +2,81 @@
 # -*- coding: utf-8 -*-
 
 import json
+import time
 import requests
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import logging
+from http_session import get_session
 
 logger = logging.getLogger(__name__)
 
+# 飞书自定义机器人单条消息的请求体上限为 20KB，留出少量余量
+MAX_PAYLOAD_BYTES = 20000
+# 飞书返回的限流错误码（HTTP 状态码仍为 200）
+RATE_LIMIT_CODES = {9499, 11232}
+
+DELIVERED = 'delivered'
+RETRY = 'retry'
+FAILED = 'failed'
+
 class WebhookSender:
     def __init__(self, webhook_url: str):
         """初始化 Webhook 发送器"""
         self.webhook_url = webhook_url
 
+    def build_summary_payload(self, title: str, summary: Dict[str, Any]) -> Dict:
+        """生成汇总消息卡片
+
+        Args:
+            title: 卡片标题
+            summary: 统计摘要信息
+        """
+        card = {
+            "config": {
+                "wide_screen_mode": True
+            },
+            "header": {
+                "title": {
+                    "tag": "plain_text",
+                    "content": title
+                },
+                "template": "blue"
+            },
+            "elements": [
+                {
+                    "tag": "div",
+                    "fields": [
+                        {
+                            "is_short": True,
+                            "text": {
+                                "tag": "lark_md",
+                                "content": f"**总计网站数：**\n{summary.get('total_sites', 0)}"
+                            }
+                        },
+                        {
+                            "is_short": True,
+                            "text": {
+                                "tag": "lark_md",
+                                "content": f"**新增URL数：**\n{summary.get('total_new_urls', 0)}"
+                            }
+                        }
+                    ]
+                },
+                {
+                    "tag": "div",
+                    "text": {
+                        "tag": "lark_md",
+                        "content": summary.get('details_hint', "以下将分别显示每个网站的详细信息...")
+                    }
+                }
+            ]
+        }
+
+        return {
+            "msg_type": "interactive",
+            "card": card
+        }
+
     def send_summary(self, title: str, summary: Dict[str, Any]) -> bool:
         """发送汇总消息
         
@@ -21,172 +85,179 @@ class WebhookSender:
             summary: 统计摘要信息
         """
         try:
-            card = {
-                "config": {
-                    "wide_screen_mode": True
+            return self._send_payload(self.build_summary_payload(title, summary))
+        except Exception as e:
+            logger.error(f"发送汇总消息异常: {str(e)}")
+            return False
+
+    def _site_card(self, site_name: str, urls: List[str], title_suffix: str) -> Dict:
+        """生成单个网站的URL列表卡片"""
+        card = {
+            "config": {
+                "wide_screen_mode": True
+            },
+            "header": {
+                "title": {
+                    "tag": "plain_text",
+                    "content": f"{site_name} - 新增URL列表 {title_suffix}"
                 },
-                "header": {
-                    "title": {
-                        "tag": "plain_text",
-                        "content": title
-                    },
-                    "template": "blue"
+                "template": "green"
+            },
+            "elements": [
+                {
+                    "tag": "div",
+                    "text": {
+                        "tag": "lark_md",
+                        "content": f"**{site_name}**\n本组显示 {len(urls)} 个URL："
+                    }
                 },
-                "elements": [
-                    {
-                        "tag": "div",
-                        "fields": [
-                            {
-                                "is_short": True,
-                                "text": {
-                                    "tag": "lark_md",
-                                    "content": f"**总计网站数：**\n{summary.get('total_sites', 0)}"
-                                }
-                            },
-                            {
-                                "is_short": True,
-                                "text": {
-                                    "tag": "lark_md",
-                                    "content": f"**新增URL数：**\n{summary.get('total_new_urls', 0)}"
-                                }
-                            }
-                        ]
-                    },
-                    {
-                        "tag": "div",
-                        "text": {
-                            "tag": "lark_md",
-                            "content": "以下将分别显社每个网站的详细信息..."
-                        }
+                {
+                    "tag": "div",
+                    "text": {
+                        "tag": "lark_md",
+                        "content": "\n".join([f"• {url}" for url in urls])
                     }
-                ]
-            }
+                }
+            ]
+        }
 
-            payload = {
-                "msg_type": "interactive",
-                "card": card
-            }
+        return {
+            "msg_type": "interactive",
+            "card": card
+        }
 
-            return self._send_payload(payload)
+    def build_site_payloads(self, site_name: str, urls: List[str],
+                            max_bytes: int = MAX_PAYLOAD_BYTES) -> List[Dict]:
+        """把网站的URL列表按请求体大小分组生成卡片，每张卡片尽量装满但不超过 max_bytes
 
-        except Exception as e:
-            logger.error(f"发送汇总消息异常: {str(e)}")
-            return False
+        Args:
+            site_name: 网站名称
+            urls: URL列表
+            max_bytes: 单条消息请求体的最大字节数
+        """
+        # 卡片固定部分的大小，用最长的编号和数量占位，保证填入实际值后不会超限
+        overhead = payload_size(self._site_card(site_name, [], "(9999/9999)")) + len("999999")
+
+        groups = []
+        group: List[str] = []
+        size = overhead
+        for url in urls:
+            line_size = _line_size(url)
+            if overhead + line_size > max_bytes:
+                # 单个URL放不进一条消息时截断显示，否则该消息会超出上限而被拒绝
+                logger.warning(f"{site_name} 的URL超过单条消息上限 {max_bytes} 字节，截断显示: {url[:100]}...")
+                url = _truncate_url(url, max_bytes - overhead)
+                line_size = _line_size(url)
+            if group and size + line_size > max_bytes:
+                groups.append(group)
+                group, size = [], overhead
+            group.append(url)
+            size += line_size
+        if group:
+            groups.append(group)
 
-            return self._send_payload(payload)
+        return [self._site_card(site_name, group, f"({i}/{len(groups)})")
+                for i, group in enumerate(groups, 1)]
 
     def send_site_details(self, site_name: str, urls: List[str]) -> bool:
-        """发送单个网站的详细信息
+        """同步发送单个网站的详细信息（运行分析时使用 WebhookQueue 异步发送）
         
         Args:
             site_name: 网站名称
             urls: URL列表
         """
         try:
-            # 将URL列表分成每组100个
-            url_groups = [urls[i:i + 100] for i in range(0, len(urls), 100)]
-            
-            for i, group in enumerate(url_groups, 1):
-                card = {
-                    "config": {
-                        "wide_screen_mode": True
-                    },
-                    "header": {
-                        "title": {
-                            "tag": "plain_text",
-                            "content": f"{site_name} - 新增URL列表 ({i}/{len(url_groups)})"
-                        },
-                        "template": "green"
-                    },
-                    "elements": [
-                        {
-                            "tag": "div",
-                            "text": {
-                                "tag": "lark_md",
-                                "content": f"**{site_name}**\n本组显示 {len(group)} 个URL："
-                            }
-                        },
-                        {
-                            "tag": "div",
-                            "text": {
-                                "tag": "lark_md",
-                                "content": "\n".join([f"• {url}" for url in group])
-                            }
-                        }
-                    ]
-                }
-
-                payload = {
-                    "msg_type": "interactive",
-                    "card": card
-                }
-
-                if not self._send_payload(payload):
-                    return False
-                
-                # 添加短暂延迟，避免消息发送太快
-                time.sleep(0.5)
-
-            return True
+            success = True
+            for i, payload in enumerate(self.build_site_payloads(site_name, urls)):
+                if i:
+                    # 添加短暂延迟，避免消息发送太快
+                    time.sleep(0.5)
+                # 某一组发送失败时继续发送其余分组
+                success = self._send_payload(payload) and success
+            return success
 
         except Exception as e:
             logger.error(f"发送网站详情异常: {str(e)}")
             return False
 
-    def _send_payload(self, payload: Dict) -> bool:
-        """发送消息到Webhook
-        
+    def deliver(self, payload: Dict) -> Tuple[str, Optional[float]]:
+        """发送消息到Webhook，返回 (结果, 服务器要求的重试等待秒数)
+
+        结果为 DELIVERED、RETRY（429、5xx、限流错误码或网络异常，可以重试）或 FAILED。
+
         Args:
             payload: 消息内容
         """
         try:
             logger.info(f"准备发送消息到 Webhook: {self.webhook_url}")
-            logger.info(f"发送的消息内容: {json.dumps(payload, ensure_ascii=False)}")
+            logger.debug(f"发送的消息内容: {json.dumps(payload, ensure_ascii=False)}")
 
-            response = requests.post(
+            response = get_session().post(
                 self.webhook_url,
                 json=payload,
-                headers={"Content-Type": "application/json"}
+                headers={"Content-Type": "application/json"},
+                timeout=30
             )
 
             logger.info(f"Webhook响应状态码: {response.status_code}")
             logger.info(f"Webhook响应内容: {response.text}")
 
+            if response.status_code == 429 or response.status_code >= 500:
+                return RETRY, _retry_after(response)
             response.raise_for_status()
             result = response.json()
 
             if result.get("StatusCode") == 0 or result.get("code") == 0:
                 logger.info("消息发送成功")
-                return True
-            else:
-                logger.error(f"消息发送失败: {result}")
-                return False
+                return DELIVERED, None
+            if result.get("code") in RATE_LIMIT_CODES:
+                logger.warning(f"消息发送被限流: {result}")
+                return RETRY, _retry_after(response)
+            logger.error(f"消息发送失败: {result}")
+            return FAILED, None
 
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            logger.warning(f"发送消息网络异常: {str(e)}")
+            return RETRY, None
         except Exception as e:
             logger.error(f"发送消息异常: {str(e)}")
-            return False
+            return FAILED, None
 
-            
-            logger.info(f"Webhook响应状态码: {response.status_code}")
-            logger.info(f"Webhook响应内容: {response.text}")
-            
-            response.raise_for_status()
-            
-            if response.status_code == 200:
-                result = response.json()
-                if result.get("StatusCode") == 0:
-                    logger.info("消息发送成功")
-                    return True
-                else:
-                    logger.error(f"消息发送失败: {result}")
-                    return False
-            else:
-                logger.error(f"请求失败: {response.status_code}")
-                return False
+    def _send_payload(self, payload: Dict) -> bool:
+        """发送消息到Webhook（不重试）
+        
+        Args:
+            payload: 消息内容
+        """
+        return self.deliver(payload)[0] == DELIVERED
 
-        except Exception as e:
-            logger.error(f"发送消息异常: {str(e)}")
-            return False
+
+def payload_size(payload: Dict) -> int:
+    """消息序列化后的请求体字节数，与 requests 的 json= 参数序列化方式一致"""
+    return len(json.dumps(payload).encode('utf-8'))
+
+
+def _line_size(url: str) -> int:
+    """卡片中 "• url" 一行在请求体中占用的字节数"""
+    # JSON 转义后的行（去掉两端引号），加上转义为 \n 的换行分隔符 2 字节（最后一行没有分隔符，多算的留作余量）
+    return len(json.dumps(f"• {url}")[1:-1].encode('utf-8')) + 2
+
+
+def _truncate_url(url: str, limit: int) -> str:
+    """截断URL并加上省略号，使该行不超过 limit 字节"""
+    while url and _line_size(url + '…') > limit:
+        # 转义后每个字符占 1~6 字节，按超出的字节数估计需要去掉的字符数
+        url = url[:-max(1, (_line_size(url + '…') - limit) // 6)]
+    return url + '…'
+
+
+def _retry_after(response) -> Optional[float]:
+    """解析 Retry-After 响应头（秒数形式）"""
+    value = response.headers.get('Retry-After')
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
 
 
 def create_webhook_sender(config_path: str = "config.json") -> WebhookSender: